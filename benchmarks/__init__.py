@@ -0,0 +1 @@
+"""Benchmarks for the Modular Knowledge Assistant (not shipped with the service)."""
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark: offset-based chunker vs. the original decode-per-window one.
+
+    python -m benchmarks.bench_chunker --docs 20 --words 50000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from typing import List
+
+from knowledge_assistant.services import clean
+
+
+def legacy_chunk_text(text: str, max_tokens: int = 250, overlap: int = 50) -> List[str]:
+    """The chunker as it was before offset-based windows (kept for comparison)."""
+    import tiktoken
+
+    cleaned = clean.clean_text(text)
+    if not cleaned:
+        return []
+    encoding = tiktoken.get_encoding("cl100k_base")
+    tokens = encoding.encode(cleaned)
+    chunks: List[str] = []
+    start = 0
+    step = max_tokens - overlap
+    while start < len(tokens):
+        end = min(len(tokens), start + max_tokens)
+        chunk_cleaned = clean.clean_text(encoding.decode(tokens[start:end]))
+        if chunk_cleaned:
+            chunks.append(chunk_cleaned)
+        start += step
+    return chunks
+
+
+_WORDS = (
+    "attention transformer layer embedding vector retrieval index query token "
+    "model weight gradient batch latency throughput cache shard collection"
+).split()
+
+
+def synthetic_document(n_words: int, rng: random.Random) -> str:
+    out = []
+    for i in range(n_words):
+        out.append(rng.choice(_WORDS))
+        if i % 17 == 16:
+            out[-1] += "."
+        if i % 120 == 119:
+            out.append("\n\n")
+    return " ".join(out)
+
+
+def _time(fn, *args) -> float:
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+
+def run(n_docs: int, n_words: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    docs = [synthetic_document(n_words, rng) for _ in range(n_docs)]
+    clean._get_encoding()  # load once so neither side pays for it below
+    mismatches = sum(1 for d in docs if legacy_chunk_text(d) != clean.chunk_text(d))
+    legacy_s = _time(lambda: [legacy_chunk_text(d) for d in docs])
+    new_s = _time(lambda: [clean.chunk_text(d) for d in docs])
+    batch_s = _time(clean.chunk_texts, docs)
+    total_mb = sum(len(d) for d in docs) / 1e6
+    return {
+        "docs": n_docs,
+        "input_mb": round(total_mb, 3),
+        "legacy_s": round(legacy_s, 4),
+        "offset_s": round(new_s, 4),
+        "offset_batch_s": round(batch_s, 4),
+        "speedup": round(legacy_s / new_s, 2) if new_s else None,
+        "legacy_mb_per_s": round(total_mb / legacy_s, 2) if legacy_s else None,
+        "offset_mb_per_s": round(total_mb / new_s, 2) if new_s else None,
+        "mismatched_docs": mismatches,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--words", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.docs, args.words, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Synthetic corpora served by a local HTTP stand-in.
+
+Every domain gets its own server (and so its own host:port and Chroma
+collection) and a vocabulary skewed towards its own topic words, so
+retrieval has something to discriminate on.
+"""
+from __future__ import annotations
+
+import functools
+import html
+import os
+import random
+import threading
+from dataclasses import dataclass, field
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+_SHARED = (
+    "the a of and to in is for on with as by that this from at are be it an or "
+    "system data result method value process model set time number case"
+).split()
+
+_TOPICS = (
+    "retrieval index query vector embedding shard collection recall ranking",
+    "transformer attention layer token gradient weight training batch loss",
+    "network packet latency throughput router socket bandwidth congestion",
+    "database transaction lock page buffer journal replica commit schema",
+    "compiler parser register inline loop branch cache pipeline instruction",
+    "storage block disk flash sector compaction segment tombstone snapshot",
+    "kernel thread scheduler interrupt memory mapping process signal",
+    "security cipher key certificate signature token session audit",
+)
+
+
+@dataclass
+class CorpusSpec:
+    domains: int = 3
+    docs_per_domain: int = 20
+    paragraphs: int = 12
+    words_per_paragraph: int = 80
+    seed: int = 0
+
+
+@dataclass
+class Corpus:
+    directory: str
+    # domain -> document paths relative to the domain root
+    documents: Dict[str, List[str]] = field(default_factory=dict)
+    questions: List[str] = field(default_factory=list)
+
+    @property
+    def n_documents(self) -> int:
+        return sum(len(d) for d in self.documents.values())
+
+
+def _sentence(rng: random.Random, topic: List[str], n_words: int) -> str:
+    words = [rng.choice(topic) if rng.random() < 0.45 else rng.choice(_SHARED) for _ in range(n_words)]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def generate_corpus(spec: CorpusSpec, directory: str) -> Corpus:
+    """Write `spec.domains` folders of HTML documents under `directory`."""
+    rng = random.Random(spec.seed)
+    corpus = Corpus(directory=directory)
+    for d in range(spec.domains):
+        domain = f"domain{d}"
+        topic = _TOPICS[d % len(_TOPICS)].split()
+        root = os.path.join(directory, domain)
+        os.makedirs(root, exist_ok=True)
+        paths: List[str] = []
+        for i in range(spec.docs_per_domain):
+            paragraphs: List[str] = []
+            for _ in range(spec.paragraphs):
+                words_left = spec.words_per_paragraph
+                sentences: List[str] = []
+                while words_left > 0:
+                    n = min(words_left, rng.randint(8, 20))
+                    sentences.append(_sentence(rng, topic, n))
+                    words_left -= n
+                paragraphs.append(" ".join(sentences))
+            name = f"doc-{i}.html"
+            with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+                f.write(f"<html><head><title>{domain} {i}</title></head><body>")
+                f.write("".join(f"<p>{html.escape(p)}</p>" for p in paragraphs))
+                f.write("</body></html>")
+            paths.append(name)
+            # A question per document: a few words lifted from one of its paragraphs
+            words = rng.choice(paragraphs).rstrip(".").split()
+            start = rng.randrange(max(1, len(words) - 8))
+            corpus.questions.append("what about " + " ".join(words[start:start + 8]).lower().replace(".", ""))
+        corpus.documents[domain] = paths
+    return corpus
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args) -> None:  # noqa: A002 - stdlib signature
+        pass
+
+
+class CorpusServer:
+    """One threaded HTTP server per domain on 127.0.0.1, on free ports."""
+
+    def __init__(self, corpus: Corpus) -> None:
+        self.corpus = corpus
+        self._servers: Dict[str, ThreadingHTTPServer] = {}
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "CorpusServer":
+        for domain in self.corpus.documents:
+            handler = functools.partial(_QuietHandler, directory=os.path.join(self.corpus.directory, domain))
+            server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+            server.daemon_threads = True
+            thread = threading.Thread(target=server.serve_forever, name=f"corpus-{domain}", daemon=True)
+            thread.start()
+            self._servers[domain] = server
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        for server in self._servers.values():
+            server.shutdown()
+            server.server_close()
+        self._servers.clear()
+
+    def urls(self, domain: str | None = None) -> List[str]:
+        out: List[str] = []
+        for name, server in self._servers.items():
+            if domain is not None and name != domain:
+                continue
+            port = server.server_address[1]
+            out.extend(f"http://127.0.0.1:{port}/{path}" for path in self.corpus.documents[name])
+        return out
+
+    def __enter__(self) -> "CorpusServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,165 @@
+"""
+Shared embedding server vs one model per API worker: encode throughput
+per GB of RAM.
+
+    python -m benchmarks.embed_server --api-workers 4 --server-workers 1
+    python -m benchmarks.embed_server --api-workers 8 --server-workers 2 --seconds 20 --batch 8
+
+Starts `--api-workers` processes standing in for uvicorn workers, each
+encoding batches of `--batch` texts in a loop for `--seconds`: first with
+its own in-process model (threads = CPUs / workers), then as clients of
+an embedding server running `--server-workers` processes. Memory is the
+summed PSS of every process involved (shared pages counted once), read
+from /proc once all of them are warm.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.bench_chunker import synthetic_document
+
+
+def _memory_mb(pid: int) -> Optional[float]:
+    """Proportional set size, falling back to RSS where smaps_rollup is missing."""
+    for path, field in ((f"/proc/{pid}/smaps_rollup", "Pss:"), (f"/proc/{pid}/status", "VmRSS:")):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(field):
+                        return int(line.split()[1]) / 1024.0
+        except OSError:
+            continue
+    return None
+
+
+def _children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _worker(
+    mode: str, socket_path: str, threads: int, batch: int, seconds: float, seed: int, ready, go, results
+) -> None:
+    from knowledge_assistant.api.config import Settings
+
+    settings = Settings()
+    if mode == "in-process":
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        try:
+            import torch  # type: ignore
+
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+        from sentence_transformers import SentenceTransformer  # type: ignore
+
+        model = SentenceTransformer(settings.embed_model_name)
+    else:
+        from knowledge_assistant.services.embed_server import EmbedClient
+
+        model = EmbedClient(socket_path, settings.embed_model_name, fallback=None)
+    rng = random.Random(seed)
+    words = synthetic_document(20_000, rng).split()
+    texts = [" ".join(words[i:i + 40]) for i in range(0, len(words) - 40, 37)]
+    model.encode(texts[:batch])
+    ready.put(os.getpid())
+    go.wait()
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        at = rng.randrange(len(texts) - batch)
+        model.encode(texts[at:at + batch])
+        done += batch
+    results.put(done)
+
+
+def _run_mode(mode: str, args, socket_path: str = "", extra_pids: List[int] = ()) -> Dict[str, float]:
+    ctx = multiprocessing.get_context("spawn")
+    ready, results, go = ctx.Queue(), ctx.Queue(), ctx.Event()
+    threads = max(1, (os.cpu_count() or 1) // args.api_workers)
+    procs = [
+        ctx.Process(
+            target=_worker,
+            args=(mode, socket_path, threads, args.batch, args.seconds, i, ready, go, results),
+            daemon=True,
+        )
+        for i in range(args.api_workers)
+    ]
+    for proc in procs:
+        proc.start()
+    pids = [ready.get(timeout=args.startup_timeout_s) for _ in procs]
+    memory = [_memory_mb(pid) for pid in [*pids, *extra_pids]]
+    go.set()
+    t0 = time.perf_counter()
+    texts = sum(results.get(timeout=args.seconds + 120) for _ in procs)
+    elapsed = time.perf_counter() - t0
+    for proc in procs:
+        proc.join()
+    memory_mb = sum(m for m in memory if m is not None)
+    per_s = texts / elapsed
+    return {
+        "processes": len(pids) + len(extra_pids),
+        "texts": texts,
+        "texts_per_s": round(per_s, 1),
+        "memory_mb": round(memory_mb, 1),
+        "texts_per_s_per_gb": round(per_s / (memory_mb / 1024.0), 1) if memory_mb else None,
+    }
+
+
+def run(args) -> dict:
+    report: dict = {
+        "api_workers": args.api_workers,
+        "server_workers": args.server_workers,
+        "batch": args.batch,
+        "cpus": os.cpu_count(),
+    }
+    report["in_process"] = _run_mode("in-process", args)
+
+    from knowledge_assistant.api.config import Settings
+    from knowledge_assistant.services.embed_server import EmbedClient
+
+    with tempfile.TemporaryDirectory(prefix="ka-embed-") as tmp:
+        socket_path = os.path.join(tmp, "embed.sock")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "knowledge_assistant.services.embed_server", "--socket", socket_path,
+             "--workers", str(args.server_workers)],
+        )
+        try:
+            if not EmbedClient(socket_path, Settings().embed_model_name).wait(args.startup_timeout_s):
+                raise SystemExit("embedding server did not start")
+            report["server"] = _run_mode("server", args, socket_path, [server.pid, *_children(server.pid)])
+        finally:
+            server.terminate()
+            server.wait()
+    base, shared = report["in_process"], report["server"]
+    if base["texts_per_s_per_gb"] and shared["texts_per_s_per_gb"]:
+        report["per_gb_speedup"] = round(shared["texts_per_s_per_gb"] / base["texts_per_s_per_gb"], 2)
+    report["throughput_ratio"] = round(shared["texts_per_s"] / base["texts_per_s"], 2) if base["texts_per_s"] else None
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api-workers", type=int, default=4)
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=32, help="texts per encode call")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--startup-timeout-s", type=float, default=120.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
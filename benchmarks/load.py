@@ -0,0 +1,247 @@
+"""
+Closed-loop and open-loop load generators.
+
+Closed loop: `concurrency` workers each send the next request as soon as
+the previous one returns, which measures capacity. Open loop: requests
+arrive as a Poisson process at `rate_rps` whatever the service is doing.
+Latency is measured from the scheduled arrival time, so queueing behind
+a slow server shows up instead of being hidden (coordinated omission).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+
+
+@dataclass
+class BenchRequest:
+    endpoint: str
+    method: str
+    path: str
+    json: Optional[dict] = None
+    params: Optional[dict] = None
+
+
+@dataclass
+class LoadResult:
+    duration_s: float = 0.0
+    latencies_ms: Dict[str, List[float]] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    # 429/503 answers: requests the API shed under load, rather than failed
+    shed: Dict[str, int] = field(default_factory=dict)
+    # open loop only: arrivals skipped because max_inflight was reached
+    dropped: int = 0
+
+    def record(self, endpoint: str, ms: float, status: int) -> None:
+        """`status` is the HTTP status code, 0 when the request got no response."""
+        if 0 < status < 400:
+            self.latencies_ms.setdefault(endpoint, []).append(ms)
+        elif status in (429, 503):
+            self.shed[endpoint] = self.shed.get(endpoint, 0) + 1
+        else:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self) -> dict:
+        out: Dict[str, dict] = {}
+        for endpoint in sorted(set(self.latencies_ms) | set(self.errors) | set(self.shed)):
+            out[endpoint] = summarize(self.latencies_ms.get(endpoint, []), self.duration_s)
+            out[endpoint]["errors"] = self.errors.get(endpoint, 0)
+            out[endpoint]["shed"] = self.shed.get(endpoint, 0)
+        total = sum(len(v) for v in self.latencies_ms.values())
+        return {
+            "duration_s": round(self.duration_s, 3),
+            "requests": total,
+            "throughput_rps": round(total / self.duration_s, 2) if self.duration_s else 0.0,
+            "dropped": self.dropped,
+            "endpoints": out,
+        }
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies_ms: List[float], duration_s: float) -> dict:
+    values = sorted(latencies_ms)
+    return {
+        "count": len(values),
+        "throughput_rps": round(len(values) / duration_s, 2) if duration_s else 0.0,
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 0.50), 3),
+        "p95_ms": round(percentile(values, 0.95), 3),
+        "p99_ms": round(percentile(values, 0.99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+
+
+async def _send(client: httpx.AsyncClient, req: BenchRequest) -> int:
+    try:
+        response = await client.request(req.method, req.path, json=req.json, params=req.params)
+        return response.status_code
+    except httpx.HTTPError:
+        return 0
+
+
+async def closed_loop(
+    client: httpx.AsyncClient,
+    next_request: Callable[[], BenchRequest],
+    concurrency: int,
+    duration_s: float,
+) -> LoadResult:
+    result = LoadResult()
+    deadline = time.perf_counter() + duration_s
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            req = next_request()
+            t0 = time.perf_counter()
+            status = await _send(client, req)
+            result.record(req.endpoint, (time.perf_counter() - t0) * 1000.0, status)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    result.duration_s = time.perf_counter() - t0
+    return result
+
+
+async def open_loop(
+    client: httpx.AsyncClient,
+    next_request: Callable[[], BenchRequest],
+    rate_rps: float,
+    duration_s: float,
+    max_inflight: int = 1000,
+    seed: int = 0,
+) -> LoadResult:
+    result = LoadResult()
+    rng = random.Random(seed)
+    inflight: set = set()
+
+    async def fire(req: BenchRequest, scheduled: float) -> None:
+        status = await _send(client, req)
+        result.record(req.endpoint, (time.perf_counter() - scheduled) * 1000.0, status)
+
+    start = time.perf_counter()
+    scheduled = start
+    while True:
+        scheduled += rng.expovariate(rate_rps)
+        if scheduled - start > duration_s:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(inflight) >= max_inflight:
+            result.dropped += 1
+            continue
+        task = asyncio.create_task(fire(next_request(), scheduled))
+        inflight.add(task)
+        task.add_done_callback(inflight.discard)
+    if inflight:
+        await asyncio.gather(*inflight)
+    result.duration_s = time.perf_counter() - start
+    return result
+
+
+@asynccontextmanager
+async def inprocess_client(app) -> AsyncIterator[httpx.AsyncClient]:
+    """Client bound to the ASGI app directly, with its lifespan (warmup, job manager) running and warm."""
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            while (await client.get("/health/ready")).status_code != 200:
+                await asyncio.sleep(0.05)
+            yield client
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    """VmHWM of a live process (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        return None
+    return None
+
+
+class UvicornServer:
+    """
+    `uvicorn knowledge_assistant.api.main:app` in a child process. Cold
+    start is the time from spawning it until /health/live answers, ready
+    the time until /health/ready does (model and client warm).
+    """
+
+    def __init__(self, env: Optional[Dict[str, str]] = None, startup_timeout_s: float = 300.0) -> None:
+        self.port = _free_port()
+        self.env = {**os.environ, **(env or {})}
+        self.startup_timeout_s = startup_timeout_s
+        self.cold_start_s: Optional[float] = None
+        self.ready_s: Optional[float] = None
+        self._proc: Optional[subprocess.Popen] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "UvicornServer":
+        t0 = time.perf_counter()
+        self._proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "knowledge_assistant.api.main:app",
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            env=self.env,
+        )
+        while time.perf_counter() - t0 < self.startup_timeout_s:
+            if self._proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {self._proc.returncode}")
+            try:
+                if self.cold_start_s is None:
+                    if httpx.get(self.base_url + "/health/live", timeout=1).status_code == 200:
+                        self.cold_start_s = round(time.perf_counter() - t0, 3)
+                if self.cold_start_s is not None:
+                    if httpx.get(self.base_url + "/health/ready", timeout=1).status_code == 200:
+                        self.ready_s = round(time.perf_counter() - t0, 3)
+                        return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.05)
+        self.stop()
+        raise RuntimeError("uvicorn did not become healthy in time")
+
+    def peak_rss_mb(self) -> Optional[float]:
+        return _peak_rss_mb(self._proc.pid) if self._proc is not None else None
+
+    def stop(self) -> None:
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        self._proc = None
+
+    def __enter__(self) -> "UvicornServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
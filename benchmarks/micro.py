@@ -0,0 +1,203 @@
+"""
+Micro-benchmarks for hot helpers on the ingest and query paths.
+
+    python -m benchmarks.micro
+
+The two diversity entries also report the mean pairwise cosine of what they
+select and how many picks near-duplicate an earlier one, to compare the URL
+filter with MMR. `lexical_search` times BM25 lookups in a throw-away index of
+synthetic chunks. `html_extract` parses a synthetic page with every
+installed HTML parser, next to the old whole-tree BeautifulSoup `get_text`.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from benchmarks.bench_chunker import synthetic_document
+from knowledge_assistant.services.clean import chunk_text
+from knowledge_assistant.services.embed_store import deterministic_id
+from knowledge_assistant.services.html_extract import _ENGINES, extract_text, resolve_engine
+from knowledge_assistant.services.lexical import LexicalIndex
+from knowledge_assistant.services.retrieval import RetrievedChunk, _mmr_diversity, _mmr_lite_diversity
+
+
+def bench(fn: Callable[[], object], number: int, repeat: int = 5) -> dict:
+    """Best and median time per call over `repeat` rounds of `number` calls."""
+    fn()  # warm caches (tokenizer, model) outside the measurement
+    rounds: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - t0) / number)
+    return {
+        "calls": number * repeat,
+        "best_us": round(min(rounds) * 1e6, 3),
+        "median_us": round(statistics.median(rounds) * 1e6, 3),
+    }
+
+
+def synthetic_candidates(
+    n: int, n_urls: int, rng: random.Random, dim: int = 384
+) -> Tuple[List[RetrievedChunk], np.ndarray]:
+    """
+    Candidates around a few topics and the query they were retrieved for;
+    a third are near-copies of another chunk on a different URL (mirrors).
+    """
+    nrng = np.random.default_rng(rng.randrange(2**32))
+    topics = nrng.standard_normal((max(2, n // 20), dim)).astype(np.float32)
+    embeddings = topics[nrng.integers(0, len(topics), n)] + nrng.standard_normal((n, dim)).astype(np.float32)
+    for i in range(0, n, 3):
+        embeddings[i] = embeddings[rng.randrange(n)] + 0.01 * nrng.standard_normal(dim).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    query = topics[0] / np.linalg.norm(topics[0])
+    distances = ((embeddings - query) ** 2).sum(axis=1)
+    pool = [
+        RetrievedChunk(
+            text=f"chunk {i}",
+            url=f"https://example{rng.randrange(n_urls)}.org/doc",
+            distance=float(distances[i]),
+            meta={},
+            id=str(i),
+            embedding=embeddings[i],
+        )
+        for i in range(n)
+    ]
+    return pool, query
+
+
+def redundancy(chunks: List[RetrievedChunk], duplicate_cos: float = 0.95) -> dict:
+    """Mean pairwise cosine of a selection and how many picks near-duplicate an earlier one."""
+    emb = np.asarray([c.embedding for c in chunks], dtype=np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    sim = emb @ emb.T
+    n = len(chunks)
+    return {
+        "mean_cosine": round(float((sim.sum() - n) / (n * (n - 1))), 4) if n > 1 else 0.0,
+        "near_duplicates": int((np.tril(sim, -1) > duplicate_cos).any(axis=1).sum()),
+    }
+
+
+def lexical_search(chunks: int, rng: random.Random, vocabulary: int = 50000, words: int = 200) -> dict:
+    """BM25 lookups over `chunks` synthetic chunks with Zipf-distributed words."""
+    nrng = np.random.default_rng(rng.randrange(2**32))
+    with tempfile.TemporaryDirectory(prefix="ka-lexical-") as tmp:
+        index = LexicalIndex(f"{tmp}/lexical.sqlite3")
+        for start in range(0, chunks, 1000):
+            n = min(1000, chunks - start)
+            ranks = np.minimum(nrng.zipf(1.2, (n, words)), vocabulary)
+            texts = [" ".join(f"w{r}" for r in row) for row in ranks.tolist()]
+            index.add("bench", [f"chunk-{start + i}" for i in range(n)], texts)
+        index.compact("bench")
+        queries = [" ".join(f"w{r}" for r in nrng.integers(2, 2000, 3)) for _ in range(50)]
+        cycle = iter(queries * 1000)
+        report = {**bench(lambda: index.search(["bench"], next(cycle), 24), number=50), "chunks": chunks}
+        index.close()
+    return report
+
+
+def synthetic_page(doc: str, rng: random.Random) -> bytes:
+    """`doc` as an HTML article wrapped in the usual navigation, scripts and footer."""
+    paragraphs = [doc[i:i + 600] for i in range(0, len(doc), 600)]
+    body = "".join(
+        (f"<h2>Section {i}</h2>" if i % 5 == 0 else "") + f"<p>{p}</p>" for i, p in enumerate(paragraphs)
+    )
+    nav = "".join(f'<li><a href="/page/{rng.randrange(10**6)}">Link {i}</a></li>' for i in range(200))
+    script = "<script>" + "var x = 1;" * 2000 + "</script>"
+    page = (
+        f"<html><head><title>Bench</title>{script}<style>{'p { margin: 0 }' * 500}</style></head>"
+        f"<body><header><nav><ul>{nav}</ul></nav></header><main><article>{body}</article></main>"
+        f"<aside><ul>{nav}</ul></aside><footer>{'Copyright notice. ' * 200}</footer>{script}</body></html>"
+    )
+    return page.encode("utf-8")
+
+
+def html_extract(doc: str, rng: random.Random) -> dict:
+    page = synthetic_page(doc, rng)
+
+    def whole_tree() -> str:
+        from bs4 import BeautifulSoup  # type: ignore
+
+        return BeautifulSoup(page, "html.parser").get_text(separator=" ", strip=True)
+
+    report: dict = {
+        "page_bytes": len(page),
+        "bs4_get_text": {**bench(whole_tree, number=3), "text_bytes": len(whole_tree().encode("utf-8"))},
+    }
+    for name in _ENGINES:
+        if resolve_engine(name) != name:
+            report[name] = {"skipped": "not installed"}
+            continue
+        text = extract_text(page, engine=name).text
+        report[name] = {**bench(lambda: extract_text(page, engine=name), number=3), "text_bytes": len(text.encode("utf-8"))}
+    return report
+
+
+def run(
+    words: int = 5000,
+    candidates: int = 240,
+    top_k: int = 8,
+    seed: int = 0,
+    encode: bool = True,
+    lexical_chunks: int = 20000,
+) -> dict:
+    rng = random.Random(seed)
+    doc = synthetic_document(words, rng)
+    chunks = chunk_text(doc)
+    pool, query = synthetic_candidates(candidates, max(2, candidates // 6), rng)
+    report = {
+        "chunk_text": {**bench(lambda: chunk_text(doc), number=5), "words": words, "chunks": len(chunks)},
+        "deterministic_id": bench(lambda: deterministic_id("https://example.org/doc::0", chunks[0]), number=2000),
+        "mmr_lite_diversity": {
+            **bench(lambda: _mmr_lite_diversity(pool, top_k=top_k), number=200),
+            "candidates": candidates,
+            "top_k": top_k,
+            **redundancy(_mmr_lite_diversity(pool, top_k=top_k)),
+        },
+        "mmr_diversity": {
+            **bench(lambda: _mmr_diversity(pool, top_k, query), number=200),
+            "candidates": candidates,
+            "top_k": top_k,
+            **redundancy(_mmr_diversity(pool, top_k, query)),
+        },
+        "lexical_search": lexical_search(lexical_chunks, rng),
+        "html_extract": html_extract(doc, rng),
+    }
+    if encode:
+        try:
+            from knowledge_assistant.api.config import Settings
+            from knowledge_assistant.services.embed_store import EmbedStore
+
+            store = EmbedStore(Settings())
+            model = store.model
+            report["encode_single"] = bench(lambda: model.encode(["what is attention in transformers"]), number=20)
+            report["encode_query_batched"] = bench(lambda: store.encode_query("what is attention"), number=20)
+        except Exception as exc:
+            report["encode_single"] = {"skipped": str(exc)}
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=5000)
+    parser.add_argument("--candidates", type=int, default=240)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--lexical-chunks", type=int, default=20000, help="chunks in the BM25 index")
+    parser.add_argument("--no-encode", action="store_true", help="skip the embedding model")
+    args = parser.parse_args()
+    report = run(
+        args.words, args.candidates, args.top_k, encode=not args.no_encode, lexical_chunks=args.lexical_chunks
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Routing recall: how much of the all-collections result a routed, domain-less query keeps.
+
+    python -m benchmarks.routing --top-m 2 4 8 --margin 0 0.05 0.1
+    python -m benchmarks.routing --questions questions.txt --top-k 4
+
+Runs against CHROMA_DIRECTORY. Each question is answered twice, once over
+every collection and once over the collections the routing index picks,
+with the retrieval cache cleared in between. For each ROUTING_TOP_M /
+ROUTING_MARGIN pair it reports recall@k of the routed chunks against the
+full ones, how many collections were searched and the median latency of
+both. Without `--questions`, questions are the opening words of chunks
+sampled from the collections.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import List, Sequence
+
+from knowledge_assistant.api.config import Settings
+from knowledge_assistant.services.retrieval import Retriever
+
+
+def sample_questions(retriever: Retriever, n: int, words: int, seed: int) -> List[str]:
+    registry = retriever.store.registry
+    rng = random.Random(seed)
+    texts: List[str] = []
+    for name in registry.list_collection_names():
+        res = registry.get_collection(name).get(include=["documents"], limit=max(1, n))
+        texts.extend(doc for doc in res.get("documents") or [] if doc)
+    rng.shuffle(texts)
+    return [" ".join(t.split()[:words]) for t in texts[:n]]
+
+
+def _timed(retriever: Retriever, question: str, top_k: int, route: bool):
+    retriever.cache.clear()
+    t0 = time.perf_counter()
+    result = retriever.query_detailed(question, top_k, route=route)
+    return result, (time.perf_counter() - t0) * 1000.0
+
+
+def evaluate(
+    retriever: Retriever,
+    questions: Sequence[str],
+    top_k: int = 4,
+    top_ms: Sequence[int] = (2, 4, 8),
+    margins: Sequence[float] = (0.0, 0.05),
+) -> dict:
+    settings = retriever.settings
+    if retriever.store.registry.routing is None:
+        raise SystemExit("set COLLECTION_ROUTING=true to evaluate routing")
+    collections = len(retriever.store.registry.collection_names())
+    full = [_timed(retriever, q, top_k, route=False) for q in questions]
+    report: dict = {
+        "collections": collections,
+        "questions": len(questions),
+        "top_k": top_k,
+        "full_ms_p50": round(statistics.median(ms for _, ms in full), 3) if full else 0.0,
+    }
+    for top_m in top_ms:
+        for margin in margins:
+            settings.routing_top_m, settings.routing_margin = top_m, margin
+            recalls: List[float] = []
+            searched: List[int] = []
+            latencies: List[float] = []
+            for question, (truth, _) in zip(questions, full):
+                routed, ms = _timed(retriever, question, top_k, route=True)
+                expected = {c.id for c in truth.chunks}
+                if expected:
+                    recalls.append(len(expected & {c.id for c in routed.chunks}) / len(expected))
+                searched.append(collections - len(routed.skipped_collections))
+                latencies.append(ms)
+            report[f"m{top_m}_margin{margin}"] = {
+                "recall": round(statistics.fmean(recalls), 4) if recalls else 1.0,
+                "collections_searched": round(statistics.fmean(searched), 2) if searched else 0.0,
+                "routed_ms_p50": round(statistics.median(latencies), 3) if latencies else 0.0,
+            }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", help="file with one question per line")
+    parser.add_argument("--queries", type=int, default=100, help="questions to sample when no file is given")
+    parser.add_argument("--words", type=int, default=12, help="words per sampled question")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--top-m", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--margin", type=float, nargs="+", default=[0.0, 0.05])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    retriever = Retriever(Settings())
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = sample_questions(retriever, args.queries, args.words, args.seed)
+    print(json.dumps(evaluate(retriever, questions, args.top_k, args.top_m, args.margin), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+End-to-end benchmark: synthetic corpus -> /ingest -> load on /ask and /search.
+
+    python -m benchmarks.run --out report.json
+    python -m benchmarks.run --baseline report.json --fail-on-regression
+
+Everything runs against a throw-away CHROMA_DIRECTORY. The app is first
+driven in-process (httpx ASGI transport) and then, with --uvicorn, over a
+real socket in a child process, which also gives a clean cold-start time.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from benchmarks.corpus import CorpusServer, CorpusSpec, generate_corpus
+from benchmarks.load import BenchRequest, UvicornServer, closed_loop, open_loop
+
+# Report fields where bigger is better; every other *_ms / *_s / *_mb field is lower-is-better
+_HIGHER_IS_BETTER = ("throughput_rps", "docs_per_s", "chunks_per_s")
+_LOWER_IS_BETTER_SUFFIXES = ("_ms", "_s", "_mb", "_us")
+
+
+def _self_peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0, 1)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _request_mix(questions: List[str], top_k: int, search_ratio: float, seed: int):
+    rng = random.Random(seed)
+    cycle: Iterator[str] = itertools.cycle(questions)
+
+    def next_request() -> BenchRequest:
+        q = next(cycle)
+        if rng.random() < search_ratio:
+            return BenchRequest("/search", "GET", "/search", params={"q": q, "num": top_k})
+        return BenchRequest("/ask", "POST", "/ask", json={"question": q, "top_k": top_k})
+
+    return next_request
+
+
+async def _drive(client, args, questions: List[str]) -> dict:
+    out: dict = {}
+    mix = _request_mix(questions, args.top_k, args.search_ratio, args.seed)
+    out["closed_loop"] = (await closed_loop(client, mix, args.concurrency, args.duration)).summary()
+    out["closed_loop"]["concurrency"] = args.concurrency
+    if args.rate > 0:
+        mix = _request_mix(questions, args.top_k, args.search_ratio, args.seed + 1)
+        out["open_loop"] = (await open_loop(client, mix, args.rate, args.duration, seed=args.seed)).summary()
+        out["open_loop"]["rate_rps"] = args.rate
+    metrics = (await client.get("/metrics")).json()
+    out["stages"] = metrics.get("stages", {})
+    out["gauges"] = metrics.get("gauges", {})
+    return out
+
+
+async def _inprocess(args, urls: List[str], questions: List[str]) -> dict:
+    from benchmarks.load import inprocess_client
+
+    t0 = time.perf_counter()
+    from knowledge_assistant.api.main import app
+
+    import_s = time.perf_counter() - t0
+    async with inprocess_client(app) as client:
+        report: dict = {"cold_start_s": round(time.perf_counter() - t0, 3), "import_s": round(import_s, 3)}
+        t1 = time.perf_counter()
+        chunks = 0
+        for i in range(0, len(urls), args.ingest_batch):
+            response = await client.post("/ingest", json={"urls": urls[i:i + args.ingest_batch]})
+            response.raise_for_status()
+            chunks += len(response.json()["ids"])
+        ingest_s = time.perf_counter() - t1
+        report["ingest"] = {
+            "docs": len(urls),
+            "chunks": chunks,
+            "duration_s": round(ingest_s, 3),
+            "docs_per_s": round(len(urls) / ingest_s, 2) if ingest_s else 0.0,
+            "chunks_per_s": round(chunks / ingest_s, 2) if ingest_s else 0.0,
+        }
+        report.update(await _drive(client, args, questions))
+    report["peak_rss_mb"] = _self_peak_rss_mb()
+    return report
+
+
+async def _over_uvicorn(args, questions: List[str]) -> dict:
+    import httpx
+
+    with UvicornServer(env={"CHROMA_DIRECTORY": os.environ["CHROMA_DIRECTORY"]}) as server:
+        limits = httpx.Limits(max_connections=max(args.concurrency, 100))
+        async with httpx.AsyncClient(base_url=server.base_url, timeout=120, limits=limits) as client:
+            report = {"cold_start_s": server.cold_start_s, "ready_s": server.ready_s}
+            report.update(await _drive(client, args, questions))
+        report["peak_rss_mb"] = server.peak_rss_mb()
+    return report
+
+
+def _flatten(report: dict, prefix: str = "") -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for key, value in report.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            out.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[path] = float(value)
+    return out
+
+
+def _direction(path: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if not compared."""
+    leaf = path.rsplit(".", 1)[-1]
+    # max_ms is a single sample and too noisy to gate on
+    if path.startswith("params.") or leaf == "max_ms" or (leaf == "duration_s" and "_loop." in path):
+        return 0
+    if leaf in _HIGHER_IS_BETTER:
+        return 1
+    if leaf.endswith(_LOWER_IS_BETTER_SUFFIXES):
+        return -1
+    return 0
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> dict:
+    """Relative change of every comparable metric; regressions are those worse than `tolerance`."""
+    current, previous = _flatten(report), _flatten(baseline)
+    changes: Dict[str, dict] = {}
+    regressions: List[str] = []
+    for path, old in previous.items():
+        direction = _direction(path)
+        new = current.get(path)
+        if direction == 0 or new is None or old == 0:
+            continue
+        change = (new - old) / abs(old)
+        changes[path] = {"baseline": old, "current": new, "change": round(change, 4)}
+        if change * direction < -tolerance:
+            regressions.append(path)
+    return {"tolerance": tolerance, "regressions": sorted(regressions), "changes": changes}
+
+
+def run(args) -> Tuple[dict, int]:
+    workdir = tempfile.mkdtemp(prefix="ka-bench-")
+    # Settings reads the environment when config is first imported, so set it before any app import
+    os.environ["CHROMA_DIRECTORY"] = os.path.join(workdir, "chroma")
+    os.environ.setdefault("LLM_BACKEND", "dummy")
+    # Keep /search on the local index; a web search would make results depend on the network
+    os.environ["GOOGLE_API_KEY"] = ""
+    spec = CorpusSpec(
+        domains=args.domains,
+        docs_per_domain=args.docs,
+        paragraphs=args.paragraphs,
+        words_per_paragraph=args.words,
+        seed=args.seed,
+    )
+    report: dict = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+    }
+    try:
+        corpus = generate_corpus(spec, os.path.join(workdir, "corpus"))
+        with CorpusServer(corpus) as server:
+            report["inprocess"] = asyncio.run(_inprocess(args, server.urls(), corpus.questions))
+        if args.uvicorn:
+            report["uvicorn"] = asyncio.run(_over_uvicorn(args, corpus.questions))
+        if args.micro:
+            from benchmarks import micro
+
+            report["micro"] = micro.run(encode=True)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.tolerance)
+        if args.fail_on_regression and report["comparison"]["regressions"]:
+            status = 1
+    return report, status
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--domains", type=int, default=3)
+    parser.add_argument("--docs", type=int, default=20, help="documents per domain")
+    parser.add_argument("--paragraphs", type=int, default=12, help="paragraphs per document")
+    parser.add_argument("--words", type=int, default=80, help="words per paragraph")
+    parser.add_argument("--ingest-batch", type=int, default=50, help="URLs per /ingest request")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop workers")
+    parser.add_argument("--rate", type=float, default=20.0, help="open-loop arrivals per second (0 to skip)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per load phase")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--search-ratio", type=float, default=0.3, help="share of /search in the request mix")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--uvicorn", action="store_true", help="also run over uvicorn in a child process")
+    parser.add_argument("--micro", action="store_true", help="also run the micro-benchmarks")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary corpus and Chroma data")
+    args = parser.parse_args()
+    report, status = run(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Replica bootstrap: snapshot export/import throughput against re-embedding.
+
+    python -m benchmarks.snapshot --rows 50000
+    python -m benchmarks.snapshot --rows 20000 --compress --no-encode
+
+Fills a temporary store with synthetic chunks and random embeddings,
+exports it, imports the snapshot into a second empty store and verifies
+the copy row by row. Unless `--no-encode` is given, it also times the
+embedding model on a sample of the same chunks, which estimates how long
+re-ingesting would take to embed them again.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_chunker import synthetic_document
+from knowledge_assistant.api.config import Settings
+from knowledge_assistant.services.embed_store import EmbedStore
+from knowledge_assistant.services.snapshot import export_snapshot, import_snapshot
+
+
+def _settings(directory: str) -> Settings:
+    settings = Settings()
+    settings.chroma_directory = directory
+    return settings
+
+
+def fill(settings: Settings, rows: int, dim: int, collections: int, seed: int) -> list:
+    """Write `rows` synthetic chunks; returns a sample of their texts."""
+    rng = random.Random(seed)
+    nrng = np.random.default_rng(seed)
+    store = EmbedStore(settings)
+    words = synthetic_document(200_000, rng).split()
+    sample: list = []
+    batch = 2000
+    for start in range(0, rows, batch):
+        n = min(batch, rows - start)
+        texts = []
+        for _ in range(n):
+            at = rng.randrange(len(words) - 200)
+            texts.append(" ".join(words[at:at + 150]))
+        embeddings = nrng.standard_normal((n, dim)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        name = f"bench{(start // batch) % collections:02d}"
+        ids = [f"chunk-{start + i}" for i in range(n)]
+        metas = [{"source_url": f"https://example.org/doc/{(start + i) // 20}", "chunk_index": (start + i) % 20}
+                 for i in range(n)]
+        store.upsert_embeddings(name, texts, ids, metas, embeddings=embeddings)
+        if len(sample) < 512:
+            sample.extend(texts[: 512 - len(sample)])
+    return sample
+
+
+def run(rows: int, dim: int, collections: int, compress: bool, encode: bool, seed: int = 0) -> dict:
+    with tempfile.TemporaryDirectory(prefix="ka-snapshot-") as tmp:
+        source = _settings(os.path.join(tmp, "source"))
+        t0 = time.perf_counter()
+        sample = fill(source, rows, dim, collections, seed)
+        fill_s = time.perf_counter() - t0
+        exported = export_snapshot(source, os.path.join(tmp, "snap"), compress=compress)
+        imported = import_snapshot(_settings(os.path.join(tmp, "replica")), os.path.join(tmp, "snap"))
+        report = {
+            "rows": rows,
+            "dimension": dim,
+            "collections": collections,
+            "fill_s": round(fill_s, 3),
+            "snapshot_bytes": exported["bytes"],
+            "export_s": exported["seconds"],
+            "export_rows_per_s": exported["rows_per_s"],
+            "import_s": imported["seconds"],
+            "import_rows_per_s": imported["rows_per_s"],
+            "verified": imported["verify"]["ok"],
+        }
+        if encode:
+            try:
+                model = EmbedStore(source).model
+                model.encode(sample[:8])
+                t0 = time.perf_counter()
+                model.encode(sample)
+                per_row = (time.perf_counter() - t0) / len(sample)
+                report["reembed_rows_per_s"] = round(1.0 / per_row, 1)
+                report["reembed_estimate_s"] = round(per_row * rows, 3)
+            except Exception as exc:
+                report["reembed_rows_per_s"] = {"skipped": str(exc)}
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--collections", type=int, default=4)
+    parser.add_argument("--compress", action="store_true")
+    parser.add_argument("--no-encode", action="store_true", help="skip timing the embedding model")
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.dim, args.collections, args.compress, not args.no_encode), indent=2))
+
+
+if __name__ == "__main__":
+    main()
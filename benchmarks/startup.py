@@ -0,0 +1,73 @@
+"""
+Cold-start budget: how long `import knowledge_assistant.api.main` takes in
+a fresh interpreter, and which heavy dependencies it drags in.
+
+    python -m benchmarks.startup                   # exit 1 if a heavy module is imported
+    python -m benchmarks.startup --budget-s 1.5    # ...or if the median import takes longer
+
+The API must import without the embedding model, Chroma or HTML parsing
+stacks; those load on first use or in the startup warmup. Each run is a
+new process so nothing is already cached in `sys.modules`; the median of
+`--runs` smooths out disk-cache noise.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import List
+
+# Must stay out of the API's import graph
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "chromadb", "bs4", "lxml", "selectolax", "pdfplumber")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import knowledge_assistant.api.main as main
+elapsed = time.perf_counter() - t0
+from knowledge_assistant.services.metrics import METRICS
+print(json.dumps({
+    "import_s": elapsed,
+    "heavy": [m for m in %r if m in sys.modules],
+    "startup_s": METRICS.snapshot()["startup_s"],
+}))
+"""
+
+
+def measure(runs: int = 3) -> dict:
+    samples: List[dict] = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE % (HEAVY_MODULES,)], capture_output=True, text=True, check=True
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    times = [s["import_s"] for s in samples]
+    return {
+        "runs": runs,
+        "import_s_median": round(statistics.median(times), 4),
+        "import_s_max": round(max(times), 4),
+        "heavy_modules_imported": sorted({m for s in samples for m in s["heavy"]}),
+        "startup_s": samples[-1]["startup_s"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-s", type=float, default=0.0, help="fail above this median import time; 0 = report only")
+    args = parser.parse_args()
+    report = measure(args.runs)
+    failures: List[str] = []
+    if report["heavy_modules_imported"]:
+        failures.append(f"heavy modules imported at startup: {', '.join(report['heavy_modules_imported'])}")
+    if args.budget_s > 0 and report["import_s_median"] > args.budget_s:
+        failures.append(f"import took {report['import_s_median']}s, budget {args.budget_s}s")
+    report["failures"] = failures
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Recall@k and latency of the flat index's quantized first pass against exact search.
+
+    python -m benchmarks.vectors --rows 50000 --top-k 10 --oversample 2 4 8
+    python -m benchmarks.vectors --collection docs-python-org   # real vectors from CHROMA_DIRECTORY
+
+For every mode (none / int8 / binary) and oversample factor this reports
+recall@k of the quantized search against the exact one, per-query latency
+and bytes per stored vector, which is what VECTOR_QUANTIZATION and
+VECTOR_QUANTIZATION_OVERRIDES trade off.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import statistics
+import tempfile
+import time
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from knowledge_assistant.services.flat_index import FlatHit, FlatIndex
+from knowledge_assistant.services.quantization import MODES
+
+
+def synthetic_vectors(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Unit vectors drawn around `clusters` centres, closer to sentence embeddings than iid noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    x = centres[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def collection_vectors(name: str, page_size: int = 5000) -> np.ndarray:
+    from knowledge_assistant.api.config import Settings
+    from knowledge_assistant.services.registry import get_registry
+
+    collection = get_registry(Settings()).get_collection(name)
+    pages: List[np.ndarray] = []
+    offset = 0
+    while True:
+        res = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if not res.get("ids"):
+            break
+        pages.append(np.asarray(res["embeddings"], dtype=np.float32))
+        offset += len(res["ids"])
+    if not pages:
+        raise SystemExit(f"Collection '{name}' is empty")
+    return np.concatenate(pages)
+
+
+def split_queries(vectors: np.ndarray, n: int, noise: float, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Hold out `n` rows and perturb them into queries that are near, but not in, the index."""
+    rng = np.random.default_rng(seed)
+    held = rng.choice(vectors.shape[0], min(n, vectors.shape[0] // 10 or 1), replace=False)
+    mask = np.ones(vectors.shape[0], dtype=bool)
+    mask[held] = False
+    queries = vectors[held] + noise * rng.standard_normal((len(held), vectors.shape[1])).astype(np.float32)
+    return vectors[mask], queries
+
+
+def recall_at_k(found: Sequence[List[FlatHit]], truth: Sequence[List[FlatHit]], k: int) -> float:
+    hits = [len({h.id for h in f[:k]} & {h.id for h in t[:k]}) / max(1, min(k, len(t))) for f, t in zip(found, truth)]
+    return statistics.fmean(hits) if hits else 0.0
+
+
+def _timed_search(index: FlatIndex, queries: np.ndarray, k: int, batch: int, exact: bool = False):
+    results: List[List[FlatHit]] = []
+    per_query_ms: List[float] = []
+    for i in range(0, len(queries), batch):
+        t0 = time.perf_counter()
+        results.extend(index.search(queries[i:i + batch], k, exact=exact))
+        per_query_ms.append((time.perf_counter() - t0) * 1000.0 / len(queries[i:i + batch]))
+    return results, statistics.median(per_query_ms)
+
+
+def run(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    top_k: int = 10,
+    oversample: Sequence[int] = (2, 4, 8),
+    modes: Sequence[str] = ("int8", "binary"),
+    dtype: str = "float32",
+    batch: int = 1,
+) -> dict:
+    workdir = tempfile.mkdtemp(prefix="ka-vectors-")
+    ids = [str(i) for i in range(vectors.shape[0])]
+    empty = [{}] * len(ids)
+    report: dict = {"rows": len(ids), "dim": int(vectors.shape[1]), "queries": len(queries), "top_k": top_k}
+    try:
+        exact_index = FlatIndex(f"{workdir}/none", dtype=dtype)
+        exact_index.upsert(ids, vectors, [""] * len(ids), empty)
+        truth, exact_ms = _timed_search(exact_index, queries, top_k, batch, exact=True)
+        stats = exact_index.stats()
+        report["none"] = {"bytes_per_vector": stats["vector_bytes"] / stats["rows"], "query_ms": round(exact_ms, 3)}
+        for mode in modes:
+            index = FlatIndex(f"{workdir}/{mode}", dtype=dtype, quantization=mode)
+            index.upsert(ids, vectors, [""] * len(ids), empty)
+            stats = index.stats()
+            out: dict = {"code_bytes_per_vector": stats["code_bytes"] / stats["rows"]}
+            for factor in oversample:
+                index.rescore_factor = factor
+                found, ms = _timed_search(index, queries, top_k, batch)
+                out[f"x{factor}"] = {"recall": round(recall_at_k(found, truth, top_k), 4), "query_ms": round(ms, 3)}
+            report[mode] = out
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", help="benchmark the vectors of this Chroma collection")
+    parser.add_argument("--rows", type=int, default=50000, help="synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.02, help="per-dimension query perturbation")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--modes", nargs="+", default=["int8", "binary"], choices=[m for m in MODES if m != "none"])
+    parser.add_argument("--dtype", default="float32", help="storage dtype of the full-precision vectors")
+    parser.add_argument("--batch", type=int, default=1, help="queries per search call")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.collection:
+        vectors = collection_vectors(args.collection)
+    else:
+        vectors = synthetic_vectors(args.rows, args.dim, args.clusters, args.seed)
+    vectors, queries = split_queries(vectors, args.queries, args.noise, args.seed)
+    report = run(vectors, queries, args.top_k, args.oversample, args.modes, args.dtype, args.batch)
+    if args.collection:
+        report["collection"] = args.collection
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,103 @@ class Settings:
     llm_backend: str = os.getenv("LLM_BACKEND", "openai")
     embed_model_name: str = os.getenv("EMBED_MODEL_NAME", "all-MiniLM-L6-v2")
     chroma_directory: str = os.getenv("CHROMA_DIRECTORY", "./chroma_db")
+    google_api_key: str = os.getenv("GOOGLE_API_KEY", "")
+    google_cse_id: str = os.getenv("GOOGLE_CSE_ID", "")
+    embed_batch_window_ms: float = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))
+    embed_batch_max_size: int = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+    retrieval_max_workers: int = int(os.getenv("RETRIEVAL_MAX_WORKERS", "8"))
+    # Per collection query, counted from when a pool thread picks it up
+    retrieval_collection_timeout_s: float = float(os.getenv("RETRIEVAL_COLLECTION_TIMEOUT_S", "5"))
+    collection_list_ttl_s: float = float(os.getenv("COLLECTION_LIST_TTL_S", "30"))
+    retrieval_cache_max_bytes: int = int(os.getenv("RETRIEVAL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    retrieval_cache_ttl_s: float = float(os.getenv("RETRIEVAL_CACHE_TTL_S", "300"))
+    # 0 disables the embedding-similarity tier; e.g. 0.97 reuses near-identical questions
+    retrieval_cache_semantic_threshold: float = float(os.getenv("RETRIEVAL_CACHE_SEMANTIC_THRESHOLD", "0"))
+    # "mmr" (embedding similarity) or "url" (one chunk per source URL first)
+    diversity_mode: str = os.getenv("DIVERSITY_MODE", "mmr").lower()
+    # 1.0 ranks by relevance only, lower values favour chunks unlike those already picked
+    mmr_lambda: float = float(os.getenv("MMR_LAMBDA", "0.7"))
+    # Most chunks one source URL may contribute under MMR; 0 = no cap
+    mmr_max_per_url: int = int(os.getenv("MMR_MAX_PER_URL", "0"))
+    # BM25 index kept next to Chroma; its hits are fused with the vector results by reciprocal rank
+    lexical_search: bool = os.getenv("LEXICAL_SEARCH", "true").lower() in ("1", "true", "yes")
+    rrf_k: int = int(os.getenv("RRF_K", "60"))
+    # BM25 lookups get their own threads so they never queue ahead of collection queries
+    lexical_max_workers: int = int(os.getenv("LEXICAL_MAX_WORKERS", "2"))
+    lexical_compact_batches: int = int(os.getenv("LEXICAL_COMPACT_BATCHES", "32"))
+    lexical_compact_dead_ratio: float = float(os.getenv("LEXICAL_COMPACT_DEAD_RATIO", "0.25"))
+    # Domain-less queries search only the collections whose k-means representatives
+    # are closest: the best ROUTING_TOP_M plus any scoring within ROUTING_MARGIN of the last of them
+    collection_routing: bool = os.getenv("COLLECTION_ROUTING", "true").lower() in ("1", "true", "yes")
+    routing_top_m: int = int(os.getenv("ROUTING_TOP_M", "4"))
+    routing_margin: float = float(os.getenv("ROUTING_MARGIN", "0.05"))
+    routing_representatives: int = int(os.getenv("ROUTING_REPRESENTATIVES", "4"))
+    # Most questions one /ask/batch or /search/batch request may carry
+    batch_max_items: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+    # Questions encoded and queried together; bounds a batch request's working set
+    batch_chunk_size: int = int(os.getenv("BATCH_CHUNK_SIZE", "64"))
+    ingest_fetch_workers: int = int(os.getenv("INGEST_FETCH_WORKERS", "8"))
+    ingest_per_host_concurrency: int = int(os.getenv("INGEST_PER_HOST_CONCURRENCY", "2"))
+    ingest_parse_workers: int = int(os.getenv("INGEST_PARSE_WORKERS", "2"))
+    ingest_queue_size: int = int(os.getenv("INGEST_QUEUE_SIZE", "16"))
+    ingest_embed_batch_size: int = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "256"))
+    ingest_upsert_batch_size: int = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "1000"))
+    embed_cache_enabled: bool = os.getenv("EMBED_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    embed_cache_capacity: int = int(os.getenv("EMBED_CACHE_CAPACITY", "100000"))
+    embed_cache_dtype: str = os.getenv("EMBED_CACHE_DTYPE", "float32")
+    # Unix socket of a shared embedding server (python -m knowledge_assistant.services.embed_server); empty = in-process
+    embed_server_socket: str = os.getenv("EMBED_SERVER_SOCKET", "")
+    embed_server_workers: int = int(os.getenv("EMBED_SERVER_WORKERS", "1"))
+    # Intra-op threads per server worker; 0 divides the CPUs between workers
+    embed_server_threads: int = int(os.getenv("EMBED_SERVER_THREADS", "0"))
+    embed_server_batch_size: int = int(os.getenv("EMBED_SERVER_BATCH_SIZE", "256"))
+    embed_server_timeout_s: float = float(os.getenv("EMBED_SERVER_TIMEOUT_S", "30"))
+    # Encode in-process while the server is unreachable, retrying it every EMBED_SERVER_RETRY_S
+    embed_server_fallback: bool = os.getenv("EMBED_SERVER_FALLBACK", "true").lower() in ("1", "true", "yes")
+    embed_server_retry_s: float = float(os.getenv("EMBED_SERVER_RETRY_S", "10"))
+    # Near-duplicate chunks (SimHash within DEDUP_MAX_DISTANCE of 64 bits) of one collection are stored once
+    ingest_dedup: bool = os.getenv("INGEST_DEDUP", "true").lower() in ("1", "true", "yes")
+    dedup_max_distance: int = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+    ingest_incremental: bool = os.getenv("INGEST_INCREMENTAL", "true").lower() in ("1", "true", "yes")
+    ingest_job_workers: int = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+    pdf_max_bytes: int = int(os.getenv("PDF_MAX_BYTES", str(100 * 1024 * 1024)))
+    pdf_max_pages: int = int(os.getenv("PDF_MAX_PAGES", "2000"))
+    pdf_workers: int = int(os.getenv("PDF_WORKERS", "2"))
+    pdf_pages_per_task: int = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+    # HTML bodies are cut off after HTML_MAX_BYTES; HTML_PARSER: auto, selectolax, lxml or html.parser
+    html_max_bytes: int = int(os.getenv("HTML_MAX_BYTES", str(10 * 1024 * 1024)))
+    html_parser: str = os.getenv("HTML_PARSER", "auto").lower()
+    html_strip_boilerplate: bool = os.getenv("HTML_STRIP_BOILERPLATE", "true").lower() in ("1", "true", "yes")
+    # "chroma" or "flat" (memory-mapped exact search kept in sync on every write)
+    vector_backend: str = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    flat_index_dtype: str = os.getenv("FLAT_INDEX_DTYPE", "float32")
+    flat_index_max_segments: int = int(os.getenv("FLAT_INDEX_MAX_SEGMENTS", "16"))
+    flat_index_compact_dead_ratio: float = float(os.getenv("FLAT_INDEX_COMPACT_DEAD_RATIO", "0.25"))
+    # Flat backend first pass over compact codes: "none", "int8" or "binary"
+    vector_quantization: str = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+    # Per-collection overrides, e.g. "docs-python-org=int8,arxiv-org=binary"
+    vector_quantization_overrides: str = os.getenv("VECTOR_QUANTIZATION_OVERRIDES", "")
+    # Candidates rescored at full precision = top_k * this factor
+    vector_oversample_factor: int = int(os.getenv("VECTOR_OVERSAMPLE_FACTOR", "4"))
+    # "background" (serve at once, /health/ready turns 200 when warm), "blocking" (warm before serving) or "off"
+    startup_warmup: str = os.getenv("STARTUP_WARMUP", "background").lower()
+    # Per work class: threads, requests allowed to wait for one (beyond that: 429) and the deadline (503 once missed)
+    scheduler_query_workers: int = int(os.getenv("SCHEDULER_QUERY_WORKERS", "8"))
+    scheduler_query_queue: int = int(os.getenv("SCHEDULER_QUERY_QUEUE", "64"))
+    scheduler_query_deadline_s: float = float(os.getenv("SCHEDULER_QUERY_DEADLINE_S", "10"))
+    scheduler_generation_workers: int = int(os.getenv("SCHEDULER_GENERATION_WORKERS", "4"))
+    scheduler_generation_queue: int = int(os.getenv("SCHEDULER_GENERATION_QUEUE", "32"))
+    scheduler_generation_deadline_s: float = float(os.getenv("SCHEDULER_GENERATION_DEADLINE_S", "60"))
+    scheduler_ingest_workers: int = int(os.getenv("SCHEDULER_INGEST_WORKERS", "2"))
+    scheduler_ingest_queue: int = int(os.getenv("SCHEDULER_INGEST_QUEUE", "8"))
+    scheduler_ingest_deadline_s: float = float(os.getenv("SCHEDULER_INGEST_DEADLINE_S", "900"))
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    # GET /snapshot serves the whole store unauthenticated; only enable it on a private network
+    snapshot_endpoint_enabled: bool = os.getenv("SNAPSHOT_ENDPOINT_ENABLED", "false").lower() in ("1", "true", "yes")
+    # Requests slower than this get a sampled stack profile written to profile_dir; 0 disables
+    profile_slow_ms: float = float(os.getenv("PROFILE_SLOW_MS", "0"))
+    profile_dir: str = os.getenv("PROFILE_DIR", "./profiles")
+    profile_interval_ms: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
 
     def __post_init__(self) -> None:
         self.chroma_directory = os.path.abspath(self.chroma_directory)
@@ -20,6 +117,3 @@ class Settings:
             self.port = int(self.port)
         except ValueError as exc:
             raise ValueError(f"Invalid PORT value: {self.port}") from exc
-            
-google_api_key: str = os.getenv("GOOGLE_API_KEY", "")
-google_cse_id: str = os.getenv("GOOGLE_CSE_ID", "")
\ No newline at end of file
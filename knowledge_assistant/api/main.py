@@ -1,36 +1,139 @@
 from __future__ import annotations
 
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import asyncio
 import json
 import logging
-import time
-from typing import List
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, Iterator, List, Sequence, Tuple
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
 from knowledge_assistant.api.config import Settings
 from knowledge_assistant.api.models import (
     HealthResponse,
     IngestRequest,
     IngestResponse,
+    IngestJobResponse,
+    UrlProgress,
     AskRequest,
     AskResponse,
+    AskBatchRequest,
+    AskBatchLine,
     SourceItem,
     SearchResponse,
+    SearchBatchRequest,
+    SearchBatchLine,
 )
-from knowledge_assistant.services.ingest import ingest_and_embed
-from knowledge_assistant.services.retrieval import Retriever
+from knowledge_assistant.services.ingest import ingest_urls
+from knowledge_assistant.services.jobs import IngestJob, IngestJobManager
+from knowledge_assistant.services.retrieval import BatchQuery, RetrievedChunk, Retriever
 from knowledge_assistant.services.llm_adapter import LLMAdapter, SourceForPrompt
-from knowledge_assistant.services.embed_store import EmbedStore
+from knowledge_assistant.services.registry import get_registry
 from knowledge_assistant.services.metrics import METRICS
+from knowledge_assistant.services.scheduler import Overloaded, Scheduler
 from knowledge_assistant.services import search as search_service
+from knowledge_assistant.services.snapshot import iter_snapshot, iter_tar
+
+METRICS.record_startup("import knowledge_assistant.api.main", time.perf_counter() - _IMPORT_STARTED)
 
 logger = logging.getLogger(__name__)
 
+_NO_ANSWER = "I don't know based on the available sources."
+
+
+def _prepare_sources(retrieved: List[RetrievedChunk]) -> Tuple[List[SourceForPrompt], List[SourceItem]]:
+    """Prompt snippets and the response's source list for the retrieved chunks."""
+    src_for_prompt: List[SourceForPrompt] = []
+    sources_payload: List[SourceItem] = []
+    for ch in retrieved:
+        snippet = ch.text.strip()
+        if len(snippet) > 300:
+            snippet = snippet[:300] + "…"
+        url = ch.url or ""
+        src_for_prompt.append(SourceForPrompt(url=url, snippet=snippet))
+        sources_payload.append(SourceItem(title=None, url=url or None, snippet=snippet))
+    return src_for_prompt, sources_payload
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _check_batch_size(items: Sequence, settings: Settings) -> None:
+    if len(items) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=413, detail=f"At most {settings.batch_max_items} items per batch, got {len(items)}"
+        )
+
+
+_NDJSON_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 def create_app() -> FastAPI:
+    t_create = time.perf_counter()
     settings = Settings()
-    app = FastAPI(title="Modular Knowledge Assistant", version="0.2.0")
+    registry = get_registry(settings)
+    retriever = Retriever(settings)
+    llm = LLMAdapter(settings)
+    scheduler = Scheduler(settings)
+    query_work, generation_work, ingest_work = scheduler["query"], scheduler["generation"], scheduler["ingest"]
+    jobs: IngestJobManager | None = None
+
+    METRICS.configure(
+        enabled=settings.metrics_enabled,
+        profile_slow_ms=settings.profile_slow_ms,
+        profile_dir=settings.profile_dir,
+        profile_interval_ms=settings.profile_interval_ms,
+    )
+    METRICS.register_gauges("embed_batcher", registry.batcher_stats)
+    METRICS.register_gauges("embed_cache", registry.embed_cache_stats)
+    METRICS.register_gauges("embed_server", registry.embed_server_stats)
+    METRICS.register_gauges("retrieval_cache", retriever.cache.stats)
+    METRICS.register_gauges("flat_index", registry.flat_index_stats)
+    METRICS.register_gauges("lexical_index", registry.lexical_stats)
+    METRICS.register_gauges("routing_index", registry.routing_stats)
+    METRICS.register_gauges("dedup_index", registry.dedup_stats)
+    METRICS.register_gauges("scheduler", scheduler.stats)
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+        nonlocal jobs
+        if settings.startup_warmup == "blocking":
+            try:
+                await asyncio.to_thread(registry.warmup)
+            except Exception:
+                logger.exception("Warmup failed; resources will load on first use")
+        elif settings.startup_warmup == "background":
+            registry.start_warmup()
+        jobs = IngestJobManager(settings)
+        jobs.resume()
+        yield
+        jobs.shutdown()
+        scheduler.shutdown()
+
+    def _jobs() -> IngestJobManager:
+        if jobs is None:
+            raise HTTPException(status_code=503, detail="Job manager is not running")
+        return jobs
+
+    def _job_response(job: IngestJob) -> IngestJobResponse:
+        return IngestJobResponse(
+            job_id=job.id,
+            status=job.status,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            error=job.error,
+            urls=[UrlProgress(**job.progress[u]) for u in job.urls],
+        )
+
+    app = FastAPI(title="Modular Knowledge Assistant", version="0.2.0", lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -40,30 +143,90 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    @app.exception_handler(Overloaded)
+    async def overloaded(_: Request, exc: Overloaded) -> JSONResponse:
+        # 429: this kind of work has a full queue; 503: its deadline cannot be met
+        return JSONResponse(
+            {"detail": str(exc)}, status_code=exc.status_code, headers={"Retry-After": exc.retry_after}
+        )
+
+    @app.middleware("http")
+    async def time_requests(request: Request, call_next):
+        if not METRICS.enabled:
+            return await call_next(request)
+        token = METRICS.request_started()
+        t0 = time.perf_counter()
+        try:
+            return await call_next(request)
+        finally:
+            # Label by route template, not raw path, so job ids don't explode cardinality
+            route = request.scope.get("route")
+            name = f"{request.method} {getattr(route, 'path', request.url.path)}"
+            METRICS.observe(f"http {name}", (time.perf_counter() - t0) * 1000.0)
+            METRICS.request_finished(name, token)
+
     @app.get("/health", response_model=HealthResponse)
     async def health() -> HealthResponse:
-        store = EmbedStore(settings)
+        # Lists collections only once the client is open; a probe never loads anything
+        if not registry.readiness()["client_open"]:
+            return HealthResponse(status="ok", environment=settings.environment, detail="service is starting")
         try:
-            cols = [c.name for c in store.client.list_collections()]
+            cols = await asyncio.to_thread(registry.collection_names)
         except Exception:
             cols = []
         return HealthResponse(status="ok", environment=settings.environment, vector_collections=cols, detail="service is running")
 
+    @app.get("/health/live")
+    async def health_live() -> dict:
+        """Liveness: the event loop answers. Touches no resource."""
+        return {"status": "ok"}
+
+    @app.get("/health/ready")
+    async def health_ready() -> JSONResponse:
+        """Readiness: 200 once the model and client are warm, 503 while warming up."""
+        state = registry.readiness()
+        # Without a startup warmup resources load on first use, so there is nothing to wait for
+        ready = bool(state["warm"]) or settings.startup_warmup == "off"
+        return JSONResponse({"status": "ready" if ready else "warming", **state}, status_code=200 if ready else 503)
+
     @app.post("/ingest", response_model=IngestResponse)
     async def ingest(request: IngestRequest) -> IngestResponse:
-        import time as _time
-        t0 = _time.time()
+        t0 = time.perf_counter()
         METRICS.inc("/ingest")
         try:
-            ids: List[str] = await asyncio.to_thread(
-                ingest_and_embed, [str(u) for u in request.urls], settings
+            results = await ingest_work.run(
+                partial(ingest_urls, [str(u) for u in request.urls], settings), deadline=ingest_work.deadline()
             )
+        except Overloaded:
+            raise
         except Exception as exc:
             logger.exception("Ingestion failed")
             raise HTTPException(status_code=500, detail=str(exc))
-        duration_ms = int((_time.time() - t0) * 1000)
+        ids = [cid for r in results for cid in r.ids]
+        skipped = [cid for r in results for cid in r.duplicates_skipped]
+        duration_ms = int((time.perf_counter() - t0) * 1000)
         METRICS.record_ingest(docs=len(request.urls), chunks=len(ids), duration_ms=duration_ms)
-        return IngestResponse(message="Ingestion complete", ids=ids)
+        return IngestResponse(message="Ingestion complete", ids=ids, duplicates_skipped=skipped)
+
+    @app.post("/ingest/jobs", response_model=IngestJobResponse, status_code=202)
+    async def create_ingest_job(request: IngestRequest) -> IngestJobResponse:
+        METRICS.inc("/ingest/jobs")
+        job = _jobs().submit([str(u) for u in request.urls])
+        return _job_response(job)
+
+    @app.get("/ingest/jobs/{job_id}", response_model=IngestJobResponse)
+    async def get_ingest_job(job_id: str) -> IngestJobResponse:
+        job = _jobs().get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return _job_response(job)
+
+    @app.delete("/ingest/jobs/{job_id}", response_model=IngestJobResponse)
+    async def cancel_ingest_job(job_id: str) -> IngestJobResponse:
+        job = _jobs().cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return _job_response(job)
 
     # ---- NEW: /ask ----
     @app.post("/ask", response_model=AskResponse)
@@ -72,35 +235,25 @@ def create_app() -> FastAPI:
         METRICS.inc("/ask")
         t_ret0 = time.time()
 
-        retriever = Retriever(settings)
-        llm = LLMAdapter(settings)
-
-        # retrieval
-        retrieved = await asyncio.to_thread(
-            retriever.query,
-            req.question,
-            req.top_k,
-            req.domain,  # may be None (search across all)
+        # retrieval; the deadline also bounds the per-collection Chroma queries
+        deadline = query_work.deadline()
+        retrieved = await query_work.run(
+            partial(retriever.query, req.question, req.top_k, req.domain, deadline=deadline),  # domain None = all
+            deadline=deadline,
         )
         retrieval_ms = int((time.time() - t_ret0) * 1000)
 
         if not retrieved:
-            answer = "I don't know based on the available sources."
-            return AskResponse(answer=answer, sources=[])
+            return AskResponse(answer=_NO_ANSWER, sources=[])
 
         # Prepare sources for prompt + response
-        src_for_prompt: List[SourceForPrompt] = []
-        sources_payload: List[SourceItem] = []
-        for i, ch in enumerate(retrieved, start=1):
-            snippet = ch.text.strip()
-            if len(snippet) > 300:
-                snippet = snippet[:300] + "…"
-            url = ch.url or ""
-            src_for_prompt.append(SourceForPrompt(url=url, snippet=snippet))
-            sources_payload.append(SourceItem(title=None, url=url or None, snippet=snippet))
+        src_for_prompt, sources_payload = _prepare_sources(retrieved)
 
         # generation (dummy/local)
-        answer = await asyncio.to_thread(llm.answer, req.question, src_for_prompt)
+        deadline = generation_work.deadline()
+        answer = await generation_work.run(
+            partial(llm.answer, req.question, src_for_prompt, deadline=deadline), deadline=deadline
+        )
 
         # Telemetry log (console JSON)
         telemetry = {
@@ -117,17 +270,202 @@ def create_app() -> FastAPI:
 
         return AskResponse(answer=answer, sources=sources_payload)
 
+    @app.post("/ask/stream")
+    async def ask_stream(req: AskRequest, request: Request) -> StreamingResponse:
+        """
+        Server-Sent Events: one `sources` event as soon as retrieval is done,
+        then `token` events as the answer is generated, then `done` (or
+        `error`). Generation stops when the client goes away.
+        """
+        t0 = time.perf_counter()
+        METRICS.inc("/ask/stream")
+        # Refuse with a status code while we still can; once streaming, errors become events
+        retrieval_deadline = query_work.deadline()
+        query_work.check(retrieval_deadline)
+        generation_work.check()
+
+        async def events() -> AsyncIterator[str]:
+            try:
+                retrieved = await query_work.run(
+                    partial(retriever.query, req.question, req.top_k, req.domain, deadline=retrieval_deadline),
+                    deadline=retrieval_deadline,
+                )
+            except Overloaded as exc:
+                yield _sse("error", {"detail": str(exc), "retry_after": exc.retry_after})
+                return
+            except Exception as exc:
+                logger.exception("Retrieval failed for /ask/stream")
+                yield _sse("error", {"detail": str(exc)})
+                return
+            src_for_prompt, sources_payload = _prepare_sources(retrieved)
+            yield _sse("sources", {"sources": [s.model_dump(mode="json") for s in sources_payload]})
+            METRICS.observe("ask_first_source", (time.perf_counter() - t0) * 1000.0)
+
+            if not retrieved:
+                yield _sse("token", {"text": _NO_ANSWER})
+                yield _sse("done", {"answer_chars": len(_NO_ANSWER), "n_returned": 0})
+                return
+            t_gen = time.perf_counter()
+            chars = 0
+            finished = False
+            deadline = generation_work.deadline()
+            stream = llm.astream(req.question, src_for_prompt, deadline=deadline)
+            try:
+                async with generation_work.hold(deadline):
+                    async for piece in stream:
+                        if await request.is_disconnected():
+                            return
+                        if not chars:
+                            METRICS.observe("ask_first_token", (time.perf_counter() - t0) * 1000.0)
+                        chars += len(piece)
+                        yield _sse("token", {"text": piece})
+            except Overloaded as exc:
+                yield _sse("error", {"detail": str(exc), "retry_after": exc.retry_after})
+                finished = True
+                return
+            except Exception as exc:
+                logger.exception("Generation failed for /ask/stream")
+                yield _sse("error", {"detail": str(exc)})
+                finished = True
+                return
+            else:
+                finished = True
+            finally:
+                # Runs on disconnect/cancellation too, so the backend stops generating
+                await stream.aclose()
+                METRICS.observe("llm_stream", (time.perf_counter() - t_gen) * 1000.0)
+                if not finished:
+                    METRICS.count("stream_disconnects", endpoint="/ask/stream")
+                    logger.info("Client disconnected from /ask/stream; generation cancelled")
+            total_ms = int((time.perf_counter() - t0) * 1000)
+            logger.info(json.dumps({
+                "endpoint": "/ask/stream",
+                "domain": req.domain or "*",
+                "top_k": req.top_k,
+                "n_returned": len(retrieved),
+                "answer_chars": chars,
+                "latency_ms": total_ms,
+            }))
+            yield _sse("done", {"answer_chars": chars, "n_returned": len(retrieved), "latency_ms": total_ms})
+
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            # No caching, and ask nginx-style proxies not to buffer the stream
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.post("/ask/batch")
+    async def ask_batch(req: AskBatchRequest) -> StreamingResponse:
+        """
+        Answers many questions in one request, streamed as NDJSON: one
+        AskBatchLine per item, in request order. Retrieval is batched (one
+        encode and one query per collection per chunk of questions);
+        diversity and answering run per item.
+        """
+        _check_batch_size(req.items, settings)
+        # Admitted as a whole: retrieval steps run on query threads and answers on generation
+        # threads, one item after another, without a deadline
+        query_work.check()
+        generation_work.check()
+        METRICS.inc("/ask/batch")
+        METRICS.count("batch_items", len(req.items), endpoint="/ask/batch")
+        items = req.items
+
+        async def lines() -> AsyncIterator[str]:
+            queries = [BatchQuery(question=it.question, top_k=it.top_k, collection_name=it.domain) for it in items]
+            results = retriever.query_batch(queries, settings.batch_chunk_size)
+            for index, item in enumerate(items):
+                try:
+                    # A default for next(): StopIteration cannot cross a future
+                    result = await query_work.run(partial(next, results, None), admitted=True)
+                    retrieved = result.chunks if result is not None else []
+                except Exception as exc:
+                    logger.exception("Retrieval failed for /ask/batch")
+                    # The shared iterator is gone; report the rest rather than dropping them
+                    for i in range(index, len(items)):
+                        yield AskBatchLine(index=i, error=str(exc)).model_dump_json() + "\n"
+                    return
+                if not retrieved:
+                    line = AskBatchLine(index=index, answer=_NO_ANSWER)
+                else:
+                    src_for_prompt, sources_payload = _prepare_sources(retrieved)
+                    try:
+                        answer = await generation_work.run(
+                            partial(llm.answer, item.question, src_for_prompt), admitted=True
+                        )
+                        line = AskBatchLine(index=index, answer=answer, sources=sources_payload)
+                    except Exception as exc:
+                        logger.warning(f"Generation failed for /ask/batch item {index}: {exc}")
+                        line = AskBatchLine(index=index, error=str(exc))
+                yield line.model_dump_json() + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers=_NDJSON_HEADERS)
+
     @app.get("/search", response_model=SearchResponse)
     async def search(q: str = Query(..., min_length=1), num: int = Query(5, ge=1, le=10)) -> SearchResponse:
-        from knowledge_assistant.services.metrics import METRICS as _M #import issue here -3
-        _M.inc("/search")
-        results = await asyncio.to_thread(search_service.search, q, num, settings)
+        METRICS.inc("/search")
+        deadline = query_work.deadline()
+        results = await query_work.run(
+            partial(search_service.search, q, num, settings, deadline=deadline), deadline=deadline
+        )
         return SearchResponse(results=results)
 
+    @app.post("/search/batch")
+    async def search_batch(req: SearchBatchRequest) -> StreamingResponse:
+        """Local semantic search for many queries, streamed as NDJSON SearchBatchLines in request order."""
+        _check_batch_size(req.items, settings)
+        query_work.check()
+        METRICS.inc("/search/batch")
+        METRICS.count("batch_items", len(req.items), endpoint="/search/batch")
+        items = req.items
+
+        def lines() -> Iterator[str]:
+            results = search_service.search_batch([(it.q, it.num, it.domain) for it in items], settings)
+            for index in range(len(items)):
+                try:
+                    line = SearchBatchLine(index=index, results=next(results))
+                except Exception as exc:
+                    logger.exception("Retrieval failed for /search/batch")
+                    for i in range(index, len(items)):
+                        yield SearchBatchLine(index=i, error=str(exc)).model_dump_json() + "\n"
+                    return
+                yield line.model_dump_json() + "\n"
+
+        return StreamingResponse(
+            query_work.iterate(lines()), media_type="application/x-ndjson", headers=_NDJSON_HEADERS
+        )
+
+    @app.get("/snapshot")
+    async def snapshot(
+        since: float | None = Query(None, description="Only changes after this unix time (a snapshot's started_at)"),
+        collection: List[str] | None = Query(None, description="Only these collections"),
+    ) -> StreamingResponse:
+        """
+        The vector store as a tar stream for bootstrapping a replica:
+        `python -m knowledge_assistant.services.snapshot import http://host/snapshot`.
+        Off unless SNAPSHOT_ENDPOINT_ENABLED is set.
+        """
+        if not settings.snapshot_endpoint_enabled:
+            raise HTTPException(status_code=404, detail="Not Found")
+        # Bulk reads of the whole store: run on the ingest threads, away from queries
+        ingest_work.check()
+        members = iter_snapshot(settings, since=since, collections=collection)
+        return StreamingResponse(
+            ingest_work.iterate(iter_tar(members)),
+            media_type="application/x-tar",
+            headers={"Content-Disposition": 'attachment; filename="snapshot.tar"'},
+        )
+
     @app.get("/metrics")
     async def metrics() -> dict:
         return METRICS.snapshot()
 
+    @app.get("/metrics/prometheus", response_class=PlainTextResponse)
+    async def metrics_prometheus() -> PlainTextResponse:
+        return PlainTextResponse(METRICS.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+    METRICS.record_startup("create app", time.perf_counter() - t_create)
     return app
 
 app = create_app()
\ No newline at end of file
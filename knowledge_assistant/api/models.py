@@ -8,6 +8,34 @@ class IngestRequest(BaseModel):
 class IngestResponse(BaseModel):
     message: str = Field(..., description="Status message")
     ids: List[str] = Field(..., description="Chunk identifiers stored in the vector DB")
+    duplicates_skipped: List[str] = Field(
+        default_factory=list, description="Chunk identifiers not stored because a near-identical chunk already was"
+    )
+
+class UrlProgress(BaseModel):
+    url: str = Field(..., description="Document URL")
+    status: str = Field(..., description="pending, ok, unchanged, empty, failed, cancelled or duplicate")
+    stage: str = Field(..., description="Last stage reached: queued, fetched, chunked, embedded, upserted or done")
+    chunks: int = Field(0, description="Chunks produced so far")
+    embedded: int = Field(0, description="Chunks embedded so far")
+    upserted: int = Field(0, description="Chunks written to the vector DB so far")
+    added: int = Field(0, description="New chunk ids stored")
+    unchanged: int = Field(0, description="Chunk ids already stored")
+    duplicates: int = Field(0, description="New chunks folded into a near-identical stored chunk instead of embedded")
+    removed: int = Field(0, description="Stale chunk ids deleted")
+    fetched_bytes: int = Field(0, description="Body bytes downloaded")
+    text_bytes: int = Field(0, description="Bytes of text extracted from the body")
+    parse_ms: float = Field(0.0, description="Time spent extracting text, in milliseconds")
+    error: Optional[str] = Field(None, description="Error message, if any")
+
+class IngestJobResponse(BaseModel):
+    job_id: str = Field(..., description="Job identifier")
+    status: str = Field(..., description="queued, running, completed, failed or cancelled")
+    created_at: float = Field(..., description="Unix time the job was submitted")
+    started_at: Optional[float] = Field(None)
+    finished_at: Optional[float] = Field(None)
+    error: Optional[str] = Field(None)
+    urls: List[UrlProgress] = Field(default_factory=list, description="Per-URL progress")
 
 # UPDATED: include environment + vector collections
 class HealthResponse(BaseModel):
@@ -31,6 +59,16 @@ class AskResponse(BaseModel):
     answer: str = Field(..., description="Final answer with inline [n] citations")
     sources: List[SourceItem] = Field(..., description="List of sources cited in the answer")
 
+# ---- batch endpoints: one NDJSON line per item, in request order ----
+class AskBatchRequest(BaseModel):
+    items: List[AskRequest] = Field(..., min_length=1, description="Questions, each with its own top_k and domain")
+
+class AskBatchLine(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    answer: Optional[str] = Field(None)
+    sources: List[SourceItem] = Field(default_factory=list)
+    error: Optional[str] = Field(None, description="Set instead of an answer when this item failed")
+
 # NEW: /search schemas
 class SearchResult(BaseModel):
     title: Optional[str] = Field(None)
@@ -39,4 +77,17 @@ class SearchResult(BaseModel):
     type: str = Field(..., description="Result type: 'web' or 'local'")
 
 class SearchResponse(BaseModel):
-    results: List[SearchResult] = Field(default_factory=list)
\ No newline at end of file
+    results: List[SearchResult] = Field(default_factory=list)
+
+class SearchBatchItem(BaseModel):
+    q: str = Field(..., min_length=1, description="Search query")
+    num: int = Field(5, ge=1, le=10, description="Number of results")
+    domain: Optional[str] = Field(None, description="Collection name to restrict the search")
+
+class SearchBatchRequest(BaseModel):
+    items: List[SearchBatchItem] = Field(..., min_length=1)
+
+class SearchBatchLine(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    results: List[SearchResult] = Field(default_factory=list)
+    error: Optional[str] = Field(None)
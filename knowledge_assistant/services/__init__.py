@@ -1,2 +1,2 @@
 """Service layer for the Modular Knowledge Assistant."""
-__all__ = ["clean", "embed_store", "ingest"]
+__all__ = ["clean", "dedup", "embed_cache", "embed_server", "embed_store", "flat_index", "html_extract", "ingest", "jobs", "lexical", "manifest", "metrics", "pdf_extract", "pipeline", "quantization", "registry", "routing", "scheduler", "snapshot"]
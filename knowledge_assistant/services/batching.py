@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+EncodeFn = Callable[[List[str]], Sequence]
+
+
+@dataclass
+class _Pending:
+    text: str
+    future: Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching scheduler in front of a SentenceTransformer.
+
+    Query texts that arrive within `window_ms` of the first queued item (up
+    to `max_batch_size` of them) are encoded with a single `encode` call on a
+    dedicated worker thread; each caller receives its own vector through a
+    future. Use `encode` from worker threads and `aencode` from coroutines.
+    """
+
+    def __init__(self, encode_fn: EncodeFn, window_ms: float = 3.0, max_batch_size: int = 32) -> None:
+        self._encode_fn = encode_fn
+        self.window_s = max(0.0, window_ms) / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._batches = 0
+        self._items = 0
+        self._max_batch = 0
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        self._ensure_worker()
+        pending = _Pending(text=text, future=Future())
+        self._queue.put(pending)
+        return pending.future
+
+    def encode(self, text: str):
+        return self.submit(text).result()
+
+    async def aencode(self, text: str):
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self) -> List[_Pending]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            live = [p for p in batch if p.future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            try:
+                vectors = self._encode_fn([p.text for p in live])
+            except Exception as exc:
+                for p in live:
+                    p.future.set_exception(exc)
+                continue
+            for p, vec in zip(live, vectors):
+                p.future.set_result(vec)
+            self._record(live, started)
+
+    def _record(self, batch: List[_Pending], started: float) -> None:
+        waits = [(started - p.enqueued_at) * 1000.0 for p in batch]
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            self._wait_total_ms += sum(waits)
+            self._wait_max_ms = max(self._wait_max_ms, max(waits))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "max_batch_size": self._max_batch,
+                "avg_queue_wait_ms": round(self._wait_total_ms / self._items, 3) if self._items else 0.0,
+                "max_queue_wait_ms": round(self._wait_max_ms, 3),
+                "queue_depth": self._queue.qsize(),
+            }
@@ -1,38 +1,144 @@
 from __future__ import annotations
 
+import bisect
 import logging
 import re
-from typing import List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+_WS_RE = re.compile(r"\s+")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+_PARAGRAPH_RE = re.compile(r"\s*\n\s*\n\s*")
+_PARAGRAPH_MARK = "\n\n"
+
+_ENCODING_LOCK = threading.Lock()
+_ENCODING = None
+_ENCODING_ERROR: Optional[Exception] = None
+_ENCODING_FAILED_AT = 0.0
+# A failed load (e.g. no network to fetch the BPE file) is retried after this long
+_ENCODING_RETRY_S = 60.0
+_TOKEN_BYTE_LENGTHS: Optional[np.ndarray] = None
+
+
 def clean_text(text: str) -> str:
     """Collapse whitespace and trim."""
-    return re.sub(r"\s+", " ", text or "").strip()
+    return _WS_RE.sub(" ", text or "").strip()
 
-def _chunk_by_tokens(text: str, max_tokens: int = 250, overlap: int = 50) -> List[str]:
-    try:
-        import tiktoken
-    except ImportError:
-        logger.warning("tiktoken not available; falling back to character-based splitting")
-        raise
-    encoding = tiktoken.get_encoding("cl100k_base")
+
+def _clean_keep_paragraphs(text: str) -> str:
+    """Like clean_text, but keeps blank-line paragraph breaks as a single marker."""
+    paragraphs = (clean_text(p) for p in _PARAGRAPH_RE.split(text or ""))
+    return _PARAGRAPH_MARK.join(p for p in paragraphs if p)
+
+
+def _get_encoding():
+    """
+    Load the cl100k_base encoding once per process. Only a successful load
+    is kept; after a failure the error is re-raised without retrying for
+    _ENCODING_RETRY_S, then the load is attempted again.
+    """
+    global _ENCODING, _ENCODING_ERROR, _ENCODING_FAILED_AT
+    if _ENCODING is not None:
+        return _ENCODING
+    with _ENCODING_LOCK:
+        if _ENCODING is None:
+            if _ENCODING_ERROR is not None and time.monotonic() - _ENCODING_FAILED_AT < _ENCODING_RETRY_S:
+                raise _ENCODING_ERROR
+            try:
+                import tiktoken
+
+                encoding = tiktoken.get_encoding("cl100k_base")
+                _set_token_byte_lengths(encoding)
+            except Exception as exc:
+                logger.warning(f"tiktoken could not be loaded ({exc}); retrying in {_ENCODING_RETRY_S:.0f}s")
+                _ENCODING_ERROR, _ENCODING_FAILED_AT = exc, time.monotonic()
+                raise
+            _ENCODING, _ENCODING_ERROR = encoding, None
+        return _ENCODING
+
+
+def _set_token_byte_lengths(encoding) -> None:
+    """Byte length of every token id, so offsets can be computed without decoding."""
+    global _TOKEN_BYTE_LENGTHS
+    lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+    for token in range(encoding.n_vocab):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:
+            pass
+    _TOKEN_BYTE_LENGTHS = lengths
+
+
+def _token_char_offsets(text: str, tokens: List[int]) -> np.ndarray:
+    """
+    Character offset at which each token starts (same convention as
+    tiktoken's decode_with_offsets: a token starting mid-character maps to
+    that character), computed with array ops instead of per-token decoding.
+    """
+    assert _TOKEN_BYTE_LENGTHS is not None
+    byte_starts = np.zeros(len(tokens), dtype=np.int64)
+    np.cumsum(_TOKEN_BYTE_LENGTHS[np.asarray(tokens, dtype=np.int64)][:-1], out=byte_starts[1:])
+    if text.isascii():
+        return byte_starts
+    raw = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    # index of the character each byte belongs to (continuation bytes are 0b10xxxxxx)
+    char_of_byte = np.cumsum((raw & 0xC0) != 0x80) - 1
+    return char_of_byte[byte_starts]
+
+
+def _boundary_tokens(text: str, offsets: np.ndarray, align: str) -> List[int]:
+    """Token indices at which a sentence/paragraph starts."""
+    pattern = _PARAGRAPH_RE if align == "paragraph" else _SENTENCE_END_RE
+    ends = [m.end() for m in pattern.finditer(text)]
+    return np.searchsorted(offsets, ends, side="left").tolist() if ends else []
+
+
+def _chunk_by_tokens(
+    text: str, max_tokens: int = 250, overlap: int = 50, align: Optional[str] = None
+) -> List[str]:
+    """
+    Token windows over already-cleaned `text`. Window boundaries are mapped
+    back to character offsets and sliced out of `text` directly, so no
+    window is decoded or re-cleaned. With `align` ("sentence" or
+    "paragraph") a window ends at the last boundary in its second half.
+    """
+    encoding = _get_encoding()
     tokens = encoding.encode(text)
     if not tokens:
         return []
+    offsets = _token_char_offsets(text, tokens)
+    n = len(tokens)
+    boundaries = _boundary_tokens(text, offsets, align) if align else []
     chunks: List[str] = []
     start = 0
     step = max_tokens - overlap
-    while start < len(tokens):
-        end = min(len(tokens), start + max_tokens)
-        chunk_tokens = tokens[start:end]
-        chunk_str = encoding.decode(chunk_tokens)
-        chunk_cleaned = clean_text(chunk_str)
-        if chunk_cleaned:
-            chunks.append(chunk_cleaned)
-        start += step
+    while start < n:
+        end = min(n, start + max_tokens)
+        if boundaries and end < n:
+            i = bisect.bisect_right(boundaries, end) - 1
+            if i >= 0 and boundaries[i] > start + max_tokens // 2:
+                end = boundaries[i]
+        chunk = text[int(offsets[start]):int(offsets[end]) if end < n else len(text)].strip()
+        if align == "paragraph":
+            chunk = chunk.replace(_PARAGRAPH_MARK, " ")
+        if chunk:
+            chunks.append(chunk)
+        if boundaries:
+            if end == n:
+                break
+            start = max(start + 1, end - overlap)
+        else:
+            # Same stepping as the original decode-per-window chunker, tail window included
+            start += step
     return chunks
 
+
 def _chunk_by_chars(text: str, max_chars: int = 1000, overlap_chars: int = 200) -> List[str]:
     if not text:
         return []
@@ -48,13 +154,29 @@ def _chunk_by_chars(text: str, max_chars: int = 1000, overlap_chars: int = 200)
         start += step
     return chunks
 
-def chunk_text(text: str, max_tokens: int = 250, overlap: int = 50) -> List[str]:
-    cleaned = clean_text(text)
+
+def chunk_text(text: str, max_tokens: int = 250, overlap: int = 50, align: Optional[str] = None) -> List[str]:
+    cleaned = _clean_keep_paragraphs(text) if align == "paragraph" else clean_text(text)
     if not cleaned:
         return []
     try:
-        return _chunk_by_tokens(cleaned, max_tokens=max_tokens, overlap=overlap)
-    except Exception:
+        return _chunk_by_tokens(cleaned, max_tokens=max_tokens, overlap=overlap, align=align)
+    except Exception as exc:
+        logger.warning(f"Token chunking unavailable ({exc}); falling back to character-based splitting")
         approx_chars = max_tokens * 4
         approx_overlap = overlap * 4
-        return _chunk_by_chars(cleaned, max_chars=approx_chars, overlap_chars=approx_overlap)
+        return _chunk_by_chars(clean_text(cleaned), max_chars=approx_chars, overlap_chars=approx_overlap)
+
+
+def chunk_texts(
+    texts: Sequence[str],
+    max_tokens: int = 250,
+    overlap: int = 50,
+    align: Optional[str] = None,
+    workers: int = 4,
+) -> List[List[str]]:
+    """Chunk many documents in parallel; tiktoken releases the GIL while encoding."""
+    if workers <= 1 or len(texts) <= 1:
+        return [chunk_text(t, max_tokens, overlap, align) for t in texts]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunker") as pool:
+        return list(pool.map(lambda t: chunk_text(t, max_tokens, overlap, align), texts))
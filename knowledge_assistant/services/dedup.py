@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dedup_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dedup_chunks (
+    collection TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    fingerprint INTEGER NOT NULL,
+    PRIMARY KEY (collection, chunk_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dedup_bands (
+    collection TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    key INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL,
+    PRIMARY KEY (collection, band, key, chunk_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dedup_refs (
+    collection TEXT NOT NULL,
+    ref_id TEXT NOT NULL,
+    canonical_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (collection, ref_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dedup_refs_canonical ON dedup_refs (collection, canonical_id, seq);
+"""
+
+_BITS = 64
+_WORD_RE = re.compile(r"\w+")
+_SHINGLE = 3
+
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash over lower-cased word 3-shingles: near-identical texts
+    (a changed date, a different nav link) land a few bits apart.
+    """
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) >= _SHINGLE:
+        features = [" ".join(words[i:i + _SHINGLE]) for i in range(len(words) - _SHINGLE + 1)]
+    else:
+        features = words
+    if not features:
+        return 0
+    hashes = np.frombuffer(
+        b"".join(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest() for f in features), dtype=np.uint8
+    ).reshape(len(features), 8)
+    # Each feature votes +1/-1 per bit; the fingerprint keeps the majority
+    votes = np.unpackbits(hashes, axis=1).sum(axis=0, dtype=np.int64)
+    return int.from_bytes(np.packbits(votes * 2 > len(features)).tobytes(), "big")
+
+
+def _signed(fingerprint: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return fingerprint - (1 << _BITS) if fingerprint >= 1 << (_BITS - 1) else fingerprint
+
+
+def _unsigned(value: int) -> int:
+    return value + (1 << _BITS) if value < 0 else value
+
+
+class DedupIndex:
+    """
+    Per-collection near-duplicate index over chunk SimHash fingerprints.
+
+    A chunk is a duplicate of a stored (canonical) chunk when their
+    fingerprints differ in at most `max_distance` bits. Fingerprints are
+    split into `max_distance + 1` bands, so by pigeonhole any such pair
+    agrees exactly on at least one band; lookups only compare against
+    chunks sharing a band.
+
+    Every (url, chunk id) that resolved to a canonical chunk, including the
+    canonical's own, is a reference. `release` drops references and says
+    which canonical chunks have none left and can be deleted, and which
+    ones need their source URLs rewritten.
+    """
+
+    def __init__(self, path: str, max_distance: int = 3) -> None:
+        self.path = path
+        self.max_distance = max(0, min(max_distance, _BITS // 2 - 1))
+        self.bands = self.max_distance + 1
+        self._width = _BITS // self.bands
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._check_bands()
+        self._conn.commit()
+
+    def _check_bands(self) -> None:
+        row = self._conn.execute("SELECT value FROM dedup_meta WHERE key = 'bands'").fetchone()
+        if row and row[0] == self.bands:
+            return
+        if row:
+            logger.info(f"Re-banding dedup index for max distance {self.max_distance}")
+            self._conn.execute("DELETE FROM dedup_bands")
+            rows = self._conn.execute("SELECT collection, chunk_id, fingerprint FROM dedup_chunks").fetchall()
+            for collection, chunk_id, fp in rows:
+                self._insert_bands(collection, chunk_id, _unsigned(fp))
+        self._conn.execute(
+            "INSERT INTO dedup_meta (key, value) VALUES ('bands', ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (self.bands,),
+        )
+
+    def band_keys(self, fingerprint: int) -> List[int]:
+        mask = (1 << self._width) - 1
+        return [(fingerprint >> (b * self._width)) & mask for b in range(self.bands)]
+
+    def _insert_bands(self, collection: str, chunk_id: str, fingerprint: int) -> None:
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO dedup_bands (collection, band, key, chunk_id) VALUES (?, ?, ?, ?)",
+            ((collection, b, key, chunk_id) for b, key in enumerate(self.band_keys(fingerprint))),
+        )
+
+    # ---- lookups ----
+    def find(self, collection: str, fingerprint: int) -> Optional[str]:
+        """The closest stored chunk within `max_distance` bits, if any."""
+        keys = self.band_keys(fingerprint)
+        clause = " OR ".join("(b.band = ? AND b.key = ?)" for _ in keys)
+        params: List = [collection]
+        for b, key in enumerate(keys):
+            params.extend((b, key))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT c.chunk_id, c.fingerprint FROM dedup_bands b "
+                f"JOIN dedup_chunks c ON c.collection = b.collection AND c.chunk_id = b.chunk_id "
+                f"WHERE b.collection = ? AND ({clause})",
+                params,
+            ).fetchall()
+        best: Optional[Tuple[int, str]] = None
+        for chunk_id, fp in rows:
+            distance = (_unsigned(fp) ^ fingerprint).bit_count()
+            if distance <= self.max_distance and (best is None or (distance, chunk_id) < best):
+                best = (distance, chunk_id)
+        return best[1] if best else None
+
+    def urls(self, collection: str, canonical_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """URLs referencing each canonical chunk, oldest reference first."""
+        out: Dict[str, List[str]] = {}
+        with self._lock:
+            for canonical_id in canonical_ids:
+                rows = self._conn.execute(
+                    "SELECT url FROM dedup_refs WHERE collection = ? AND canonical_id = ? ORDER BY seq",
+                    (collection, canonical_id),
+                ).fetchall()
+                out[canonical_id] = list(dict.fromkeys(r[0] for r in rows))
+        return out
+
+    def folded(self, collection: str, ref_ids: Iterable[str]) -> List[str]:
+        """The ids among `ref_ids` that were folded into a different stored chunk (never upserted themselves)."""
+        out: List[str] = []
+        with self._lock:
+            for ref_id in ref_ids:
+                row = self._conn.execute(
+                    "SELECT canonical_id FROM dedup_refs WHERE collection = ? AND ref_id = ?", (collection, ref_id)
+                ).fetchone()
+                if row is not None and row[0] != ref_id:
+                    out.append(ref_id)
+        return out
+
+    # ---- writes ----
+    def add(
+        self,
+        collection: str,
+        canonicals: Sequence[Tuple[str, int]],
+        refs: Sequence[Tuple[str, str, str]],
+    ) -> None:
+        """Record stored chunks as (chunk id, fingerprint) and references as (ref id, canonical id, url)."""
+        with self._lock:
+            for chunk_id, fingerprint in canonicals:
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO dedup_chunks (collection, chunk_id, fingerprint) VALUES (?, ?, ?)",
+                    (collection, chunk_id, _signed(fingerprint)),
+                )
+                if cur.rowcount:
+                    self._insert_bands(collection, chunk_id, fingerprint)
+            seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM dedup_refs").fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO dedup_refs (collection, ref_id, canonical_id, url, seq) VALUES (?, ?, ?, ?, ?)",
+                ((collection, ref_id, canonical_id, url, seq + i) for i, (ref_id, canonical_id, url) in enumerate(refs, 1)),
+            )
+            self._conn.commit()
+
+    def forget(self, collection: str, canonical_ids: Sequence[str]) -> None:
+        """Drop canonical chunks (and references to them) that are gone from the vector store."""
+        with self._lock:
+            for canonical_id in canonical_ids:
+                for table, column in (("dedup_chunks", "chunk_id"), ("dedup_bands", "chunk_id"), ("dedup_refs", "canonical_id")):
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE collection = ? AND {column} = ?", (collection, canonical_id)
+                    )
+            self._conn.commit()
+
+    def release(self, collection: str, ref_ids: Sequence[str]) -> Tuple[List[str], Dict[str, List[str]]]:
+        """
+        Drop the references `ref_ids` (chunk ids a URL no longer has).
+        Returns the chunk ids to delete from the vector store (canonicals
+        left without references, and ids never seen by the index) and, for
+        canonicals still referenced elsewhere, their remaining URLs.
+        """
+        delete: List[str] = []
+        touched: Dict[str, None] = {}
+        with self._lock:
+            for ref_id in ref_ids:
+                row = self._conn.execute(
+                    "SELECT canonical_id FROM dedup_refs WHERE collection = ? AND ref_id = ?", (collection, ref_id)
+                ).fetchone()
+                if row is None:
+                    # Stored before deduplication was enabled
+                    delete.append(ref_id)
+                    continue
+                self._conn.execute("DELETE FROM dedup_refs WHERE collection = ? AND ref_id = ?", (collection, ref_id))
+                touched[row[0]] = None
+            remaining: Dict[str, List[str]] = {}
+            for canonical_id in touched:
+                urls = [
+                    r[0]
+                    for r in self._conn.execute(
+                        "SELECT url FROM dedup_refs WHERE collection = ? AND canonical_id = ? ORDER BY seq",
+                        (collection, canonical_id),
+                    )
+                ]
+                if urls:
+                    remaining[canonical_id] = list(dict.fromkeys(urls))
+                    continue
+                delete.append(canonical_id)
+                self._conn.execute(
+                    "DELETE FROM dedup_chunks WHERE collection = ? AND chunk_id = ?", (collection, canonical_id)
+                )
+                self._conn.execute(
+                    "DELETE FROM dedup_bands WHERE collection = ? AND chunk_id = ?", (collection, canonical_id)
+                )
+            self._conn.commit()
+        return delete, remaining
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM dedup_chunks").fetchone()[0]
+            refs = self._conn.execute("SELECT COUNT(*) FROM dedup_refs").fetchone()[0]
+        return {
+            "canonical_chunks": stored,
+            "references": refs,
+            # Share of ingested chunks that were folded into an existing one
+            "dedup_ratio": round(1.0 - stored / refs, 4) if refs else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class PendingChunks:
+    """Band table for chunks of the current ingest batch that are not stored (or indexed) yet."""
+
+    def __init__(self, index: DedupIndex) -> None:
+        self.index = index
+        self._bands: Dict[Tuple[str, int, int], List[Tuple[str, int]]] = {}
+
+    def add(self, collection: str, chunk_id: str, fingerprint: int) -> None:
+        for b, key in enumerate(self.index.band_keys(fingerprint)):
+            self._bands.setdefault((collection, b, key), []).append((chunk_id, fingerprint))
+
+    def find(self, collection: str, fingerprint: int) -> Optional[str]:
+        best: Optional[Tuple[int, str]] = None
+        for b, key in enumerate(self.index.band_keys(fingerprint)):
+            for chunk_id, fp in self._bands.get((collection, b, key), ()):
+                distance = (fp ^ fingerprint).bit_count()
+                if distance <= self.index.max_distance and (best is None or (distance, chunk_id) < best):
+                    best = (distance, chunk_id)
+        return best[1] if best else None
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence
+
+import numpy as np
+
+try:  # cross-process write lock; POSIX only
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+_KEY_BYTES = 16
+_VERSION = 1
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    h = hashlib.sha256()
+    h.update(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.digest()[:_KEY_BYTES]
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of document embeddings keyed by
+    hash(model name, chunk text).
+
+    Vectors live in a fixed-capacity memory-mapped array (`vectors.bin`)
+    with a parallel array of 16-byte keys (`keys.bin`); the in-memory index
+    is rebuilt from the keys on open. Slots are reused in FIFO order once
+    the cache is full. Hits are copied once from the mapping (the page
+    cache) into the output array, so nothing is re-encoded or
+    deserialised. The whole cache is discarded when the model name,
+    dimension or dtype changes.
+
+    Several processes may share a directory: appends take an flock and
+    continue from the shared cursor in `meta.json`, and a slot's key is
+    cleared while its vector is rewritten, so every hit is checked against
+    the key array before and after the copy and treated as a miss if
+    another process reused the slot meanwhile.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        model_name: str,
+        capacity: int,
+        dtype: str = "float32",
+        dim_fn: Callable[[], int] | None = None,
+    ) -> None:
+        self.directory = directory
+        self.model_name = model_name
+        self.capacity = max(1, capacity)
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._meta_path = os.path.join(directory, "meta.json")
+        meta = self._read_meta()
+        dim = int(dim_fn()) if dim_fn is not None else None
+        files_present = all(os.path.exists(os.path.join(directory, name)) for name in ("keys.bin", "vectors.bin"))
+        if (
+            meta is None
+            or meta.get("version") != _VERSION
+            or meta.get("model_name") != model_name
+            or meta.get("dtype") != self.dtype.name
+            or meta.get("capacity") != self.capacity
+            or (dim is not None and meta.get("dim") != dim)
+            or not files_present
+        ):
+            if meta is not None:
+                logger.info(f"Embedding cache at {directory} does not match {model_name}; resetting")
+            if dim is None:
+                raise ValueError("dim_fn is required to create a new embedding cache")
+            meta = {
+                "version": _VERSION,
+                "model_name": model_name,
+                "dtype": self.dtype.name,
+                "capacity": self.capacity,
+                "dim": dim,
+                "cursor": 0,
+            }
+            for name in ("keys.bin", "vectors.bin"):
+                path = os.path.join(directory, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            files_present = False
+        self.dim = int(meta["dim"])
+        self._cursor = int(meta["cursor"])
+        mode = "r+" if files_present else "w+"
+        self._keys = np.memmap(
+            os.path.join(directory, "keys.bin"), dtype=np.uint8, mode=mode, shape=(self.capacity, _KEY_BYTES)
+        )
+        self._vectors = np.memmap(
+            os.path.join(directory, "vectors.bin"), dtype=self.dtype, mode=mode, shape=(self.capacity, self.dim)
+        )
+        self._index: Dict[bytes, int] = {}
+        filled = np.flatnonzero(self._keys.any(axis=1))
+        for slot in filled:
+            self._index[self._keys[slot].tobytes()] = int(slot)
+        self._write_meta()
+
+    def _read_meta(self) -> dict | None:
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self) -> None:
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": _VERSION,
+                    "model_name": self.model_name,
+                    "dtype": self.dtype.name,
+                    "capacity": self.capacity,
+                    "dim": self.dim,
+                    "cursor": self._cursor,
+                },
+                f,
+            )
+        os.replace(tmp, self._meta_path)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, "lock"), "a+") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _catch_up(self) -> None:
+        """Index the slots other processes appended since our last write."""
+        meta = self._read_meta()
+        cursor = int(meta["cursor"]) if meta and meta.get("dim") == self.dim else self._cursor
+        if cursor <= self._cursor:
+            return
+        if cursor - self._cursor >= self.capacity:
+            slots = range(self.capacity)
+        else:
+            slots = [s % self.capacity for s in range(self._cursor, cursor)]
+        for slot in slots:
+            key = self._keys[slot].tobytes()
+            if any(key):
+                self._index[key] = slot
+        self._cursor = cursor
+
+    def _cached(self, key: bytes) -> bool:
+        slot = self._index.get(key)
+        return slot is not None and self._keys[slot].tobytes() == key
+
+    def _store(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        with self._write_lock():
+            self._catch_up()
+            for key, vec in zip(keys, vectors):
+                if self._cached(key):
+                    continue
+                slot = self._cursor % self.capacity
+                old = self._keys[slot].tobytes()
+                if self._index.get(old) == slot:
+                    del self._index[old]
+                # Readers see either no key or the key with its full vector
+                self._keys[slot] = 0
+                self._vectors[slot] = vec
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._index[key] = slot
+                self._cursor += 1
+            self._keys.flush()
+            self._vectors.flush()
+            self._write_meta()
+
+    def encode(self, texts: Sequence[str], encode_fn: Callable[[List[str]], Sequence]) -> np.ndarray:
+        """Return float32 embeddings for `texts`, calling `encode_fn` only on misses."""
+        keys = [cache_key(self.model_name, t) for t in texts]
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        with self._lock:
+            hit_pos: List[int] = []
+            hit_slots: List[int] = []
+            miss_pos: List[int] = []
+            for i, key in enumerate(keys):
+                slot = self._index.get(key)
+                if slot is None:
+                    miss_pos.append(i)
+                else:
+                    hit_pos.append(i)
+                    hit_slots.append(slot)
+            if hit_pos:
+                slots = np.asarray(hit_slots)
+                expected = np.frombuffer(b"".join(keys[i] for i in hit_pos), dtype=np.uint8).reshape(-1, _KEY_BYTES)
+                valid = (self._keys[slots] == expected).all(axis=1)
+                out[hit_pos] = self._vectors[slots]
+                valid &= (self._keys[slots] == expected).all(axis=1)
+                if not valid.all():
+                    # Slot reused by another process: drop the stale entries and re-encode
+                    for j in np.flatnonzero(~valid):
+                        self._index.pop(keys[hit_pos[j]], None)
+                        miss_pos.append(hit_pos[j])
+                    miss_pos.sort()
+                    hit_pos = [p for p, ok in zip(hit_pos, valid) if ok]
+            self._hits += len(hit_pos)
+            self._misses += len(miss_pos)
+        if miss_pos:
+            # Identical texts within one batch only need one forward pass
+            unique: Dict[bytes, int] = {}
+            for i in miss_pos:
+                unique.setdefault(keys[i], i)
+            fresh = np.asarray(encode_fn([texts[i] for i in unique.values()]), dtype=np.float32)
+            by_key = dict(zip(unique.keys(), fresh))
+            for i in miss_pos:
+                out[i] = by_key[keys[i]]
+            with self._lock:
+                self._store(list(unique.keys()), fresh)
+        return out
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._index),
+                "capacity": self.capacity,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
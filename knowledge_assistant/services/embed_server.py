@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..api.config import Settings
+from .metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Wire format. Request: header, n little-endian uint32 byte lengths, then the
+# UTF-8 texts back to back. Response: header, then `nbytes` of payload: the
+# float32 row-major matrix for an encode, JSON for info, a UTF-8 message
+# for an error. Vectors cross the socket as raw bytes and are read straight
+# into the array, never serialised per float.
+_MAGIC = b"KAE1"
+_REQUEST = struct.Struct("<4sBI")  # magic, op, text count
+_RESPONSE = struct.Struct("<4sBIQ")  # magic, status, dimension, payload bytes
+_OP_ENCODE = 1
+_OP_INFO = 2
+_OK = 0
+_ERROR = 1
+
+_THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TOKENIZERS_PARALLELISM")
+
+
+class EmbedServerError(RuntimeError):
+    """The embedding server answered, but with an error (the model failed on this input)."""
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytearray:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        read = sock.recv_into(view[got:], n - got)
+        if not read:
+            raise ConnectionError("embedding server connection closed mid-message")
+        got += read
+    return buf
+
+
+def _send_request(sock: socket.socket, op: int, texts: Sequence[str]) -> None:
+    encoded = [t.encode("utf-8") for t in texts]
+    lengths = np.fromiter((len(b) for b in encoded), dtype="<u4", count=len(encoded))
+    sock.sendall(b"".join([_REQUEST.pack(_MAGIC, op, len(encoded)), lengths.tobytes(), *encoded]))
+
+
+def _read_request(sock: socket.socket) -> tuple:
+    magic, op, count = _REQUEST.unpack(_recv_exact(sock, _REQUEST.size))
+    if magic != _MAGIC:
+        raise ValueError("not an embedding server request")
+    lengths = np.frombuffer(_recv_exact(sock, 4 * count), dtype="<u4") if count else np.zeros(0, dtype="<u4")
+    blob = bytes(_recv_exact(sock, int(lengths.sum())))
+    ends = np.cumsum(lengths)
+    texts = [blob[int(e) - int(n):int(e)].decode("utf-8") for n, e in zip(lengths, ends)]
+    return op, texts
+
+
+def _send_response(sock: socket.socket, status: int, dimension: int, payload: bytes) -> None:
+    sock.sendall(_RESPONSE.pack(_MAGIC, status, dimension, len(payload)))
+    sock.sendall(payload)
+
+
+# ---- server ----
+def _limit_threads(threads: int) -> None:
+    """Must run before torch is imported in the worker."""
+    for var in _THREAD_VARS[:-1]:
+        os.environ[var] = str(threads)
+    # The Rust tokenizers pool would otherwise add its own threads per worker
+    os.environ[_THREAD_VARS[-1]] = "false"
+
+
+def _worker(listener: socket.socket, model_name: str, threads: int, cpus: Optional[List[int]], workers: int) -> None:
+    # The supervisor handles Ctrl-C and stops workers with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _limit_threads(threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    try:
+        import torch  # type: ignore
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from sentence_transformers import SentenceTransformer  # type: ignore
+
+    model = SentenceTransformer(model_name)
+    dimension = int(model.get_sentence_embedding_dimension())
+    model.encode(["warmup"])
+    info = json.dumps({
+        "model": model_name, "dimension": dimension, "pid": os.getpid(), "threads": threads, "workers": workers,
+    }).encode("utf-8")
+    logger.info(f"Embedding worker {os.getpid()} ready ({threads} threads, cpus {cpus or 'any'})")
+    while True:
+        conn, _ = listener.accept()
+        with conn:
+            try:
+                op, texts = _read_request(conn)
+                if op == _OP_INFO:
+                    _send_response(conn, _OK, dimension, info)
+                    continue
+                try:
+                    vectors = np.ascontiguousarray(model.encode(texts), dtype="<f4")
+                except Exception as exc:
+                    logger.exception("Encode failed")
+                    _send_response(conn, _ERROR, dimension, str(exc).encode("utf-8"))
+                    continue
+                _send_response(conn, _OK, dimension, memoryview(vectors).cast("B"))
+            except (OSError, ValueError) as exc:
+                logger.warning(f"Dropped embedding request: {exc}")
+
+
+def _cpu_sets(workers: int, threads: int) -> List[Optional[List[int]]]:
+    """Disjoint CPU sets, `threads` each, over the CPUs this process may use."""
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * workers
+    cpus = sorted(os.sched_getaffinity(0))
+    if workers * threads > len(cpus):
+        logger.warning(f"{workers} workers x {threads} threads exceed {len(cpus)} CPUs; not pinning")
+        return [None] * workers
+    return [cpus[i * threads:(i + 1) * threads] for i in range(workers)]
+
+
+def _bind(path: str) -> socket.socket:
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)  # left behind by a server that did not shut down cleanly
+        else:
+            raise OSError(f"an embedding server is already listening on {path}")
+        finally:
+            probe.close()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    os.chmod(path, 0o660)
+    listener.listen(128)
+    return listener
+
+
+def serve(settings: Settings, socket_path: str, workers: int = 1, threads: int = 0, pin: bool = False) -> None:
+    """
+    Run the embedding server until SIGINT/SIGTERM: `workers` forked
+    processes, each with its own copy of the model limited to `threads`
+    intra-op threads (0 = the CPUs divided between workers), accepting
+    requests on one Unix socket. The kernel hands each connection to an
+    idle worker; a worker that dies is restarted.
+    """
+    import multiprocessing
+
+    workers = max(1, workers)
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    cpu_sets = _cpu_sets(workers, threads) if pin else [None] * workers
+    listener = _bind(socket_path)
+    # Fork before this process imports torch, so each worker starts clean
+    ctx = multiprocessing.get_context("fork")
+    stopping = threading.Event()
+
+    def start(i: int):
+        proc = ctx.Process(
+            target=_worker,
+            args=(listener, settings.embed_model_name, threads, cpu_sets[i], workers),
+            name=f"embed-worker-{i}",
+            daemon=True,
+        )
+        proc.start()
+        return proc
+
+    def stop(*_: Any) -> None:
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    procs = [start(i) for i in range(workers)]
+    logger.info(
+        f"Embedding server on {socket_path}: {workers} workers x {threads} threads, model {settings.embed_model_name}"
+    )
+    try:
+        while not stopping.wait(0.5):
+            for i, proc in enumerate(procs):
+                if not proc.is_alive():
+                    logger.warning(f"Embedding worker {proc.pid} exited with {proc.exitcode}; restarting")
+                    procs[i] = start(i)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join(timeout=5)
+        listener.close()
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+        logger.info("Embedding server stopped")
+
+
+# ---- client ----
+class EmbedClient:
+    """
+    Stands in for a SentenceTransformer (`encode`,
+    `get_sentence_embedding_dimension`) and forwards to the embedding server.
+
+    `encode` splits its input into `batch_size` requests, sent in parallel
+    up to the server's worker count, one connection per request. When the
+    server cannot be reached, encoding fails over to `fallback()` (the
+    in-process model, loaded on first need) and the server is retried after
+    `retry_s`; with no fallback the connection error is raised. A server
+    running a different model is treated as unreachable.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        model_name: str,
+        fallback: Optional[Callable[[], Any]] = None,
+        batch_size: int = 256,
+        timeout_s: float = 30.0,
+        retry_s: float = 10.0,
+    ) -> None:
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.timeout_s = timeout_s
+        self.retry_s = retry_s
+        self._fallback = fallback
+        self._lock = threading.Lock()
+        self._info: Optional[Dict[str, Any]] = None
+        self._down_until = 0.0
+        self._executor: ThreadPoolExecutor | None = None
+        self._requests = 0
+        self._texts = 0
+        self._failovers = 0
+        self._local_texts = 0
+        self._last_error: Optional[str] = None
+
+    def _call(self, op: int, texts: Sequence[str]) -> tuple:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(min(1.0, self.timeout_s))
+            sock.connect(self.socket_path)
+            sock.settimeout(self.timeout_s)
+            _send_request(sock, op, texts)
+            magic, status, dimension, nbytes = _RESPONSE.unpack(_recv_exact(sock, _RESPONSE.size))
+            if magic != _MAGIC:
+                raise ConnectionError("unexpected reply from the embedding server")
+            payload = _recv_exact(sock, nbytes)
+        finally:
+            sock.close()
+        if status != _OK:
+            raise EmbedServerError(payload.decode("utf-8", errors="replace"))
+        return dimension, payload
+
+    def _server_info(self) -> Dict[str, Any]:
+        info = self._info
+        if info is None:
+            _, payload = self._call(_OP_INFO, ())
+            info = json.loads(payload)
+            if info.get("model") != self.model_name:
+                raise ConnectionError(
+                    f"embedding server runs {info.get('model')}, this process expects {self.model_name}"
+                )
+            self._info = info
+        return info
+
+    def _encode_remote(self, texts: List[str]) -> np.ndarray:
+        info = self._server_info()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        def one(batch: List[str]) -> np.ndarray:
+            dimension, payload = self._call(_OP_ENCODE, batch)
+            return np.frombuffer(payload, dtype="<f4").reshape(len(batch), dimension)
+
+        with METRICS.stage("embed server"):
+            if len(batches) == 1:
+                parts = [one(batches[0])]
+            else:
+                parts = list(self._pool(int(info.get("workers", 1))).map(one, batches))
+        with self._lock:
+            self._requests += len(batches)
+            self._texts += len(texts)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def _pool(self, workers: int) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="embed-client")
+        return self._executor
+
+    def _failover(self, exc: Exception) -> Any:
+        with self._lock:
+            first = time.monotonic() >= self._down_until
+            self._down_until = time.monotonic() + self.retry_s
+            self._info = None
+            self._failovers += 1
+            self._last_error = str(exc)
+        METRICS.count("embed_server_failovers")
+        if self._fallback is None:
+            raise exc
+        if first:
+            logger.warning(f"Embedding server at {self.socket_path} unavailable ({exc}); encoding in-process")
+        return self._fallback()
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        """Same call shape as SentenceTransformer.encode; extra keyword arguments only reach the fallback."""
+        if isinstance(texts, str):
+            return self.encode([texts], **kwargs)[0]
+        texts = list(texts)
+        if self._fallback is None or time.monotonic() >= self._down_until:
+            try:
+                return self._encode_remote(texts)
+            except OSError as exc:
+                model = self._failover(exc)
+        else:
+            model = self._failover(ConnectionError(self._last_error or "embedding server unavailable"))
+        with self._lock:
+            self._local_texts += len(texts)
+        return np.asarray(model.encode(texts, **kwargs), dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        try:
+            return int(self._server_info()["dimension"])
+        except OSError as exc:
+            return int(self._failover(exc).get_sentence_embedding_dimension())
+
+    def wait(self, timeout_s: float) -> bool:
+        """Poll until the server answers (e.g. while it loads the model at startup)."""
+        deadline = time.monotonic() + timeout_s
+        while True:
+            try:
+                self._server_info()
+                self._down_until = 0.0
+                return True
+            except OSError as exc:
+                self._last_error = str(exc)
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.2)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "connected": int(self._info is not None and time.monotonic() >= self._down_until),
+                "server_workers": int((self._info or {}).get("workers", 0)),
+                "requests": self._requests,
+                "texts": self._texts,
+                "failovers": self._failovers,
+                "texts_encoded_locally": self._local_texts,
+            }
+
+
+def main() -> None:
+    import argparse
+
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Serve the embedding model to local API workers over a Unix socket")
+    parser.add_argument("--socket", default=settings.embed_server_socket or "/tmp/knowledge-assistant-embed.sock")
+    parser.add_argument("--workers", type=int, default=settings.embed_server_workers)
+    parser.add_argument(
+        "--threads", type=int, default=settings.embed_server_threads, help="per worker; 0 = CPUs / workers"
+    )
+    parser.add_argument("--pin", action="store_true", help="pin each worker to its own CPUs")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    try:
+        serve(settings, args.socket, args.workers, args.threads, args.pin)
+    except OSError as err:
+        raise SystemExit(f"error: {err}")
+
+
+if __name__ == "__main__":
+    main()
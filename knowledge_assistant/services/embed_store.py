@@ -3,49 +3,57 @@ from __future__ import annotations
 import hashlib
 import logging
 from dataclasses import dataclass, field
-from typing import Dict, List
-
-import chromadb
-from chromadb.api import Collection
-from chromadb.config import Settings as ChromaSettings
-from sentence_transformers import SentenceTransformer  # type: ignore
+from typing import TYPE_CHECKING, Dict, List, Sequence
 
 from ..api.config import Settings
+from .registry import ResourceRegistry, get_registry
+
+if TYPE_CHECKING:
+    import chromadb
+    from chromadb.api import Collection
+    from sentence_transformers import SentenceTransformer  # type: ignore
 
 logger = logging.getLogger(__name__)
 
 @dataclass
 class EmbedStore:
     settings: Settings
-    _model: SentenceTransformer | None = field(default=None, init=False, repr=False)
-    _client: chromadb.Client | None = field(default=None, init=False, repr=False)
-    _collections: Dict[str, Collection] = field(default_factory=dict, init=False, repr=False)
+    _registry: ResourceRegistry = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._registry = get_registry(self.settings)
+
+    @property
+    def registry(self) -> ResourceRegistry:
+        return self._registry
 
     @property
     def model(self) -> SentenceTransformer:
-        if self._model is None:
-            logger.info(f"Loading embedding model {self.settings.embed_model_name}…")
-            self._model = SentenceTransformer(self.settings.embed_model_name)
-        return self._model
+        return self._registry.model
 
     @property
     def client(self) -> chromadb.Client:
-        if self._client is None:
-            logger.info(f"Initialising ChromaDB at {self.settings.chroma_directory}…")
-            self._client = chromadb.PersistentClient(
-                path=self.settings.chroma_directory,
-                settings=ChromaSettings(anonymized_telemetry=False),
-            )
-        return self._client
+        return self._registry.client
+
+    def encode_query(self, text: str):
+        """Encode one query through the shared micro-batcher (blocking)."""
+        return self._registry.batcher.encode(text)
+
+    async def aencode_query(self, text: str):
+        return await self._registry.batcher.aencode(text)
+
+    def encode_queries(self, texts: List[str]):
+        """Encode many queries with one model call, bypassing the micro-batcher."""
+        return self.model.encode(texts)  # type: ignore
+
+    def encode_documents(self, texts: List[str]):
+        cache = self._registry.embed_cache
+        if cache is None:
+            return self.model.encode(texts)  # type: ignore
+        return cache.encode(texts, lambda misses: self.model.encode(misses))  # type: ignore
 
     def _get_collection(self, name: str) -> Collection:
-        if name not in self._collections:
-            try:
-                collection = self.client.get_collection(name)
-            except Exception:
-                collection = self.client.create_collection(name)
-            self._collections[name] = collection
-        return self._collections[name]
+        return self._registry.get_collection(name)
 
     def upsert_embeddings(
         self,
@@ -53,11 +61,13 @@ class EmbedStore:
         texts: List[str],
         ids: List[str],
         metadatas: List[dict],
+        embeddings: Sequence | None = None,
     ) -> None:
         if not texts:
             return
         collection = self._get_collection(collection_name)
-        embeddings = self.model.encode(texts)  # type: ignore
+        if embeddings is None:
+            embeddings = self.encode_documents(texts)
         try:
             collection.upsert(ids=ids, documents=texts, embeddings=embeddings, metadatas=metadatas)
         except AttributeError:
@@ -71,6 +81,83 @@ class EmbedStore:
             if existing:
                 collection.delete(ids=existing)
             collection.add(ids=ids, documents=texts, embeddings=embeddings, metadatas=metadatas)
+        flat_indexes = self._registry.flat_indexes
+        if flat_indexes is not None:
+            flat = flat_indexes.get(collection_name)
+            if flat.exists():
+                flat.upsert(ids, embeddings, texts, metadatas)
+            else:
+                # Built from Chroma, which already holds this batch
+                self._registry.flat_index(collection_name)
+        if self._registry.lexical is not None:
+            self._registry.lexical_index(collection_name).add(collection_name, ids, texts)
+        routing = self._registry.routing
+        if routing is not None:
+            if routing.is_built(collection_name):
+                routing.add(collection_name, embeddings)
+            else:
+                # Fitted from Chroma, which already holds this batch
+                self._registry.routing_index(collection_name)
+        self._registry.notify_write(collection_name)
+
+    def delete_ids(self, collection_name: str, ids: List[str]) -> None:
+        if not ids:
+            return
+        self._get_collection(collection_name).delete(ids=ids)
+        if self._registry.flat_indexes is not None:
+            self._registry.flat_index(collection_name).delete(ids)
+        if self._registry.lexical is not None:
+            self._registry.lexical_index(collection_name).delete(collection_name, ids)
+        self._registry.notify_write(collection_name)
+
+    def existing_ids(self, collection_name: str, ids: List[str]) -> set:
+        if not ids:
+            return set()
+        return set(self._get_collection(collection_name).get(ids=ids, include=[]).get("ids") or [])
+
+    def set_source_urls(self, collection_name: str, urls_by_id: Dict[str, List[str]]) -> None:
+        """
+        Record every URL a (deduplicated) chunk was found on: `source_url`
+        keeps its current value while that URL still has the chunk, and the
+        others go to `also_seen_at`, space separated.
+        """
+        if not urls_by_id:
+            return
+        collection = self._get_collection(collection_name)
+        flat = self._registry.flat_indexes is not None
+        include = ["metadatas", "documents", "embeddings"] if flat else ["metadatas"]
+        res = collection.get(ids=list(urls_by_id), include=include)  # type: ignore[arg-type]
+        ids: List[str] = []
+        updates: List[dict] = []
+        metadatas: List[dict] = []
+        for cid, meta in zip(res["ids"], res["metadatas"]):
+            urls = urls_by_id[cid]
+            if not urls:
+                continue
+            meta = dict(meta or {})
+            source = meta.get("source_url") if meta.get("source_url") in urls else urls[0]
+            others = " ".join(u for u in urls if u != source)
+            # Chroma merges metadata on update; None removes a key
+            updates.append({"source_url": source, "also_seen_at": others or None})
+            meta["source_url"] = source
+            if others:
+                meta["also_seen_at"] = others
+            else:
+                meta.pop("also_seen_at", None)
+            ids.append(cid)
+            metadatas.append(meta)
+        if not ids:
+            return
+        collection.update(ids=ids, metadatas=updates)  # type: ignore[arg-type]
+        if flat:
+            rows = {cid: i for i, cid in enumerate(res["ids"])}
+            self._registry.flat_index(collection_name).upsert(
+                ids,
+                [res["embeddings"][rows[cid]] for cid in ids],
+                [res["documents"][rows[cid]] for cid in ids],
+                metadatas,
+            )
+        self._registry.notify_write(collection_name)
 
 def deterministic_id(prefix: str, content: str) -> str:
     h = hashlib.sha256()
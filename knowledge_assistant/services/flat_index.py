@@ -0,0 +1,716 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .quantization import MODES, Quantizer
+
+try:  # cross-process write lock; POSIX only
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+_VERSION = 1
+# Rows scored per matmul; bounds the temporary distance matrix for float16 upcasts
+_BLOCK_ROWS = 65536
+# Hamming scoring materialises (rows, queries, bytes); keep that small
+_BINARY_BLOCK_ROWS = 8192
+# Recalibrate the quantizer once a collection has grown this much since calibration
+_RECALIBRATE_GROWTH = 4
+
+
+@dataclass
+class FlatHit:
+    id: str
+    distance: float
+    document: str
+    metadata: dict
+    embedding: Optional[np.ndarray] = None
+
+
+class _Segment:
+    """
+    One append-only batch of rows. Vectors, norms, ids and (optional)
+    quantized codes are .npy files opened with mmap_mode="r", so every
+    process maps the same page-cache pages; documents and metadata are
+    JSON lines addressed by a row offset table. `dead` is a shared
+    writable byte mask (1 = deleted/replaced).
+
+    The rows file descriptor is reference counted: the index holds one
+    reference while the segment is in its manifest and each search holds
+    one while it reads, so a segment dropped by a refresh is closed only
+    once the last search using it is done.
+    """
+
+    def __init__(self, directory: str, name: str, codes_id: Optional[int] = None) -> None:
+        self.name = name
+        base = os.path.join(directory, name)
+        self.vectors = np.load(base + ".vec.npy", mmap_mode="r")
+        self.norms = np.load(base + ".norms.npy", mmap_mode="r")
+        self.ids = np.load(base + ".ids.npy", mmap_mode="r")
+        self.offsets = np.load(base + ".off.npy", mmap_mode="r")
+        self.rows = int(self.vectors.shape[0])
+        self.dead = np.memmap(base + ".dead", dtype=np.uint8, mode="r+", shape=(self.rows,)) if self.rows else None
+        # Which calibration the codes were written with; None if there are none
+        self.codes_id = codes_id if self.rows else None
+        self.codes = np.load(base + ".codes.npy", mmap_mode="r") if self.codes_id is not None else None
+        self._fd = os.open(base + ".rows.jsonl", os.O_RDONLY)
+        self._refs = 1
+        self._refs_lock = threading.Lock()
+
+    def row(self, i: int) -> Tuple[str, dict]:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        document, metadata = json.loads(os.pread(self._fd, end - start, start))
+        return document, metadata
+
+    def entry(self) -> dict:
+        return {"name": self.name, "rows": self.rows, "codes": self.codes_id}
+
+    def acquire(self) -> None:
+        with self._refs_lock:
+            self._refs += 1
+
+    def release(self) -> None:
+        """Drop a reference; the last one closes the rows file."""
+        with self._refs_lock:
+            self._refs -= 1
+            if self._refs:
+                return
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+
+def _write_segment(
+    directory: str,
+    name: str,
+    ids: Sequence[str],
+    vectors: np.ndarray,
+    documents: Sequence[str],
+    metadatas: Sequence[dict],
+    dtype: np.dtype,
+    quantizer: Optional[Quantizer] = None,
+) -> None:
+    base = os.path.join(directory, name)
+    stored = np.ascontiguousarray(vectors, dtype=dtype)
+    # Norms (and codes) of the vectors as stored, so distances match what is scored
+    as32 = stored.astype(np.float32)
+    np.save(base + ".vec.npy", stored)
+    np.save(base + ".norms.npy", np.einsum("ij,ij->i", as32, as32))
+    np.save(base + ".ids.npy", np.asarray(list(ids), dtype=str))
+    if quantizer is not None and len(ids):
+        np.save(base + ".codes.npy", quantizer.encode(as32))
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    with open(base + ".rows.jsonl", "wb") as f:
+        for i, (doc, meta) in enumerate(zip(documents, metadatas)):
+            line = json.dumps([doc or "", meta or {}], ensure_ascii=False).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets[i + 1] = offsets[i] + len(line)
+    np.save(base + ".off.npy", offsets)
+    np.zeros(len(ids), dtype=np.uint8).tofile(base + ".dead")
+
+
+def _remove_segment_files(directory: str, name: str) -> None:
+    for suffix in (".vec.npy", ".norms.npy", ".ids.npy", ".codes.npy", ".off.npy", ".rows.jsonl", ".dead"):
+        try:
+            os.remove(os.path.join(directory, name + suffix))
+        except OSError:
+            pass
+
+
+def _top_k_rows(keys: np.ndarray, k: int) -> np.ndarray:
+    """Row indices of the k smallest keys in every column, unordered; shape (k, columns)."""
+    n = keys.shape[0]
+    if k >= n:
+        return np.broadcast_to(np.arange(n)[:, None], keys.shape)
+    return np.argpartition(keys, k - 1, axis=0)[:k]
+
+
+class FlatIndex:
+    """
+    Exact nearest-neighbour index for one collection: a list of
+    memory-mapped segments scored with one matrix multiply per block and
+    `argpartition`. Distances are squared L2, the same as Chroma's default
+    space, so results from either backend can be merged.
+
+    With `quantization` set to "int8" or "binary", every segment also keeps
+    compact codes next to its full-precision vectors. A search then scans
+    only the codes for `n_results * rescore_factor` candidates and rescores
+    those with the full vectors, so the originals are paged in for a few
+    rows instead of scanned in full.
+
+    Writes append a new segment and mark replaced or deleted rows in the
+    shared `dead` masks; once there are too many segments or too many dead
+    rows everything live is compacted into a single segment (recalibrating
+    the quantizer). The segment list is published through an atomically
+    replaced `manifest.json`, and readers in other processes pick it up on
+    their next query.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        dtype: str = "float32",
+        max_segments: int = 16,
+        compact_dead_ratio: float = 0.25,
+        quantization: str = "none",
+        rescore_factor: int = 2,
+    ) -> None:
+        if quantization not in MODES:
+            raise ValueError(f"Unknown quantization mode: {quantization}")
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.max_segments = max(1, max_segments)
+        self.compact_dead_ratio = compact_dead_ratio
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self._manifest_path = os.path.join(directory, "manifest.json")
+        self._lock = threading.RLock()
+        self._manifest: dict = {}
+        self._manifest_stamp: Optional[Tuple[int, int]] = None
+        self._segments: List[_Segment] = []
+        self._quantizer: Optional[Quantizer] = None
+        self._quantizer_id: Optional[int] = None
+        # id -> (segment index, row); only built when this process writes
+        self._locations: Optional[Dict[str, Tuple[int, int]]] = None
+
+    # ---- loading ----
+    def exists(self) -> bool:
+        return os.path.exists(self._manifest_path)
+
+    def _stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self._manifest_path)
+        except OSError:
+            return None
+        # The manifest is replaced, never rewritten, so a new inode means a new version
+        return st.st_ino, st.st_mtime_ns
+
+    def _refresh(self, own_write: bool = False) -> None:
+        """Reload the segment list if another writer (or process) published a new one."""
+        stamp = self._stamp()
+        if stamp == self._manifest_stamp:
+            return
+        with self._lock:
+            for attempt in range(5):
+                stamp = self._stamp()
+                if stamp == self._manifest_stamp:
+                    return
+                manifest = {
+                    "version": _VERSION, "dim": 0, "dtype": self.dtype.name, "segments": [], "next_segment": 0,
+                }
+                if stamp is not None:
+                    with open(self._manifest_path, "r", encoding="utf-8") as f:
+                        manifest = json.load(f)
+                open_by_name = {s.name: s for s in self._segments}
+                try:
+                    segments = [
+                        open_by_name.get(e["name"]) or _Segment(self.directory, e["name"], e.get("codes"))
+                        for e in manifest["segments"]
+                    ]
+                except FileNotFoundError:
+                    # A concurrent compaction removed a segment named in the manifest we read
+                    if attempt == 4:
+                        raise
+                    continue
+                kept = {s.name for s in segments}
+                for name, seg in open_by_name.items():
+                    if name not in kept:
+                        seg.release()
+                quant = manifest.get("quantization")
+                self._quantizer = Quantizer.from_dict(quant) if quant else None
+                self._quantizer_id = quant.get("id") if quant else None
+                self._manifest = manifest
+                self._segments = segments
+                self._manifest_stamp = stamp
+                if not own_write:
+                    self._locations = None
+                return
+
+    def _write_manifest(self, segments: List[dict], next_segment: int) -> None:
+        manifest = {
+            "version": _VERSION,
+            "dim": int(self._manifest.get("dim") or 0),
+            "dtype": self.dtype.name,
+            "segments": segments,
+            "next_segment": next_segment,
+            "quantization": self._manifest.get("quantization"),
+        }
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path)
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            if fcntl is None:
+                self._refresh()
+                yield
+                return
+            with open(os.path.join(self.directory, "lock"), "a+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _ensure_locations(self) -> Dict[str, Tuple[int, int]]:
+        if self._locations is None:
+            locations: Dict[str, Tuple[int, int]] = {}
+            for si, seg in enumerate(self._segments):
+                if not seg.rows:
+                    continue
+                live = np.flatnonzero(seg.dead == 0)
+                for row, cid in zip(live.tolist(), seg.ids[live].tolist()):
+                    locations[cid] = (si, row)
+            self._locations = locations
+        return self._locations
+
+    # ---- stats ----
+    def __len__(self) -> int:
+        self._refresh()
+        return sum(int(s.rows - int(s.dead.sum())) for s in self._segments if s.rows)
+
+    def stats(self) -> Dict[str, float]:
+        self._refresh()
+        rows = sum(s.rows for s in self._segments)
+        dead = sum(int(s.dead.sum()) for s in self._segments if s.rows)
+        vector_bytes = sum(s.vectors.nbytes for s in self._segments)
+        code_bytes = sum(s.codes.nbytes for s in self._segments if s.codes is not None)
+        return {
+            "segments": len(self._segments),
+            "rows": rows,
+            "dead": dead,
+            "live": rows - dead,
+            "vector_bytes": vector_bytes,
+            "code_bytes": code_bytes,
+        }
+
+    # ---- writes ----
+    def _mark_dead(self, ids: Sequence[str]) -> int:
+        locations = self._ensure_locations()
+        touched: Dict[int, _Segment] = {}
+        n = 0
+        for cid in ids:
+            loc = locations.pop(cid, None)
+            if loc is None:
+                continue
+            seg = self._segments[loc[0]]
+            seg.dead[loc[1]] = 1  # type: ignore[index]
+            touched[loc[0]] = seg
+            n += 1
+        for seg in touched.values():
+            seg.dead.flush()  # type: ignore[union-attr]
+        return n
+
+    def _publish(self, extra: Optional[dict] = None, drop: Sequence[str] = ()) -> None:
+        """Write the manifest for the current segments (+ `extra`), minus `drop`, and reload."""
+        entries = [s.entry() for s in self._segments if s.name not in drop]
+        if extra is not None:
+            entries.append(extra)
+        next_segment = int(self._manifest.get("next_segment", 0)) + (1 if extra is not None else 0)
+        self._write_manifest(entries, next_segment)
+        # Appending keeps existing segment positions, so the id map stays valid and is extended below
+        self._refresh(own_write=not drop)
+        if self._locations is not None and extra is not None and not drop:
+            si = len(self._segments) - 1
+            for row, cid in enumerate(self._segments[si].ids.tolist()):
+                self._locations[cid] = (si, row)
+
+    def _calibrate(self, vectors: np.ndarray) -> None:
+        quantizer = Quantizer.calibrate(self.quantization, vectors)
+        self._manifest["quantization"] = {**quantizer.to_dict(), "id": int(self._quantizer_id or 0) + 1}
+        self._quantizer = quantizer
+        self._quantizer_id = self._manifest["quantization"]["id"]
+
+    def _write_quantizer(self, vectors: np.ndarray) -> Optional[Quantizer]:
+        """Quantizer for a new segment, calibrating on `vectors` if there is none for the current mode."""
+        if self.quantization == "none":
+            return None
+        if self._quantizer is None or self._quantizer.mode != self.quantization:
+            self._calibrate(vectors)
+        return self._quantizer
+
+    def _append(
+        self,
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        documents: Sequence[str],
+        metadatas: Sequence[Optional[dict]],
+    ) -> None:
+        self._manifest["dim"] = vectors.shape[1]
+        quantizer = self._write_quantizer(vectors)
+        name = f"seg-{int(self._manifest.get('next_segment', 0)):06d}"
+        _write_segment(
+            self.directory, name, ids, vectors, documents, [m or {} for m in metadatas], self.dtype, quantizer
+        )
+        self._publish(extra={"name": name, "rows": len(ids), "codes": self._quantizer_id if quantizer else None})
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence,
+        documents: Sequence[str],
+        metadatas: Sequence[Optional[dict]],
+    ) -> None:
+        if not len(ids):
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        # Last occurrence of an id within the batch wins, as in Chroma
+        last = {cid: i for i, cid in enumerate(ids)}
+        keep = sorted(last.values())
+        with self._write_lock():
+            dim = int(self._manifest.get("dim") or 0)
+            if dim and vectors.shape[1] != dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {dim}")
+            kept_ids = [ids[i] for i in keep]
+            self._mark_dead(kept_ids)
+            self._append(kept_ids, vectors[keep], [documents[i] for i in keep], [metadatas[i] for i in keep])
+            self._maybe_compact()
+
+    def delete(self, ids: Sequence[str]) -> int:
+        if not ids:
+            return 0
+        with self._write_lock():
+            n = self._mark_dead(ids)
+            if n:
+                self._maybe_compact()
+            return n
+
+    def _needs_requantize(self, live_rows: int) -> bool:
+        if self.quantization == "none" or not live_rows:
+            return False
+        if self._quantizer is None or self._quantizer.mode != self.quantization:
+            return True
+        if any(s.rows and s.codes_id != self._quantizer_id for s in self._segments):
+            return True
+        return live_rows > _RECALIBRATE_GROWTH * max(1, self._quantizer.calibrated_rows)
+
+    def _maybe_compact(self) -> None:
+        rows = sum(s.rows for s in self._segments)
+        dead = sum(int(s.dead.sum()) for s in self._segments if s.rows)
+        if (
+            len(self._segments) > self.max_segments
+            or (rows and dead / rows > self.compact_dead_ratio)
+            or self._needs_requantize(rows - dead)
+        ):
+            self._compact()
+
+    def compact(self) -> None:
+        with self._write_lock():
+            self._compact()
+
+    def ensure_codes(self) -> None:
+        """Re-encode the index if its codes don't match the configured quantization mode."""
+        self._refresh()
+        if not self._needs_requantize(len(self)):
+            return
+        with self._write_lock():
+            if self._needs_requantize(len(self)):
+                self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite every live row into one segment, recalibrating codes. Must hold the write lock."""
+        old = [s.name for s in self._segments]
+        ids: List[str] = []
+        vectors: List[np.ndarray] = []
+        documents: List[str] = []
+        metadatas: List[dict] = []
+        for seg in self._segments:
+            if not seg.rows:
+                continue
+            live = np.flatnonzero(seg.dead == 0)
+            ids.extend(seg.ids[live].tolist())
+            vectors.append(np.asarray(seg.vectors[live], dtype=np.float32))
+            for row in live.tolist():
+                doc, meta = seg.row(row)
+                documents.append(doc)
+                metadatas.append(meta)
+        dim = int(self._manifest.get("dim") or 0)
+        matrix = np.concatenate(vectors) if vectors else np.zeros((0, dim), dtype=np.float32)
+        quantizer = None
+        if self.quantization != "none" and len(ids):
+            self._calibrate(matrix)
+            quantizer = self._quantizer
+        elif self.quantization == "none":
+            self._manifest["quantization"] = None
+        name = f"seg-{int(self._manifest.get('next_segment', 0)):06d}"
+        _write_segment(self.directory, name, ids, matrix, documents, metadatas, self.dtype, quantizer)
+        codes_id = self._quantizer_id if quantizer is not None else None
+        self._publish(extra={"name": name, "rows": len(ids), "codes": codes_id}, drop=old)
+        # Readers that still map the old files keep them alive until they reload (POSIX semantics)
+        for seg_name in old:
+            _remove_segment_files(self.directory, seg_name)
+        logger.info(f"Compacted flat index {self.directory}: {len(old)} segments -> 1 ({len(ids)} rows)")
+
+    def rebuild_from_chroma(self, collection, page_size: int = 5000) -> int:
+        """Replace the index with the contents of a Chroma collection."""
+        with self._write_lock():
+            old = [s.name for s in self._segments]
+            self._manifest["quantization"] = None
+            self._write_manifest([], int(self._manifest.get("next_segment", 0)))
+            self._refresh()
+            for seg_name in old:
+                _remove_segment_files(self.directory, seg_name)
+            total = 0
+            offset = 0
+            while True:
+                res = collection.get(
+                    include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset
+                )
+                ids = res.get("ids") or []
+                if not ids:
+                    break
+                self._append(
+                    ids,
+                    np.asarray(res["embeddings"], dtype=np.float32),
+                    res.get("documents") or [""] * len(ids),
+                    res.get("metadatas") or [{}] * len(ids),
+                )
+                total += len(ids)
+                offset += len(ids)
+            if len(self._segments) > 1:
+                self._compact()
+        logger.info(f"Rebuilt flat index {self.directory} from Chroma: {total} rows")
+        return total
+
+    # ---- reads ----
+    def _scan(
+        self,
+        segments: List[_Segment],
+        k: int,
+        m: int,
+        block_rows: int,
+        score: Callable[[_Segment, int, int], np.ndarray],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Blockwise top-k over all live rows. `score(seg, start, end)` returns
+        (rows, queries) keys, smaller is better. Returns (keys, segment
+        index, row) arrays of shape (k', queries), unordered.
+        """
+        keys_out: List[np.ndarray] = []
+        seg_out: List[np.ndarray] = []
+        row_out: List[np.ndarray] = []
+        cols = np.arange(m)
+        for si, seg in enumerate(segments):
+            for start in range(0, seg.rows, block_rows):
+                end = min(seg.rows, start + block_rows)
+                keys = score(seg, start, end).astype(np.float32, copy=False)
+                dead = seg.dead[start:end]  # type: ignore[index]
+                if dead.any():
+                    keys[dead.astype(bool)] = np.inf
+                top = _top_k_rows(keys, k)
+                keys_out.append(keys[top, cols])
+                row_out.append(top + start)
+                seg_out.append(np.full(top.shape, si, dtype=np.int64))
+        keys_all = np.concatenate(keys_out)
+        segs_all = np.concatenate(seg_out)
+        rows_all = np.concatenate(row_out)
+        top = _top_k_rows(keys_all, k)
+        return keys_all[top, cols], segs_all[top, cols], rows_all[top, cols]
+
+    def _codes_usable(self, segments: List[_Segment]) -> bool:
+        if self.quantization == "none" or self._quantizer is None or self._quantizer.mode != self.quantization:
+            return False
+        return all(s.codes_id == self._quantizer_id for s in segments if s.rows)
+
+    def search(
+        self, queries, n_results: int, exact: bool = False, include_embeddings: bool = False
+    ) -> List[List[FlatHit]]:
+        """
+        Top-`n_results` for each row of `queries` (one vector or a matrix).
+        Uses the quantized first pass when codes are available, unless `exact`.
+        """
+        self._refresh()
+        q = np.asarray(queries, dtype=np.float32)
+        if q.ndim == 1:
+            q = q[None, :]
+        with self._lock:
+            # Pin this manifest's segments: a concurrent refresh may drop them
+            segments = list(self._segments)
+            quantizer = self._quantizer
+            for seg in segments:
+                seg.acquire()
+        try:
+            return self._search(segments, quantizer, q, n_results, exact, include_embeddings)
+        finally:
+            for seg in segments:
+                seg.release()
+
+    def _search(
+        self,
+        segments: List[_Segment],
+        quantizer: Optional[Quantizer],
+        q: np.ndarray,
+        n_results: int,
+        exact: bool,
+        include_embeddings: bool,
+    ) -> List[List[FlatHit]]:
+        m = q.shape[0]
+        if n_results <= 0 or not any(s.rows for s in segments):
+            return [[] for _ in range(m)]
+        qn = np.einsum("ij,ij->i", q, q)
+
+        def exact_score(seg: _Segment, start: int, end: int) -> np.ndarray:
+            block = seg.vectors[start:end]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            return seg.norms[start:end, None] - 2.0 * (block @ q.T) + qn[None, :]
+
+        if exact or not self._codes_usable(segments):
+            dist, segs, rows = self._scan(segments, n_results, m, _BLOCK_ROWS, exact_score)
+        else:
+            prepared = quantizer.prepare_queries(q)  # type: ignore[union-attr]
+
+            def code_score(seg: _Segment, start: int, end: int) -> np.ndarray:
+                return quantizer.approx_distances(  # type: ignore[union-attr]
+                    seg.codes[start:end], seg.norms[start:end], prepared, qn  # type: ignore[index]
+                )
+
+            block_rows = _BINARY_BLOCK_ROWS if quantizer.mode == "binary" else _BLOCK_ROWS  # type: ignore[union-attr]
+            _, segs, rows = self._scan(segments, n_results * self.rescore_factor, m, block_rows, code_score)
+            dist = self._rescore(segments, q, qn, segs, rows)
+        return self._hits(segments, dist, segs, rows, n_results, include_embeddings)
+
+    @staticmethod
+    def _rescore(
+        segments: List[_Segment], q: np.ndarray, qn: np.ndarray, segs: np.ndarray, rows: np.ndarray
+    ) -> np.ndarray:
+        """Exact distances for the candidate (segment, row) pairs of every query."""
+        dist = np.full(segs.shape, np.inf, dtype=np.float32)
+        for si in np.unique(segs).tolist():
+            seg = segments[si]
+            mask = segs == si
+            r = rows[mask]
+            vecs = np.asarray(seg.vectors[r], dtype=np.float32)
+            qcols = np.nonzero(mask)[1]
+            d = np.asarray(seg.norms[r]) - 2.0 * np.einsum("ij,ij->i", vecs, q[qcols]) + qn[qcols]
+            # Rows the first pass could only fill with dead entries stay at inf
+            alive = seg.dead[r] == 0  # type: ignore[index]
+            dist[mask] = np.where(alive, d, np.inf)
+        return dist
+
+    @staticmethod
+    def _hits(
+        segments: List[_Segment],
+        dist: np.ndarray,
+        segs: np.ndarray,
+        rows: np.ndarray,
+        n_results: int,
+        include_embeddings: bool = False,
+    ) -> List[List[FlatHit]]:
+        out: List[List[FlatHit]] = []
+        for j in range(dist.shape[1]):
+            order = np.argsort(dist[:, j], kind="stable")[:n_results]
+            hits: List[FlatHit] = []
+            for i in order.tolist():
+                d = float(dist[i, j])
+                if not np.isfinite(d):
+                    break
+                seg = segments[int(segs[i, j])]
+                row = int(rows[i, j])
+                doc, meta = seg.row(row)
+                embedding = np.asarray(seg.vectors[row], dtype=np.float32) if include_embeddings else None
+                hits.append(
+                    FlatHit(id=str(seg.ids[row]), distance=max(0.0, d), document=doc, metadata=meta, embedding=embedding)
+                )
+            out.append(hits)
+        return out
+
+
+def parse_quantization_overrides(value: str) -> Dict[str, str]:
+    """"docs-python-org=int8,arxiv-org=binary" -> {"docs-python-org": "int8", "arxiv-org": "binary"}."""
+    out: Dict[str, str] = {}
+    for part in (value or "").split(","):
+        if "=" not in part:
+            continue
+        name, mode = (p.strip() for p in part.split("=", 1))
+        if mode not in MODES:
+            raise ValueError(f"Unknown quantization mode '{mode}' for collection '{name}'")
+        out[name] = mode
+    return out
+
+
+class FlatIndexStore:
+    """One FlatIndex per collection under `<chroma_directory>/flat_index/`."""
+
+    def __init__(
+        self,
+        directory: str,
+        dtype: str = "float32",
+        max_segments: int = 16,
+        compact_dead_ratio: float = 0.25,
+        quantization: str = "none",
+        quantization_overrides: Optional[Dict[str, str]] = None,
+        rescore_factor: int = 2,
+    ) -> None:
+        self.directory = directory
+        self.dtype = dtype
+        self.max_segments = max_segments
+        self.compact_dead_ratio = compact_dead_ratio
+        self.quantization = quantization
+        self.quantization_overrides = dict(quantization_overrides or {})
+        self.rescore_factor = rescore_factor
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, FlatIndex] = {}
+
+    def get(self, collection_name: str) -> FlatIndex:
+        index = self._indexes.get(collection_name)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(collection_name)
+                if index is None:
+                    index = FlatIndex(
+                        os.path.join(self.directory, collection_name),
+                        self.dtype,
+                        self.max_segments,
+                        self.compact_dead_ratio,
+                        quantization=self.quantization_overrides.get(collection_name, self.quantization),
+                        rescore_factor=self.rescore_factor,
+                    )
+                    self._indexes[collection_name] = index
+        return index
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            indexes = list(self._indexes.values())
+        totals: Dict[str, float] = {"collections": len(indexes)}
+        for index in indexes:
+            for key, value in index.stats().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+
+def main() -> None:
+    import argparse
+
+    from ..api.config import Settings
+    from .registry import get_registry
+
+    parser = argparse.ArgumentParser(description="Rebuild the flat vector index from Chroma")
+    parser.add_argument("collections", nargs="*", help="collections to rebuild (default: all)")
+    args = parser.parse_args()
+    registry = get_registry(Settings())
+    store = registry.flat_indexes
+    if store is None:
+        parser.error("set VECTOR_BACKEND=flat to use the flat index")
+    for name in args.collections or registry.list_collection_names():
+        rows = store.get(name).rebuild_from_chroma(registry.get_collection(name))
+        print(f"{name}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import logging
+import mimetypes
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_BYTES = 64 * 1024
+
+# Never text: dropped with everything inside them
+_SKIP_TAGS = frozenset({
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object", "embed", "head",
+})
+# Page chrome rather than content; dropped when stripping boilerplate
+_BOILERPLATE_TAGS = frozenset({"nav", "header", "footer", "aside", "form", "button", "select", "dialog"})
+_BOILERPLATE_ROLES = frozenset({"navigation", "banner", "contentinfo", "complementary", "search", "dialog"})
+_HEADINGS = frozenset({"h1", "h2", "h3", "h4", "h5", "h6"})
+# Elements that start a new paragraph for the chunker
+_BLOCK_TAGS = _HEADINGS | frozenset({
+    "address", "article", "blockquote", "caption", "dd", "details", "div", "dl", "dt", "figcaption",
+    "figure", "hr", "li", "main", "ol", "p", "pre", "section", "summary", "table", "td", "th", "tr", "ul",
+})
+
+_TEXT_TYPES = frozenset({"text/plain", "text/markdown", "text/x-markdown"})
+_HTML_TYPES = frozenset({"text/html", "application/xhtml+xml"})
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_.:-]+)""", re.I)
+
+
+def content_kind(content_type: Optional[str], url: str) -> str:
+    """
+    "pdf", "html" or "text" from the response's Content-Type. Only when the
+    server sends none (or a generic binary type) is the URL consulted.
+    Raises ValueError for types that cannot be ingested.
+    """
+    mime = (content_type or "").split(";")[0].strip().lower()
+    if mime in ("", "application/octet-stream", "binary/octet-stream"):
+        path = url.lower().split("?")[0]
+        mime = mimetypes.guess_type(path)[0] or "text/html"
+    if mime == "application/pdf":
+        return "pdf"
+    if mime in _HTML_TYPES:
+        return "html"
+    if mime in _TEXT_TYPES:
+        return "text"
+    raise ValueError(f"unsupported content type {mime}")
+
+
+def read_body(response: requests.Response, max_bytes: int) -> Tuple[bytes, bool]:
+    """
+    Read a streaming response's body, stopping after `max_bytes` (0 = no
+    limit). Returns the bytes and whether the body was cut short; parsers
+    cope with truncated markup, and the start of a page is where its
+    content is.
+    """
+    parts: List[bytes] = []
+    nbytes = 0
+    for block in response.iter_content(_CHUNK_BYTES):
+        if max_bytes and nbytes + len(block) > max_bytes:
+            parts.append(block[: max_bytes - nbytes])
+            return b"".join(parts), True
+        parts.append(block)
+        nbytes += len(block)
+    return b"".join(parts), False
+
+
+def decode(content: bytes, content_type: Optional[str] = None) -> str:
+    """Decode with the Content-Type charset, else a <meta charset> near the top, else UTF-8."""
+    match = re.search(r"charset\s*=\s*[\"']?([\w.:-]+)", content_type or "", re.I)
+    charset = match.group(1) if match else None
+    if charset is None:
+        meta = _META_CHARSET_RE.search(content[:4096])
+        charset = meta.group(1).decode("ascii") if meta else "utf-8"
+    try:
+        return content.decode(charset, errors="replace")
+    except LookupError:
+        return content.decode("utf-8", errors="replace")
+
+
+class _TextBuilder:
+    """
+    Collects text in document order with a blank line between blocks, the
+    paragraph boundary `chunk_text(..., align="paragraph")` splits on. A
+    heading is joined to the block that follows it, so a chunk never ends
+    on a bare heading.
+    """
+
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+        self._break = False
+        self._after_heading = False
+
+    def text(self, value: Optional[str]) -> None:
+        if not value or not value.strip():
+            if value and self.parts:
+                self.parts.append(" ")
+            return
+        if self._break and self.parts:
+            self.parts.append("\n\n")
+        self._break = False
+        self._after_heading = False
+        self.parts.append(value)
+
+    def open(self, tag: str) -> None:
+        if tag in _HEADINGS:
+            self._break, self._after_heading = True, False
+        elif tag == "br":
+            self.parts.append(" ")
+        elif tag in _BLOCK_TAGS:
+            if self._after_heading:
+                self.parts.append(" ")
+            else:
+                self._break = True
+
+    def close(self, tag: str) -> None:
+        if tag in _HEADINGS:
+            self.parts.append(" ")
+            self._after_heading = True
+        elif tag in _BLOCK_TAGS and not self._after_heading:
+            self._break = True
+
+    def result(self) -> str:
+        return "".join(self.parts).strip()
+
+
+def _skipped(tag: str, attrs: Mapping, strip_boilerplate: bool) -> bool:
+    if tag in _SKIP_TAGS or "hidden" in attrs or str(attrs.get("aria-hidden", "")).lower() == "true":
+        return True
+    if not strip_boilerplate:
+        return False
+    return tag in _BOILERPLATE_TAGS or str(attrs.get("role") or "").lower() in _BOILERPLATE_ROLES
+
+
+# ---- engines: each walks the chosen root with an explicit stack (pages nest deeper than the recursion limit) ----
+def _extract_selectolax(html: str, strip_boilerplate: bool) -> str:
+    from selectolax.lexbor import LexborHTMLParser  # type: ignore
+
+    tree = LexborHTMLParser(html)
+    root = None
+    if strip_boilerplate:
+        root = tree.css_first("main, [role=main]")
+        if root is None:
+            articles = tree.css("article")
+            root = articles[0] if len(articles) == 1 else None
+    root = root or tree.body or tree.root
+    out = _TextBuilder()
+    if root is None:
+        return ""
+    stack: List[tuple] = [(root, False)]
+    while stack:
+        node, leaving = stack.pop()
+        tag = node.tag
+        if leaving:
+            out.close(tag)
+            continue
+        if tag == "-text":
+            out.text(node.text_content)
+            continue
+        if tag.startswith(("_", "!", "-")) or _skipped(tag, node.attributes, strip_boilerplate):
+            continue
+        out.open(tag)
+        stack.append((node, True))
+        children = []
+        child = node.child
+        while child is not None:
+            children.append(child)
+            child = child.next
+        stack.extend((c, False) for c in reversed(children))
+    return out.result()
+
+
+def _extract_lxml(html: str, strip_boilerplate: bool) -> str:
+    import lxml.html  # type: ignore
+
+    if not html.strip():
+        return ""
+    # lxml rejects str input that carries an XML encoding declaration
+    parser = lxml.html.HTMLParser(encoding="utf-8", huge_tree=True)
+    doc = lxml.html.document_fromstring(html.encode("utf-8"), parser=parser)
+    roots = []
+    if strip_boilerplate:
+        roots = doc.xpath("//main | //*[@role='main']")
+        if not roots:
+            articles = doc.xpath("//article")
+            roots = articles if len(articles) == 1 else []
+    roots = roots or doc.xpath("//body") or [doc]
+    out = _TextBuilder()
+    root = roots[0]
+    stack: List[tuple] = [("open", root)]
+    while stack:
+        action, el = stack.pop()
+        if action == "close":
+            out.close(el.tag)
+            continue
+        if action == "tail":
+            out.text(el.tail)
+            continue
+        if el is not root:
+            stack.append(("tail", el))
+        # Comments and processing instructions have a callable tag
+        tag = el.tag.lower() if isinstance(el.tag, str) else ""
+        if not tag or _skipped(tag, el.attrib, strip_boilerplate):
+            continue
+        out.open(tag)
+        out.text(el.text)
+        stack.append(("close", el))
+        stack.extend(("open", child) for child in reversed(el))
+    return out.result()
+
+
+def _extract_html_parser(html: str, strip_boilerplate: bool) -> str:
+    from bs4 import BeautifulSoup, NavigableString, Tag  # type: ignore
+    from bs4.element import PreformattedString  # type: ignore
+
+    soup = BeautifulSoup(html, "html.parser")
+    root = None
+    if strip_boilerplate:
+        root = soup.find("main") or soup.find(attrs={"role": "main"})
+        if root is None:
+            articles = soup.find_all("article", limit=2)
+            root = articles[0] if len(articles) == 1 else None
+    root = root or soup.body or soup
+    out = _TextBuilder()
+    stack: List[tuple] = [(root, False)]
+    while stack:
+        node, leaving = stack.pop()
+        if leaving:
+            out.close(node.name)
+            continue
+        if isinstance(node, NavigableString):
+            # Comments, doctypes and CDATA are PreformattedString subclasses
+            if not isinstance(node, PreformattedString):
+                out.text(str(node))
+            continue
+        if not isinstance(node, Tag):
+            continue
+        attrs = {k: " ".join(v) if isinstance(v, list) else v for k, v in node.attrs.items()}
+        if node is not soup and _skipped(node.name, attrs, strip_boilerplate):
+            continue
+        out.open(node.name)
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(node.contents))
+    return out.result()
+
+
+_ENGINES: Dict[str, Tuple[str, Callable[[str, bool], str]]] = {
+    "selectolax": ("selectolax.lexbor", _extract_selectolax),
+    "lxml": ("lxml.html", _extract_lxml),
+    "html.parser": ("bs4", _extract_html_parser),
+}
+_resolved: Dict[str, str] = {}
+
+
+def resolve_engine(preferred: str = "auto") -> str:
+    """
+    The parser to use: `preferred` if it is installed, otherwise the
+    fastest available (selectolax, then lxml), falling back to
+    BeautifulSoup's pure-Python html.parser.
+    """
+    engine = _resolved.get(preferred)
+    if engine is not None:
+        return engine
+    order = list(_ENGINES)
+    if preferred in _ENGINES:
+        order.remove(preferred)
+        order.insert(0, preferred)
+    elif preferred != "auto":
+        logger.warning(f"Unknown HTML_PARSER '{preferred}'; picking one automatically")
+    import importlib
+
+    for name in order:
+        try:
+            importlib.import_module(_ENGINES[name][0])
+        except ImportError:
+            continue
+        engine = name
+        break
+    else:
+        engine = "html.parser"
+    if preferred not in ("auto", engine):
+        logger.warning(f"HTML parser '{preferred}' is not installed; using {engine}")
+    _resolved[preferred] = engine
+    return engine
+
+
+@dataclass
+class ExtractedText:
+    text: str
+    engine: str
+
+
+def extract_text(
+    content: bytes,
+    content_type: Optional[str] = None,
+    engine: str = "auto",
+    strip_boilerplate: bool = True,
+) -> ExtractedText:
+    """
+    Readable text of an HTML page. Scripts, styles and hidden elements are
+    dropped; with `strip_boilerplate`, so are navigation, headers, footers,
+    sidebars and forms, and the page's <main> (or sole <article>) is used
+    when it has one. Blocks are separated by blank lines for paragraph
+    aligned chunking.
+    """
+    name = resolve_engine(engine)
+    html = decode(content, content_type)
+    return ExtractedText(text=_ENGINES[name][1](html, strip_boilerplate), engine=name)
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Set
+
+from .embed_store import EmbedStore
+from .pipeline import IngestPipeline, UrlResult
+from ..api.config import Settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+# Statuses a job can be resumed from after a restart
+_RESUMABLE = ("queued", "running")
+_FINAL_URL_STATUSES = ("ok", "unchanged", "empty", "failed", "cancelled", "duplicate")
+
+
+@dataclass
+class IngestJob:
+    id: str
+    urls: List[str]
+    status: str = "queued"  # queued | running | completed | failed | cancelled
+    progress: Dict[str, dict] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    def snapshot(self) -> "IngestJob":
+        return IngestJob(**json.loads(json.dumps(asdict(self))))
+
+
+class _JobStore:
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def save(self, job: IngestJob) -> None:
+        payload = json.dumps(asdict(job))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingest_jobs (id, status, payload, updated_at) VALUES (?, ?, ?, ?)",
+                (job.id, job.status, payload, time.time()),
+            )
+            self._conn.commit()
+
+    def load(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return IngestJob(**json.loads(row[0])) if row else None
+
+    def load_resumable(self) -> List[IngestJob]:
+        marks = ",".join("?" for _ in _RESUMABLE)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT payload FROM ingest_jobs WHERE status IN ({marks}) ORDER BY updated_at", _RESUMABLE
+            ).fetchall()
+        return [IngestJob(**json.loads(r[0])) for r in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class IngestJobManager:
+    """
+    Background ingest jobs on a dedicated, size-limited thread pool.
+
+    Jobs are persisted to `ingest_jobs.sqlite3` next to the Chroma data and
+    re-queued on start if the process stopped while they were queued or
+    running. A URL that is already being ingested by another live job is
+    not fetched twice; it is reported as a duplicate of that job.
+    Cancellation is cooperative: the pipeline stops at its next stage
+    boundary. Jobs interrupted by `shutdown` are left queued or running so
+    the next start picks them up again.
+    """
+
+    def __init__(self, settings: Settings, store: Optional[EmbedStore] = None) -> None:
+        self.settings = settings
+        self.store = store or EmbedStore(settings)
+        self._db = _JobStore(os.path.join(settings.chroma_directory, "ingest_jobs.sqlite3"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.ingest_job_workers), thread_name_prefix="ingest-job"
+        )
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, IngestJob] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+        self._inflight_urls: Dict[str, str] = {}
+        self._last_saved: Dict[str, float] = {}
+        self._cancelled_by_user: Set[str] = set()
+        self._shutting_down = False
+
+    # ---- public API ----
+    def submit(self, urls: List[str]) -> IngestJob:
+        job = IngestJob(id=uuid.uuid4().hex, urls=list(dict.fromkeys(urls)))
+        job.progress = {u: asdict(UrlResult(url=u)) for u in job.urls}
+        for p in job.progress.values():
+            p.pop("ids", None)
+        self._enqueue(job)
+        return job.snapshot()
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.snapshot()
+        return self._db.load(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return self._db.load(job_id)
+            self._cancelled_by_user.add(job_id)
+            self._cancel[job_id].set()
+            if job.status == "queued":
+                self._finalize(job, "cancelled")
+            return job.snapshot()
+
+    def resume(self) -> int:
+        """Re-queue jobs that were queued or running when the process stopped."""
+        jobs = self._db.load_resumable()
+        for job in jobs:
+            logger.info(f"Resuming ingest job {job.id}")
+            for progress in job.progress.values():
+                if progress.get("status") not in _FINAL_URL_STATUSES:
+                    progress.update(status="pending", stage="queued")
+            job.status = "queued"
+            self._enqueue(job)
+        return len(jobs)
+
+    def shutdown(self) -> None:
+        """Stop running jobs at their next stage boundary and wait for them before closing the store."""
+        with self._lock:
+            self._shutting_down = True
+            for event in self._cancel.values():
+                event.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._db.close()
+
+    # ---- internals ----
+    def _enqueue(self, job: IngestJob) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+            self._cancel[job.id] = threading.Event()
+            for url in job.urls:
+                owner = self._inflight_urls.get(url)
+                if owner is not None and owner != job.id:
+                    job.progress[url].update(status="duplicate", error=f"already being ingested by job {owner}")
+                elif job.progress[url].get("status") not in _FINAL_URL_STATUSES:
+                    self._inflight_urls[url] = job.id
+            self._db.save(job)
+        self._executor.submit(self._run, job.id)
+
+    def _interrupted(self, job: IngestJob) -> bool:
+        """Must be called with the lock held."""
+        return self._shutting_down and job.id not in self._cancelled_by_user
+
+    def _save_interrupted(self, job: IngestJob) -> None:
+        """Persist a job stopped by shutdown so `resume` re-runs its unfinished URLs. Lock held."""
+        for progress in job.progress.values():
+            if progress.get("status") == "cancelled":
+                progress.update(status="pending", stage="queued")
+        self._db.save(job)
+        logger.info(f"Ingest job {job.id} interrupted by shutdown; it will resume on the next start")
+
+    def _finalize(self, job: IngestJob, status: str, error: Optional[str] = None) -> None:
+        """Must be called with the lock held."""
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        for url, progress in job.progress.items():
+            if progress.get("status") == "pending" and status == "cancelled":
+                progress["status"] = "cancelled"
+            if self._inflight_urls.get(url) == job.id:
+                del self._inflight_urls[url]
+        self._db.save(job)
+        self._jobs.pop(job.id, None)
+        self._cancel.pop(job.id, None)
+        self._last_saved.pop(job.id, None)
+        self._cancelled_by_user.discard(job.id)
+
+    def _on_progress(self, job: IngestJob, result: UrlResult) -> None:
+        progress = asdict(result)
+        progress.pop("ids", None)
+        progress.pop("duplicates_skipped", None)
+        with self._lock:
+            job.progress[result.url] = progress
+            now = time.monotonic()
+            # Persist at most twice a second; the final state is always saved
+            if now - self._last_saved.get(job.id, 0.0) >= 0.5:
+                self._last_saved[job.id] = now
+                self._db.save(job)
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            cancel = self._cancel.get(job_id)
+            if job is None or job.status != "queued" or cancel is None or self._shutting_down:
+                return
+            urls = [u for u in job.urls if self._inflight_urls.get(u) == job.id]
+            job.status = "running"
+            job.started_at = time.time()
+            self._db.save(job)
+        try:
+            IngestPipeline(
+                self.settings,
+                store=self.store,
+                on_progress=lambda res: self._on_progress(job, res),
+                cancel_event=cancel,
+            ).run(urls)
+        except Exception as exc:
+            with self._lock:
+                if self._interrupted(job):
+                    self._save_interrupted(job)
+                    return
+                logger.exception(f"Ingest job {job_id} failed")
+                self._finalize(job, "failed", str(exc))
+            return
+        with self._lock:
+            if cancel.is_set() and self._interrupted(job):
+                self._save_interrupted(job)
+            else:
+                self._finalize(job, "cancelled" if cancel.is_set() else "completed")
@@ -0,0 +1,568 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lexical_docs (
+    doc_no INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS lexical_docs_chunk ON lexical_docs (collection, chunk_id);
+CREATE INDEX IF NOT EXISTS lexical_docs_deleted ON lexical_docs (deleted) WHERE deleted > 0;
+CREATE TABLE IF NOT EXISTS lexical_postings (
+    collection TEXT NOT NULL,
+    term TEXT NOT NULL,
+    last_doc INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (collection, term, last_doc)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lexical_collections (
+    collection TEXT PRIMARY KEY,
+    batches INTEGER NOT NULL DEFAULT 0,
+    docs INTEGER NOT NULL DEFAULT 0,
+    total_length INTEGER NOT NULL DEFAULT 0,
+    dead INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS lexical_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Doc numbers are never reused: readers cache lengths by doc number and only load rows past the last one seen
+_MIGRATE_DOCS = """
+ALTER TABLE lexical_docs RENAME TO lexical_docs_old;
+CREATE TABLE lexical_docs (
+    doc_no INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+INSERT INTO lexical_docs (doc_no, collection, chunk_id, length, deleted)
+    SELECT doc_no, collection, chunk_id, length, deleted FROM lexical_docs_old;
+DROP TABLE lexical_docs_old;
+CREATE INDEX lexical_docs_chunk ON lexical_docs (collection, chunk_id);
+CREATE INDEX lexical_docs_deleted ON lexical_docs (deleted) WHERE deleted > 0;
+"""
+
+# Live chunk count, live length and deleted chunks per collection, kept up to date by every write
+_MIGRATE_TOTALS = """
+ALTER TABLE lexical_collections ADD COLUMN docs INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE lexical_collections ADD COLUMN total_length INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE lexical_collections ADD COLUMN dead INTEGER NOT NULL DEFAULT 0;
+UPDATE lexical_collections SET
+    docs = (SELECT COUNT(*) FROM lexical_docs d WHERE d.collection = lexical_collections.collection AND deleted = 0),
+    total_length = (
+        SELECT COALESCE(SUM(length), 0) FROM lexical_docs d
+        WHERE d.collection = lexical_collections.collection AND deleted = 0
+    ),
+    dead = (SELECT COUNT(*) FROM lexical_docs d WHERE d.collection = lexical_collections.collection AND deleted > 0);
+"""
+
+# Postings per block; a block is one row of varint (doc delta, tf) pairs
+_BLOCK_SIZE = 128
+_K1 = 1.2
+_B = 0.75
+
+# Words, plus identifiers kept whole: ERR_CONNECTION_RESET, 0x80070005, v1.2.3, foo-bar
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[._\-]")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased terms. Compound identifiers are emitted whole and as their
+    parts, so "ERR_CONNECTION_RESET" matches exactly (a rare, high-IDF term)
+    and still matches a search for "connection".
+    """
+    out: List[str] = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        if token in _STOPWORDS:
+            continue
+        out.append(token)
+        if not token.isalnum():
+            out.extend(p for p in _SPLIT_RE.split(token) if p and p not in _STOPWORDS)
+    return out
+
+
+def _encode_varints(values: np.ndarray) -> Tuple[bytes, np.ndarray]:
+    """LEB128 (7 bits per byte, high bit set on every byte but the last); also returns each value's size."""
+    v = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(v), dtype=np.int64)
+    rest = v >> np.uint64(7)
+    while rest.any():
+        nbytes += rest > 0
+        rest >>= np.uint64(7)
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max(initial=0))):
+        m = nbytes > k
+        byte = ((v[m] >> np.uint64(7 * k)) & np.uint64(0x7F)).astype(np.uint8)
+        out[starts[m] + k] = byte | ((nbytes[m] > k + 1).astype(np.uint8) << 7)
+    return out.tobytes(), nbytes
+
+
+def _decode_varints(data: bytes) -> np.ndarray:
+    b = np.frombuffer(data, dtype=np.uint8)
+    if not len(b):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    shift = (np.arange(len(b)) - np.repeat(starts, lengths)) * 7
+    parts = (b & 0x7F).astype(np.int64) << shift
+    return np.add.reduceat(parts, starts)
+
+
+def _encode_blocks(
+    terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray
+) -> Iterator[Tuple[int, int, int, bytes]]:
+    """
+    Postings sorted by (term, doc) -> (term, last doc, n, data) blocks of up
+    to _BLOCK_SIZE. Each block holds its doc numbers as deltas (the first
+    one absolute) interleaved with term frequencies; every block of the
+    batch is encoded in one vectorised pass.
+    """
+    n = len(docs)
+    if not n:
+        return
+    index = np.arange(n)
+    new_term = np.r_[True, terms[1:] != terms[:-1]]
+    position = index - np.maximum.accumulate(np.where(new_term, index, 0))
+    new_block = new_term | (position % _BLOCK_SIZE == 0)
+    deltas = np.where(new_block, docs, docs - np.r_[0, docs[:-1]])
+    data, nbytes = _encode_varints(np.column_stack((deltas, tfs)).ravel())
+    offsets = np.r_[0, np.cumsum(nbytes.reshape(-1, 2).sum(axis=1))]
+    starts = np.flatnonzero(new_block)
+    for start, end in zip(starts.tolist(), np.r_[starts[1:], n].tolist()):
+        yield int(terms[start]), int(docs[end - 1]), end - start, data[offsets[start]:offsets[end]]
+
+
+def _decode_blocks(blocks: Sequence[Tuple[int, bytes]]) -> Tuple[np.ndarray, np.ndarray]:
+    """(n, data) blocks -> (doc numbers, tfs), decoded in one pass."""
+    if not blocks:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    counts = np.fromiter((n for n, _ in blocks), dtype=np.int64, count=len(blocks))
+    pairs = _decode_varints(b"".join(data for _, data in blocks)).reshape(-1, 2)
+    running = np.cumsum(pairs[:, 0])
+    # Deltas restart at every block; subtract the running total carried in from earlier blocks
+    block_starts = np.cumsum(counts) - counts
+    carried = np.where(block_starts > 0, running[np.maximum(block_starts - 1, 0)], 0)
+    return running - np.repeat(carried, counts), pairs[:, 1]
+
+
+@dataclass
+class LexicalHit:
+    collection: str
+    chunk_id: str
+    score: float
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk texts, one SQLite file for every
+    collection (`CHROMA_DIRECTORY/lexical.sqlite3`).
+
+    Chunks get an increasing integer doc number that is never reused, even
+    after compaction drops the highest ones, so each write batch adds
+    sorted postings that are stored per term as blocks of up to 128
+    varint-encoded (doc delta, tf) pairs. Deletes only flag the chunk;
+    compaction merges a collection's blocks into full ones and drops
+    deleted chunks, after `compact_batches` writes or once
+    `compact_dead_ratio` of its chunks are deleted.
+
+    Queries read through a separate connection (WAL), so they don't wait
+    for writers. Doc lengths and deleted flags are cached per process;
+    after another commit only the chunks added or deleted since are read,
+    and per-collection totals come from `lexical_collections`.
+    """
+
+    def __init__(self, path: str, compact_batches: int = 32, compact_dead_ratio: float = 0.25) -> None:
+        self.path = path
+        self.compact_batches = max(1, compact_batches)
+        self.compact_dead_ratio = compact_dead_ratio
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+        self._version: Optional[int] = None
+        self._max_doc = 0
+        self._delete_seq = 0
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._dead = np.zeros(0, dtype=bool)
+        # collection -> (live docs, total length)
+        self._totals: Dict[str, Tuple[int, int]] = {}
+        self._built: Set[str] = set()
+
+    def _migrate(self) -> None:
+        """Bring an index written by an older version up to the current schema."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        sql = self._conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lexical_docs'"
+        ).fetchone()[0]
+        if "AUTOINCREMENT" not in sql.upper():
+            logger.info(f"Migrating lexical index {self.path} to non-reusable doc numbers")
+            self._execute_script(_MIGRATE_DOCS)
+        columns = {r[1] for r in self._conn.execute("PRAGMA table_info(lexical_collections)")}
+        if "docs" not in columns:
+            logger.info(f"Migrating lexical index {self.path} to stored collection totals")
+            self._execute_script(_MIGRATE_TOTALS)
+        # Deleted chunks are stamped with this sequence, so readers only load deletes newer than the last they saw
+        self._conn.execute("INSERT OR IGNORE INTO lexical_meta (key, value) VALUES ('delete_seq', 1)")
+        self._conn.commit()
+
+    def _execute_script(self, script: str) -> None:
+        """Run statements inside the current transaction (executescript would commit first)."""
+        for statement in script.split(";"):
+            if statement.strip():
+                self._conn.execute(statement)
+
+    # ---- collections ----
+    def is_built(self, collection: str) -> bool:
+        if collection in self._built:
+            return True
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM lexical_collections WHERE collection = ?", (collection,)
+            ).fetchone()
+        if row:
+            self._built.add(collection)
+        return bool(row)
+
+    def rebuild_from_chroma(self, collection_name: str, collection, page_size: int = 5000) -> int:
+        """(Re)index every document of a Chroma collection."""
+        with self._lock:
+            self._drop_collection(collection_name)
+            self._conn.execute("INSERT INTO lexical_collections (collection) VALUES (?)", (collection_name,))
+            self._conn.commit()
+        total = 0
+        offset = 0
+        while True:
+            res = collection.get(include=["documents"], limit=page_size, offset=offset)
+            ids = res.get("ids") or []
+            if not ids:
+                break
+            total += self.add(collection_name, ids, res.get("documents") or [""] * len(ids), compact=False)
+            offset += len(ids)
+        self.compact(collection_name)
+        self._built.add(collection_name)
+        logger.info(f"Rebuilt lexical index for '{collection_name}': {total} chunks")
+        return total
+
+    def _drop_collection(self, collection: str) -> None:
+        self._conn.execute("DELETE FROM lexical_docs WHERE collection = ?", (collection,))
+        self._conn.execute("DELETE FROM lexical_postings WHERE collection = ?", (collection,))
+        self._conn.execute("DELETE FROM lexical_collections WHERE collection = ?", (collection,))
+
+    # ---- writes ----
+    def add(self, collection: str, ids: Sequence[str], texts: Sequence[str], compact: bool = True) -> int:
+        """Index chunks not already live in the collection; ids are content hashes, so live ones are unchanged."""
+        if not ids:
+            return 0
+        # Last occurrence of an id within the batch wins, as in Chroma
+        batch = dict(zip(ids, texts))
+        with self._lock:
+            live = self._live_ids(collection, list(batch))
+            fresh = [(cid, text) for cid, text in batch.items() if cid not in live]
+            if not fresh:
+                return 0
+            vocabulary: Dict[str, int] = {}
+            term_ids: List[int] = []
+            doc_nos: List[int] = []
+            tfs: List[int] = []
+            total_length = 0
+            for cid, text in fresh:
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                total_length += length
+                cur = self._conn.execute(
+                    "INSERT INTO lexical_docs (collection, chunk_id, length) VALUES (?, ?, ?)",
+                    (collection, cid, length),
+                )
+                doc_no = int(cur.lastrowid)
+                for term, tf in counts.items():
+                    term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                    doc_nos.append(doc_no)
+                    tfs.append(tf)
+            self._insert_postings(collection, list(vocabulary), term_ids, doc_nos, tfs)
+            self._conn.execute(
+                "INSERT INTO lexical_collections (collection, batches, docs, total_length) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT(collection) DO UPDATE SET batches = batches + 1, docs = docs + excluded.docs, "
+                "total_length = total_length + excluded.total_length",
+                (collection, len(fresh), total_length),
+            )
+            self._conn.commit()
+            if compact:
+                self._maybe_compact(collection)
+        return len(fresh)
+
+    def delete(self, collection: str, ids: Sequence[str]) -> int:
+        if not ids:
+            return 0
+        with self._lock:
+            seq = self._conn.execute(
+                "UPDATE lexical_meta SET value = value + 1 WHERE key = 'delete_seq' RETURNING value"
+            ).fetchone()[0]
+            n = 0
+            removed_length = 0
+            for start in range(0, len(ids), 500):
+                part = list(ids[start:start + 500])
+                lengths = self._conn.execute(
+                    f"UPDATE lexical_docs SET deleted = ? WHERE collection = ? AND deleted = 0 "
+                    f"AND chunk_id IN ({','.join('?' * len(part))}) RETURNING length",
+                    (seq, collection, *part),
+                ).fetchall()
+                n += len(lengths)
+                removed_length += sum(r[0] for r in lengths)
+            if not n:
+                self._conn.rollback()
+                return 0
+            self._conn.execute(
+                "UPDATE lexical_collections SET docs = docs - ?, total_length = total_length - ?, dead = dead + ? "
+                "WHERE collection = ?",
+                (n, removed_length, n, collection),
+            )
+            self._conn.commit()
+            self._maybe_compact(collection)
+        return n
+
+    def _live_ids(self, collection: str, ids: List[str]) -> Set[str]:
+        live: Set[str] = set()
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT chunk_id FROM lexical_docs WHERE collection = ? AND deleted = 0 "
+                f"AND chunk_id IN ({','.join('?' * len(part))})",
+                (collection, *part),
+            ).fetchall()
+            live.update(r[0] for r in rows)
+        return live
+
+    def _insert_postings(self, collection: str, vocabulary: List[str], term_ids, doc_nos, tfs) -> None:
+        terms = np.asarray(term_ids, dtype=np.int64)
+        docs = np.asarray(doc_nos, dtype=np.int64)
+        # Docs were numbered in insertion order, so a stable sort by term keeps each term's docs sorted
+        order = np.argsort(terms, kind="stable")
+        self._conn.executemany(
+            "INSERT INTO lexical_postings (collection, term, last_doc, n, data) VALUES (?, ?, ?, ?, ?)",
+            (
+                (collection, vocabulary[term], last_doc, n, data)
+                for term, last_doc, n, data in _encode_blocks(
+                    terms[order], docs[order], np.asarray(tfs, dtype=np.int64)[order]
+                )
+            ),
+        )
+
+    def _maybe_compact(self, collection: str) -> None:
+        row = self._conn.execute(
+            "SELECT batches, docs, dead FROM lexical_collections WHERE collection = ?", (collection,)
+        ).fetchone()
+        if row is None:
+            return
+        batches, live, dead = row
+        if batches > self.compact_batches or (dead and dead / (live + dead) > self.compact_dead_ratio):
+            self._compact(collection)
+
+    def compact(self, collection: str) -> None:
+        with self._lock:
+            self._compact(collection)
+
+    def _compact(self, collection: str) -> None:
+        """Rewrite a collection's postings as full blocks without deleted chunks. Must hold the lock."""
+        t0 = time.perf_counter()
+        dead = np.fromiter(
+            (r[0] for r in self._conn.execute(
+                "SELECT doc_no FROM lexical_docs WHERE collection = ? AND deleted > 0", (collection,)
+            )),
+            dtype=np.int64,
+        )
+        vocabulary: Dict[str, int] = {}
+        block_terms: List[int] = []
+        blocks: List[Tuple[int, bytes]] = []
+        for term, n, data in self._conn.execute(
+            "SELECT term, n, data FROM lexical_postings WHERE collection = ? ORDER BY term, last_doc", (collection,)
+        ):
+            block_terms.append(vocabulary.setdefault(term, len(vocabulary)))
+            blocks.append((n, data))
+        docs, tfs = _decode_blocks(blocks)
+        terms = np.repeat(np.asarray(block_terms, dtype=np.int64), [n for n, _ in blocks])
+        keep = ~np.isin(docs, dead)
+        self._conn.execute("DELETE FROM lexical_postings WHERE collection = ?", (collection,))
+        self._insert_postings(collection, list(vocabulary), terms[keep], docs[keep], tfs[keep])
+        self._conn.execute("DELETE FROM lexical_docs WHERE collection = ? AND deleted > 0", (collection,))
+        self._conn.execute("UPDATE lexical_collections SET batches = 0, dead = 0 WHERE collection = ?", (collection,))
+        self._conn.commit()
+        logger.info(
+            f"Compacted lexical index for '{collection}': {len(vocabulary)} terms, {len(dead)} deleted chunks "
+            f"dropped in {time.perf_counter() - t0:.2f}s"
+        )
+
+    # ---- reads ----
+    def _refresh(self) -> None:
+        """
+        Catch up with commits since the last call: lengths of new chunks,
+        chunks deleted since `_delete_seq`, and the per-collection totals.
+        Holds the read lock.
+        """
+        version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version:
+            return
+        # One read transaction, so the new chunks, deletes and totals are from the same commit
+        self._reader.execute("BEGIN")
+        try:
+            rows = self._reader.execute(
+                "SELECT doc_no, length FROM lexical_docs WHERE doc_no > ? ORDER BY doc_no", (self._max_doc,)
+            ).fetchall()
+            if rows:
+                new = np.asarray(rows, dtype=np.int64)
+                size = int(new[-1, 0]) + 1
+                if size > len(self._lengths):
+                    grow = size - len(self._lengths)
+                    self._lengths = np.concatenate((self._lengths, np.zeros(grow, dtype=np.int32)))
+                    self._dead = np.concatenate((self._dead, np.zeros(grow, dtype=bool)))
+                self._lengths[new[:, 0]] = new[:, 1]
+                self._max_doc = int(new[-1, 0])
+            deleted = self._reader.execute(
+                "SELECT doc_no, deleted FROM lexical_docs WHERE deleted > 0 AND deleted > ?", (self._delete_seq,)
+            ).fetchall()
+            if deleted:
+                marks = np.asarray(deleted, dtype=np.int64)
+                self._dead[marks[:, 0]] = True
+                self._delete_seq = int(marks[:, 1].max())
+            totals = self._reader.execute("SELECT collection, docs, total_length FROM lexical_collections")
+            self._totals = {c: (int(n), int(total)) for c, n, total in totals}
+        finally:
+            self._reader.commit()
+        self._version = version
+
+    def search(self, collections: Sequence[str], query: str, n_results: int) -> List[LexicalHit]:
+        """
+        BM25 top-`n_results` over the given collections, best first. IDF and
+        the average length are taken over all of them together, so scores
+        from different collections are comparable.
+        """
+        terms = sorted(set(tokenize(query)))
+        if not terms or n_results <= 0:
+            return []
+        with self._read_lock:
+            self._refresh()
+            searched = [c for c in dict.fromkeys(collections) if self._totals.get(c, (0, 0))[0]]
+            if not searched:
+                return []
+            n_docs = sum(self._totals[c][0] for c in searched)
+            avg_len = sum(self._totals[c][1] for c in searched) / n_docs
+            postings: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+            for collection in searched:
+                for term, docs, tfs in self._postings(collection, terms):
+                    postings.setdefault(term, []).append((docs, tfs))
+            doc_parts: List[np.ndarray] = []
+            score_parts: List[np.ndarray] = []
+            for parts in postings.values():
+                docs = np.concatenate([d for d, _ in parts])
+                tfs = np.concatenate([t for _, t in parts]).astype(np.float32)
+                df = len(docs)
+                idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                norm = _K1 * (1.0 - _B + _B * self._lengths[docs] / avg_len)
+                doc_parts.append(docs)
+                score_parts.append(idf * tfs * (_K1 + 1.0) / (tfs + norm))
+            if not doc_parts:
+                return []
+            docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+            k = min(n_results, len(docs))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(docs) else np.arange(len(docs))
+            # Best score first, ties by doc number (oldest chunk first)
+            top = top[np.lexsort((docs[top], -scores[top]))]
+            doc_nos = [int(d) for d in docs[top]]
+            rows = self._reader.execute(
+                f"SELECT doc_no, collection, chunk_id FROM lexical_docs "
+                f"WHERE doc_no IN ({','.join('?' * len(doc_nos))})",
+                doc_nos,
+            ).fetchall()
+        chunks = {doc_no: (collection, chunk_id) for doc_no, collection, chunk_id in rows}
+        return [
+            LexicalHit(*chunks[d], float(s))
+            for d, s in zip(doc_nos, scores[top].tolist())
+            if d in chunks
+        ]
+
+    def _postings(self, collection: str, terms: List[str]) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+        """(term, doc numbers, tfs) of a collection's live chunks. Holds the read lock."""
+        blocks: Dict[str, List[Tuple[int, bytes]]] = {}
+        for term, n, data in self._reader.execute(
+            f"SELECT term, n, data FROM lexical_postings WHERE collection = ? "
+            f"AND term IN ({','.join('?' * len(terms))}) ORDER BY term, last_doc",
+            (collection, *terms),
+        ):
+            blocks.setdefault(term, []).append((n, data))
+        for term, term_blocks in blocks.items():
+            docs, tfs = _decode_blocks(term_blocks)
+            # Postings may name chunks added after the cached doc table was loaded
+            known = docs < len(self._lengths)
+            docs, tfs = docs[known], tfs[known]
+            live = ~self._dead[docs]
+            if live.any():
+                yield term, docs[live], tfs[live]
+
+    def stats(self) -> Dict[str, float]:
+        with self._read_lock:
+            self._refresh()
+            blocks = self._reader.execute("SELECT COUNT(*) FROM lexical_postings").fetchone()[0]
+            deleted = self._reader.execute("SELECT COALESCE(SUM(dead), 0) FROM lexical_collections").fetchone()[0]
+            return {
+                "collections": len(self._totals),
+                "chunks": sum(n for n, _ in self._totals.values()),
+                "deleted": int(deleted),
+                "blocks": blocks,
+            }
+
+    def close(self) -> None:
+        with self._lock, self._read_lock:
+            self._conn.close()
+            self._reader.close()
+
+
+def main() -> None:
+    import argparse
+
+    from ..api.config import Settings
+    from .registry import get_registry
+
+    parser = argparse.ArgumentParser(description="Rebuild the BM25 lexical index from Chroma")
+    parser.add_argument("collections", nargs="*", help="collections to rebuild (default: all)")
+    args = parser.parse_args()
+    registry = get_registry(Settings())
+    index = registry.lexical
+    if index is None:
+        parser.error("set LEXICAL_SEARCH=true to use the lexical index")
+    for name in args.collections or registry.list_collection_names():
+        print(f"{name}: {index.rebuild_from_chroma(name, registry.get_collection(name))} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import re
+import time
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
+from .metrics import METRICS
 from ..api.config import Settings
 
+# A streamed piece: one word with the whitespace around it
+_PIECE_RE = re.compile(r"\s*\S+\s*|\s+")
+
 
 @dataclass
 class SourceForPrompt:
@@ -57,9 +64,34 @@ class LLMAdapter:
         self.settings = settings or Settings()
         self.backend = (self.settings.llm_backend or "dummy").lower()
 
-    def answer(self, question: str, sources: List[SourceForPrompt]) -> str:
+    @staticmethod
+    def _check_deadline(deadline: Optional[float]) -> None:
+        # A real backend passes `deadline - time.monotonic()` as its request timeout
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError("generation deadline exceeded")
+
+    @METRICS.timed("llm_answer")
+    def answer(self, question: str, sources: List[SourceForPrompt], deadline: Optional[float] = None) -> str:
+        """`deadline` is a time.monotonic() value; TimeoutError once it has passed."""
+        self._check_deadline(deadline)
         if self.backend == "dummy" or self.backend == "openai":
             # For 'openai', we intentionally reuse the same dummy generation to keep local-only
             return generate_answer_dummy(question, sources)
         # default fallback
-        return generate_answer_dummy(question, sources)
\ No newline at end of file
+        return generate_answer_dummy(question, sources)
+
+    async def astream(
+        self, question: str, sources: List[SourceForPrompt], deadline: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield the answer in pieces as they are generated. Closing the
+        generator (e.g. on client disconnect) stops generation, and so does
+        `deadline` passing (TimeoutError).
+        """
+        # The dummy backend has the whole answer at once; emit it word by word
+        # so clients exercise the same incremental path as a real model
+        for piece in _PIECE_RE.findall(generate_answer_dummy(question, sources)):
+            self._check_deadline(deadline)
+            yield piece
+            # Yield to the event loop between pieces; also the cancellation point
+            await asyncio.sleep(0)
\ No newline at end of file
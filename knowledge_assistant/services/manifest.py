@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..api.config import Settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_manifest (
+    url TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT NOT NULL,
+    chunk_ids TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ingest_changes (
+    collection TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    deleted INTEGER NOT NULL,
+    changed_at REAL NOT NULL,
+    PRIMARY KEY (collection, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ingest_changes_at ON ingest_changes (changed_at);
+"""
+
+
+@dataclass
+class ManifestEntry:
+    url: str
+    collection: str
+    content_hash: str
+    chunk_ids: List[str] = field(default_factory=list)
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    updated_at: float = 0.0
+
+
+class IngestManifest:
+    """
+    Per-URL record of what was last ingested: validators for conditional
+    requests, a hash of the raw body and the chunk ids stored for it.
+    Lives in a SQLite file next to the Chroma data.
+
+    It also logs the last change to chunks written outside a URL's own
+    entry (deletes, and metadata rewritten for deduplicated chunks), so
+    delta snapshots can be cut from `entries_since` plus `changes_since`.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    @classmethod
+    def for_settings(cls, settings: Settings) -> "IngestManifest":
+        return cls(os.path.join(settings.chroma_directory, "ingest_manifest.sqlite3"))
+
+    @staticmethod
+    def _row_to_entry(row) -> ManifestEntry:
+        return ManifestEntry(
+            url=row[0],
+            collection=row[1],
+            etag=row[2],
+            last_modified=row[3],
+            content_hash=row[4],
+            chunk_ids=json.loads(row[5]),
+            updated_at=row[6],
+        )
+
+    def get(self, url: str) -> Optional[ManifestEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, collection, etag, last_modified, content_hash, chunk_ids, updated_at "
+                "FROM ingest_manifest WHERE url = ?",
+                (url,),
+            ).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def put(self, entry: ManifestEntry, touch: bool = True) -> None:
+        """Store `entry`; with `touch`, stamp it as changed now (what `entries_since` filters on)."""
+        if touch:
+            entry.updated_at = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingest_manifest "
+                "(url, collection, etag, last_modified, content_hash, chunk_ids, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.url,
+                    entry.collection,
+                    entry.etag,
+                    entry.last_modified,
+                    entry.content_hash,
+                    json.dumps(entry.chunk_ids),
+                    entry.updated_at,
+                ),
+            )
+            self._conn.commit()
+
+    def entries_since(self, since: float = 0.0) -> List[ManifestEntry]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, collection, etag, last_modified, content_hash, chunk_ids, updated_at "
+                "FROM ingest_manifest WHERE updated_at > ? ORDER BY updated_at",
+                (since,),
+            ).fetchall()
+        return [self._row_to_entry(r) for r in rows]
+
+    def record_changes(self, collection: str, chunk_ids: Sequence[str], deleted: bool) -> None:
+        if not chunk_ids:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ingest_changes (collection, chunk_id, deleted, changed_at) VALUES (?, ?, ?, ?)",
+                ((collection, cid, int(deleted), now) for cid in chunk_ids),
+            )
+            self._conn.commit()
+
+    def changes_since(self, since: float = 0.0) -> Dict[str, Tuple[List[str], List[str]]]:
+        """collection -> (chunk ids rewritten, chunk ids deleted) after `since`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT collection, chunk_id, deleted FROM ingest_changes WHERE changed_at > ?", (since,)
+            ).fetchall()
+        out: Dict[str, Tuple[List[str], List[str]]] = {}
+        for collection, chunk_id, deleted in rows:
+            out.setdefault(collection, ([], []))[1 if deleted else 0].append(chunk_id)
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_THREAD_SUFFIX_RE = re.compile(r"_\d+$")
+_METRIC_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+# Upper bounds in milliseconds; the last bucket catches everything above
+DEFAULT_BUCKETS_MS: Tuple[float, ...] = (
+    0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf"),
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with approximate percentiles."""
+
+    __slots__ = ("buckets", "counts", "count", "total", "max", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS_MS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float) -> None:
+        idx = bisect.bisect_left(self.buckets, value_ms)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.total += value_ms
+            if value_ms > self.max:
+                self.max = value_ms
+
+    def percentile(self, q: float) -> float:
+        """Linear interpolation inside the bucket holding the q-th observation."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for i, c in enumerate(self.counts):
+                if seen + c >= rank and c:
+                    lower = self.buckets[i - 1] if i else 0.0
+                    upper = self.buckets[i] if self.buckets[i] != float("inf") else self.max
+                    return min(self.max, lower + (upper - lower) * (rank - seen) / c)
+                seen += c
+            return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    __slots__ = ("_metrics", "_name", "_t0")
+
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self) -> "_StageTimer":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._metrics.observe(self._name, (time.perf_counter() - self._t0) * 1000.0)
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler for slow requests. While any request is in flight a
+    background thread samples every thread's stack; a request that ends up
+    slower than `threshold_ms` gets the samples taken during its lifetime
+    aggregated and dumped as JSON to `directory`.
+
+    The samples are process-wide, not the request's own: its work hops
+    between the event loop and pool threads, so there is no single thread
+    to follow. Each stack starts with the name of the thread (pool) it was
+    taken on, and the dump records how many other requests were still in
+    flight when it finished.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        directory: str,
+        interval_ms: float = 5.0,
+        max_samples: int = 20000,
+        max_depth: int = 40,
+    ) -> None:
+        self.threshold_ms = threshold_ms
+        self.max_depth = max_depth
+        self.directory = directory
+        self.interval_s = max(0.001, interval_ms / 1000.0)
+        self._samples: Deque[Tuple[float, str]] = deque(maxlen=max_samples)
+        self._active = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._cond:
+                while self._active == 0:
+                    self._cond.wait()
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                # "query-work_3" -> "query-work", so a pool's threads aggregate together
+                thread = _THREAD_SUFFIX_RE.sub("", names.get(ident, "thread"))
+                stack = ";".join([f"[{thread}]"] + [f"{f.name} ({os.path.basename(f.filename)}:{f.lineno})"
+                                                    for f in traceback.extract_stack(frame)[-self.max_depth:]])
+                self._samples.append((now, stack))
+            time.sleep(self.interval_s)
+
+    def start(self) -> float:
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+            self._active += 1
+            self._cond.notify()
+        return time.perf_counter()
+
+    def stop(self, name: str, started: float) -> None:
+        ended = time.perf_counter()
+        with self._cond:
+            self._active -= 1
+            others = self._active
+        duration_ms = (ended - started) * 1000.0
+        if duration_ms < self.threshold_ms:
+            return
+        stacks = Counter(stack for ts, stack in list(self._samples) if started <= ts <= ended)
+        os.makedirs(self.directory, exist_ok=True)
+        safe = "".join(ch if ch.isalnum() else "_" for ch in name).strip("_") or "request"
+        path = os.path.join(self.directory, f"slow-{int(time.time() * 1000)}-{safe}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "request": name,
+                    "duration_ms": round(duration_ms, 3),
+                    "interval_ms": self.interval_s * 1000.0,
+                    # Samples cover every thread, including other requests' work
+                    "scope": "process",
+                    "other_requests_in_flight": others,
+                    "stacks": [{"samples": n, "stack": s} for s, n in stacks.most_common(50)],
+                },
+                f,
+                indent=2,
+            )
+        logger.warning(f"Slow request {name}: {duration_ms:.0f} ms, profile written to {path}")
+
+
+class Metrics:
+    """
+    Process-wide counters, gauges and per-stage latency histograms.
+
+    `inc` counts HTTP requests per endpoint (`requests_total`); everything
+    else that is counted goes through `count`, one metric per name with
+    its own labels.
+
+    Time a stage with `with METRICS.stage("embed"):` or `@METRICS.timed("llm_answer")`.
+    When disabled, `stage()` hands back a shared no-op context manager, so
+    instrumented code pays one attribute check and nothing else.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        # HTTP requests per endpoint
+        self._counters: Dict[str, float] = {}
+        # name -> sorted (label, value) pairs -> total
+        self._labelled: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauge_fns: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._ingest = {"requests": 0, "docs": 0, "chunks": 0, "total_ms": 0}
+        self._ask = {"requests": 0, "sources_returned": 0, "answer_chars": 0, "total_ms": 0, "retrieval_ms": 0}
+        # Seconds spent per cold-start step (imports, model load, client open, warmup)
+        self._startup: Dict[str, float] = {}
+        self.profiler: Optional[SlowRequestProfiler] = None
+
+    def configure(
+        self,
+        enabled: bool = True,
+        profile_slow_ms: float = 0.0,
+        profile_dir: str = "./profiles",
+        profile_interval_ms: float = 5.0,
+    ) -> None:
+        self.enabled = enabled
+        if enabled and profile_slow_ms > 0:
+            self.profiler = SlowRequestProfiler(profile_slow_ms, profile_dir, profile_interval_ms)
+        else:
+            self.profiler = None
+
+    # ---- recording ----
+    def inc(self, name: str, value: float = 1) -> None:
+        """Count a request to the HTTP endpoint `name` (e.g. "/ask")."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Add `value` to the counter `name` with `labels`, e.g.
+        `count("scheduler_rejected", work_class="query", reason="queue_full")`;
+        exported as `<prefix>_<name>_total`.
+        """
+        if not self.enabled:
+            return
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._labelled.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, stage: str, value_ms: float) -> None:
+        if not self.enabled:
+            return
+        hist = self._histograms.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(stage, Histogram())
+        hist.observe(value_ms)
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name)
+
+    def timed(self, name: str) -> Callable:
+        def decorator(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, (time.perf_counter() - t0) * 1000.0)
+            return wrapper
+        return decorator
+
+    def register_gauges(self, name: str, fn: Callable[[], Dict[str, float]]) -> None:
+        """Expose the dict returned by `fn` (e.g. a cache's stats()) on every snapshot."""
+        with self._lock:
+            self._gauge_fns[name] = fn
+
+    def record_ingest(self, docs: int, chunks: int, duration_ms: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._ingest["requests"] += 1
+            self._ingest["docs"] += docs
+            self._ingest["chunks"] += chunks
+            self._ingest["total_ms"] += duration_ms
+        self.observe("ingest_request", duration_ms)
+
+    def record_ask(self, top_k: int, n_returned: int, total_ms: int, answer_chars: int, retrieval_ms: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._ask["requests"] += 1
+            self._ask["sources_returned"] += n_returned
+            self._ask["answer_chars"] += answer_chars
+            self._ask["total_ms"] += total_ms
+            self._ask["retrieval_ms"] += retrieval_ms
+        self.observe("ask_request", total_ms)
+        self.observe("retrieval", retrieval_ms)
+
+    # ---- cold start ----
+    def record_startup(self, step: str, seconds: float) -> None:
+        """Recorded even when disabled: startup runs before `configure` and only once."""
+        with self._lock:
+            self._startup[step] = round(self._startup.get(step, 0.0) + seconds, 4)
+
+    @contextmanager
+    def startup_step(self, step: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_startup(step, time.perf_counter() - t0)
+
+    # ---- slow-request profiling ----
+    def request_started(self) -> Optional[float]:
+        return self.profiler.start() if self.profiler is not None else None
+
+    def request_finished(self, name: str, token: Optional[float]) -> None:
+        if self.profiler is not None and token is not None:
+            try:
+                self.profiler.stop(name, token)
+            except Exception:
+                logger.exception("Slow request profiler failed")
+
+    # ---- export ----
+    def _gauges(self) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        for name, fn in list(self._gauge_fns.items()):
+            try:
+                out[name] = fn()
+            except Exception as exc:
+                logger.debug(f"Gauge {name} failed: {exc}")
+        return out
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            labelled = {name: dict(series) for name, series in self._labelled.items()}
+            ingest = dict(self._ingest)
+            ask = dict(self._ask)
+            histograms = dict(self._histograms)
+            startup = dict(self._startup)
+        if ask["requests"]:
+            ask["avg_ms"] = round(ask["total_ms"] / ask["requests"], 1)
+            ask["avg_retrieval_ms"] = round(ask["retrieval_ms"] / ask["requests"], 1)
+        if ingest["requests"]:
+            ingest["avg_ms"] = round(ingest["total_ms"] / ingest["requests"], 1)
+        return {
+            "enabled": self.enabled,
+            "uptime_s": round(time.time() - self._started_at, 1),
+            "requests": counters,
+            "counters": {
+                name: series.get((), 0) if list(series) == [()] else {
+                    ",".join(f"{k}={v}" for k, v in key): value for key, value in sorted(series.items())
+                }
+                for name, series in sorted(labelled.items())
+            },
+            "ingest": ingest,
+            "ask": ask,
+            "stages": {name: h.snapshot() for name, h in sorted(histograms.items())},
+            "gauges": self._gauges(),
+            "startup_s": startup,
+        }
+
+    def render_prometheus(self, prefix: str = "knowledge_assistant") -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            counters = dict(self._counters)
+            labelled = {name: dict(series) for name, series in self._labelled.items()}
+            histograms = dict(self._histograms)
+            startup = dict(self._startup)
+        lines.append(f"# TYPE {prefix}_requests_total counter")
+        for name, value in sorted(counters.items()):
+            lines.append(f'{prefix}_requests_total{{endpoint="{_escape(name)}"}} {value}')
+        for name, series in sorted(labelled.items()):
+            metric = f"{prefix}_{_METRIC_NAME_RE.sub('_', name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for key, value in sorted(series.items()):
+                labels = ",".join(f'{_METRIC_NAME_RE.sub("_", k)}="{_escape(v)}"' for k, v in key)
+                lines.append(f"{metric}{{{labels}}} {value}" if labels else f"{metric} {value}")
+        lines.append(f"# TYPE {prefix}_stage_latency_seconds histogram")
+        for stage, h in sorted(histograms.items()):
+            label = f'stage="{_escape(stage)}"'
+            cumulative = 0
+            for upper, count in zip(h.buckets, h.counts):
+                cumulative += count
+                le = "+Inf" if upper == float("inf") else repr(upper / 1000.0)
+                lines.append(f'{prefix}_stage_latency_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{prefix}_stage_latency_seconds_sum{{{label}}} {h.total / 1000.0}")
+            lines.append(f"{prefix}_stage_latency_seconds_count{{{label}}} {h.count}")
+        lines.append(f"# TYPE {prefix}_gauge gauge")
+        for group, values in sorted(self._gauges().items()):
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'{prefix}_gauge{{group="{_escape(group)}",name="{_escape(key)}"}} {value}')
+        lines.append(f"# TYPE {prefix}_startup_seconds gauge")
+        for step, seconds in sorted(startup.items()):
+            lines.append(f'{prefix}_startup_seconds{{step="{_escape(step)}"}} {seconds}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = Metrics()
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Deque, Iterator, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_BYTES = 64 * 1024
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+
+@dataclass
+class DownloadedPdf:
+    path: str
+    nbytes: int
+    content_hash: str
+    status_code: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def save_pdf(response: requests.Response, max_bytes: int) -> DownloadedPdf:
+    """Write the body of an open streaming response to a temporary PDF file."""
+    if response.status_code == 304:
+        return DownloadedPdf(
+            path="",
+            nbytes=0,
+            content_hash="",
+            status_code=304,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+    response.raise_for_status()
+    declared = int(response.headers.get("Content-Length") or 0)
+    if max_bytes and declared > max_bytes:
+        raise ValueError(f"PDF is {declared} bytes, above the {max_bytes} byte limit")
+    h = hashlib.sha256()
+    nbytes = 0
+    fd, path = tempfile.mkstemp(prefix="ka-pdf-", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in response.iter_content(_CHUNK_BYTES):
+                nbytes += len(block)
+                if max_bytes and nbytes > max_bytes:
+                    raise ValueError(f"PDF exceeds the {max_bytes} byte limit")
+                h.update(block)
+                out.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return DownloadedPdf(
+        path=path,
+        nbytes=nbytes,
+        content_hash=h.hexdigest(),
+        status_code=response.status_code,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+
+
+def _extract_range(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract pages [start, end) of a PDF; runs inside a worker process."""
+    import pdfplumber  # type: ignore
+
+    pages: List[Tuple[int, str]] = []
+    with pdfplumber.open(path) as pdf:
+        for idx in range(start, min(end, len(pdf.pages))):
+            page = pdf.pages[idx]
+            pages.append((idx + 1, page.extract_text() or ""))
+            page.close()
+    return pages
+
+
+def _count_pages(path: str) -> int:
+    try:
+        import pdfplumber  # type: ignore
+    except ImportError as exc:
+        raise RuntimeError("pdfplumber is required for PDF ingestion") from exc
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn: the parent is multi-threaded, forking it is not safe
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+
+def iter_pdf_pages(
+    path: str, max_pages: int = 0, workers: int = 2, pages_per_task: int = 8
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) in page order. Page ranges are extracted in a
+    process pool and yielded as soon as every earlier range is done, so the
+    caller can chunk early pages while later ones are still being parsed.
+    """
+    total = _count_pages(path)
+    if max_pages and total > max_pages:
+        logger.warning(f"PDF has {total} pages; only the first {max_pages} are ingested")
+        total = max_pages
+    step = max(1, pages_per_task)
+    ranges = [(s, min(total, s + step)) for s in range(0, total, step)]
+    if workers <= 1 or len(ranges) <= 1:
+        for s, e in ranges:
+            yield from _extract_range(path, s, e)
+        return
+    pool = _get_pool(workers)
+    todo = iter(ranges)
+    # At most 2 ranges per worker in flight keeps finished-but-unconsumed text bounded
+    inflight: Deque[Future] = deque(pool.submit(_extract_range, path, s, e) for s, e in islice(todo, workers * 2))
+    try:
+        while inflight:
+            fut = inflight.popleft()
+            nxt = next(todo, None)
+            if nxt is not None:
+                inflight.append(pool.submit(_extract_range, path, *nxt))
+            yield from fut.result()
+    finally:
+        for fut in inflight:
+            fut.cancel()
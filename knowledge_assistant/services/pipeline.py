@@ -0,0 +1,630 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .clean import chunk_text
+from .dedup import PendingChunks, simhash
+from .embed_store import EmbedStore
+from .html_extract import content_kind, decode, extract_text, read_body
+from .ingest import _detect_pdf, build_chunk_records, collection_for_url
+from .manifest import IngestManifest, ManifestEntry
+from .metrics import METRICS
+from .pdf_extract import iter_pdf_pages, save_pdf
+from ..api.config import Settings
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class UrlResult:
+    url: str
+    status: str = "pending"  # ok | unchanged | empty | failed | cancelled
+    # last stage reached: queued | fetched | chunked | embedded | upserted | done
+    stage: str = "queued"
+    chunks: int = 0
+    embedded: int = 0
+    upserted: int = 0
+    # chunk ids stored in the vector store, and those folded into a near-duplicate instead
+    ids: List[str] = field(default_factory=list)
+    duplicates_skipped: List[str] = field(default_factory=list)
+    added: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    duplicates: int = 0
+    # body bytes downloaded, bytes of text extracted from them and time spent parsing
+    fetched_bytes: int = 0
+    text_bytes: int = 0
+    parse_ms: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class _Fetched:
+    url: str
+    kind: str  # pdf | html | text
+    content_hash: str
+    content: bytes = b""
+    content_type: Optional[str] = None
+    # PDFs are streamed to a temp file instead of being held in `content`
+    path: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    previous: Optional[ManifestEntry] = None
+
+
+@dataclass
+class _Document:
+    url: str
+    collection: str
+    chunks: List[str]
+    ids: List[str]
+    metadatas: List[dict]
+    source: _Fetched
+    # Large documents arrive in several parts; the last one triggers cleanup
+    final: bool = True
+
+
+def build_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class IngestPipeline:
+    """
+    Staged ingest: fetch -> parse/chunk -> embed -> upsert.
+
+    Fetches run on a thread pool over one pooled `requests.Session`, limited
+    per host; parsing and chunking run on their own workers; the calling
+    thread batches chunks from many documents into one encode call and
+    upserts them per collection. Bounded queues between the stages make a
+    slow stage stall the one before it instead of buffering everything.
+
+    With a manifest, fetches are conditional on the stored ETag and
+    Last-Modified, bodies whose hash did not change are skipped, only chunk
+    ids not seen before are embedded and ids that disappeared from a page
+    are deleted from its collection.
+
+    With deduplication on, new chunks that nearly match a chunk already in
+    their collection (or earlier in the batch) are not embedded; the stored
+    chunk records their URL in `also_seen_at` and is deleted only once no
+    URL has it any more.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        store: Optional[EmbedStore] = None,
+        session: Optional[requests.Session] = None,
+        manifest: Optional[IngestManifest] = None,
+        on_progress: Optional[Callable[[UrlResult], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> None:
+        self.settings = settings
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event
+        self.store = store or EmbedStore(settings)
+        self.session = session or build_session(settings.ingest_fetch_workers)
+        self._owns_manifest = manifest is None and settings.ingest_incremental
+        if self._owns_manifest:
+            manifest = IngestManifest.for_settings(settings)
+        self.manifest = manifest
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+        self._results: Dict[str, UrlResult] = {}
+        self._results_lock = threading.Lock()
+        # url -> (chunk ids upserted so far, how many of them were new)
+        self._written: Dict[str, tuple] = {}
+        self.dedup = self.store.registry.dedup
+        # Running embed cost per chunk, to report the time deduplication saved
+        self._embed_ms_per_chunk = 0.0
+        # Set when run() is unwinding after an error, so fetch and parse threads wind down
+        self._stop = threading.Event()
+
+    # ---- bookkeeping ----
+    def _update(self, url: str, **changes) -> None:
+        """Apply `changes` to a URL's result and report a snapshot of it."""
+        with self._results_lock:
+            res = self._results[url]
+            for key, value in changes.items():
+                setattr(res, key, value)
+            snapshot = replace(res, ids=[], duplicates_skipped=[])
+        if self.on_progress is not None:
+            try:
+                self.on_progress(snapshot)
+            except Exception:
+                logger.exception("Ingest progress callback failed")
+
+    def _cancelled(self) -> bool:
+        return self._stop.is_set() or (self.cancel_event is not None and self.cancel_event.is_set())
+
+    def _fail(self, url: str, error: str) -> None:
+        logger.error(f"Error processing {url}: {error}")
+        self._update(url, status="failed", error=error)
+
+    def _mark_unchanged(self, fetched: _Fetched) -> None:
+        prev = fetched.previous
+        assert prev is not None
+        if self.manifest is not None:
+            prev.etag = fetched.etag or prev.etag
+            prev.last_modified = fetched.last_modified or prev.last_modified
+            # Content did not change: keep its timestamp so delta snapshots skip it
+            self.manifest.put(prev, touch=False)
+        skipped = set(self.dedup.folded(prev.collection, prev.chunk_ids)) if self.dedup is not None else set()
+        self._update(
+            fetched.url,
+            status="unchanged",
+            stage="done",
+            chunks=len(prev.chunk_ids),
+            ids=[cid for cid in prev.chunk_ids if cid not in skipped],
+            duplicates_skipped=[cid for cid in prev.chunk_ids if cid in skipped],
+            unchanged=len(prev.chunk_ids),
+        )
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._host_lock:
+            sem = self._host_limits.get(host)
+            if sem is None:
+                sem = threading.BoundedSemaphore(max(1, self.settings.ingest_per_host_concurrency))
+                self._host_limits[host] = sem
+            return sem
+
+    # ---- stages ----
+    def _fetch(self, url: str, out: "queue.Queue") -> None:
+        if self._cancelled():
+            self._update(url, status="cancelled")
+            return
+        previous = self.manifest.get(url) if self.manifest is not None else None
+        headers = {}
+        if previous is not None:
+            if previous.etag:
+                headers["If-None-Match"] = previous.etag
+            if previous.last_modified:
+                headers["If-Modified-Since"] = previous.last_modified
+        try:
+            with self._host_limit(url), METRICS.stage("fetch"):
+                logger.info(f"Fetching document from {url}")
+                # The URL only guesses the read timeout; the response's Content-Type decides how it is parsed
+                timeout = 60 if _detect_pdf(url) else 20
+                with self.session.get(url, timeout=timeout, headers=headers or None, stream=True) as response:
+                    status = response.status_code
+                    if status != 304:
+                        response.raise_for_status()
+                    content_type = response.headers.get("Content-Type")
+                    kind = content_kind(content_type, url) if status != 304 else "html"
+                    fetched = _Fetched(
+                        url=url,
+                        kind=kind,
+                        content_hash="",
+                        content_type=content_type,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                        previous=previous,
+                    )
+                    if kind == "pdf":
+                        pdf = save_pdf(response, self.settings.pdf_max_bytes)
+                        fetched.content_hash, fetched.path = pdf.content_hash, pdf.path or None
+                        nbytes = pdf.nbytes
+                    elif status != 304:
+                        fetched.content, truncated = read_body(response, self.settings.html_max_bytes)
+                        fetched.content_hash = hashlib.sha256(fetched.content).hexdigest()
+                        nbytes = len(fetched.content)
+                        if truncated:
+                            logger.warning(f"{url} is larger than {self.settings.html_max_bytes} bytes; truncated")
+                            METRICS.count("ingest_html_truncated")
+                    else:
+                        nbytes = 0
+            METRICS.count("ingest_fetched_bytes", nbytes)
+        except Exception as err:
+            self._fail(url, str(err))
+            return
+        if previous is not None and (status == 304 or fetched.content_hash == previous.content_hash):
+            logger.info(f"Unchanged since last ingest: {url}")
+            if fetched.path:
+                os.remove(fetched.path)
+            self._mark_unchanged(fetched)
+            return
+        self._update(url, stage="fetched", fetched_bytes=nbytes)
+        out.put(fetched)
+
+    def _make_part(
+        self, item: _Fetched, chunks: List[str], metas_extra: List[dict], start: int, seen: set, final: bool
+    ) -> _Document:
+        all_ids, all_metas = build_chunk_records(item.url, chunks, start)
+        ids: List[str] = []
+        metas: List[dict] = []
+        kept: List[str] = []
+        for chunk, cid, meta, extra in zip(chunks, all_ids, all_metas, metas_extra):
+            # The same chunk text twice in one document yields the same id; keep the first
+            if cid in seen:
+                continue
+            seen.add(cid)
+            meta.update(extra)
+            ids.append(cid)
+            metas.append(meta)
+            kept.append(chunk)
+        return _Document(
+            url=item.url,
+            collection=collection_for_url(item.url),
+            chunks=kept,
+            ids=ids,
+            metadatas=metas,
+            source=item,
+            final=final,
+        )
+
+    def _parse_pdf(self, item: _Fetched, out: "queue.Queue") -> int:
+        """Chunk a streamed PDF page by page, emitting a part every few pages."""
+        seen: set = set()
+        chunks: List[str] = []
+        extras: List[dict] = []
+        index = 0
+        pages_in_part = 0
+        every = max(1, self.settings.pdf_pages_per_task)
+        parse_ms = 0.0
+        text_bytes = 0
+        try:
+            pages = iter_pdf_pages(
+                item.path,  # type: ignore[arg-type]
+                max_pages=self.settings.pdf_max_pages,
+                workers=self.settings.pdf_workers,
+                pages_per_task=every,
+            )
+            while True:
+                # Time spent waiting on the extraction pool is the PDF parse stage
+                t0 = time.perf_counter()
+                with METRICS.stage("parse"):
+                    page = next(pages, None)
+                parse_ms += (time.perf_counter() - t0) * 1000.0
+                if page is None:
+                    break
+                page_no, page_text = page
+                text_bytes += len(page_text.encode("utf-8"))
+                with METRICS.stage("chunk"):
+                    page_chunks = chunk_text(page_text)
+                chunks.extend(page_chunks)
+                extras.extend({"page": page_no} for _ in page_chunks)
+                pages_in_part += 1
+                if self._cancelled():
+                    self._update(item.url, status="cancelled")
+                    return index
+                if pages_in_part >= every and chunks:
+                    out.put(self._make_part(item, chunks, extras, index, seen, final=False))
+                    index += len(chunks)
+                    self._update(item.url, stage="chunked", chunks=index)
+                    chunks, extras, pages_in_part = [], [], 0
+        finally:
+            if item.path:
+                os.remove(item.path)
+            METRICS.count("ingest_extracted_text_bytes", text_bytes)
+            self._update(item.url, parse_ms=round(parse_ms, 3), text_bytes=text_bytes)
+        total = index + len(chunks)
+        if total or item.previous is not None:
+            out.put(self._make_part(item, chunks, extras, index, seen, final=True))
+            self._update(item.url, stage="chunked", chunks=total)
+        return total
+
+    def _extract(self, item: _Fetched) -> str:
+        """Text of an HTML or plain-text body, recording parse time and extracted size for the URL."""
+        t0 = time.perf_counter()
+        if item.kind == "html":
+            with METRICS.stage("parse"):
+                extracted = extract_text(
+                    item.content,
+                    item.content_type,
+                    engine=self.settings.html_parser,
+                    strip_boilerplate=self.settings.html_strip_boilerplate,
+                )
+            text = extracted.text
+            METRICS.count("ingest_html_parsed", engine=extracted.engine)
+        else:
+            text = decode(item.content, item.content_type)
+        parse_ms = (time.perf_counter() - t0) * 1000.0
+        text_bytes = len(text.encode("utf-8"))
+        METRICS.count("ingest_extracted_text_bytes", text_bytes)
+        self._update(item.url, parse_ms=round(parse_ms, 3), text_bytes=text_bytes)
+        return text
+
+    def _parse_worker(self, inbox: "queue.Queue", out: "queue.Queue") -> None:
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                out.put(_DONE)
+                return
+            if self._cancelled():
+                if item.path:
+                    os.remove(item.path)
+                self._update(item.url, status="cancelled")
+                continue
+            try:
+                if item.kind == "pdf":
+                    total = self._parse_pdf(item, out)
+                else:
+                    text = self._extract(item)
+                    with METRICS.stage("chunk"):
+                        chunks = chunk_text(text, align="paragraph")
+                    total = len(chunks)
+                    if chunks or item.previous is not None:
+                        out.put(self._make_part(item, chunks, [{}] * len(chunks), 0, set(), final=True))
+                        self._update(item.url, stage="chunked", chunks=total)
+            except Exception as err:
+                self._fail(item.url, str(err))
+                continue
+            if not total and item.previous is None and not self._cancelled():
+                logger.warning(f"No text extracted from {item.url}")
+                self._update(item.url, status="empty", stage="done")
+
+    def _finish(self, d: _Document) -> None:
+        """Delete chunk ids that vanished from the document, then record the new state."""
+        all_ids, added = self._written.pop(d.url, ([], 0))
+        prev = d.source.previous
+        # Duplicates (from this run or an earlier one) stay in the manifest as references only
+        skipped = set(self.dedup.folded(d.collection, all_ids)) if self.dedup is not None else set()
+        current = set(all_ids)
+        stale = [cid for cid in (prev.chunk_ids if prev else []) if cid not in current]
+        if stale:
+            if self.dedup is not None:
+                # Chunks other URLs still have are kept and relabelled instead of deleted
+                delete, remaining = self.dedup.release(prev.collection, stale)  # type: ignore[union-attr]
+                self.store.set_source_urls(prev.collection, remaining)  # type: ignore[union-attr]
+                if self.manifest is not None:
+                    self.manifest.record_changes(prev.collection, list(remaining), deleted=False)  # type: ignore[union-attr]
+            else:
+                delete = stale
+            if delete:
+                self.store.delete_ids(prev.collection, delete)  # type: ignore[union-attr]
+                if self.manifest is not None:
+                    self.manifest.record_changes(prev.collection, delete, deleted=True)  # type: ignore[union-attr]
+        if self.manifest is not None:
+            self.manifest.put(ManifestEntry(
+                url=d.url,
+                collection=d.collection,
+                content_hash=d.source.content_hash,
+                chunk_ids=list(all_ids),
+                etag=d.source.etag,
+                last_modified=d.source.last_modified,
+            ))
+        self._update(
+            d.url,
+            status="ok",
+            stage="done",
+            chunks=len(all_ids),
+            ids=[cid for cid in all_ids if cid not in skipped],
+            duplicates_skipped=[cid for cid in all_ids if cid in skipped],
+            added=added,
+            unchanged=len(all_ids) - added - self._results[d.url].duplicates,
+            removed=len(stale),
+        )
+
+    def _flush(self, docs: List[_Document]) -> None:
+        if not docs:
+            return
+        # Only chunk ids the manifest has not seen for this URL need embedding
+        fresh: List[List[int]] = []
+        for d in docs:
+            known = set(d.source.previous.chunk_ids) if d.source.previous else set()
+            fresh.append([i for i, cid in enumerate(d.ids) if cid not in known])
+        fingerprints: Dict[str, int] = {}
+        duplicates: List[List[tuple]] = [[] for _ in docs]
+        if self.dedup is not None:
+            fresh, duplicates, fingerprints = self._deduplicate(docs, fresh)
+        texts = [d.chunks[i] for d, idx in zip(docs, fresh) for i in idx]
+        try:
+            t0 = time.perf_counter()
+            with METRICS.stage("embed"):
+                embeddings = self.store.encode_documents(texts) if texts else []
+            if texts:
+                per_chunk = (time.perf_counter() - t0) * 1000.0 / len(texts)
+                self._embed_ms_per_chunk = per_chunk if not self._embed_ms_per_chunk else (
+                    0.8 * self._embed_ms_per_chunk + 0.2 * per_chunk
+                )
+        except Exception as err:
+            for d in docs:
+                self._fail(d.url, f"embedding failed: {err}")
+            return
+        n_duplicates = sum(len(dups) for dups in duplicates)
+        if n_duplicates:
+            METRICS.count("dedup_embed_ms_saved", round(n_duplicates * self._embed_ms_per_chunk, 3))
+        for d, idx in zip(docs, fresh):
+            self._update(d.url, stage="embedded", embedded=self._results[d.url].embedded + len(idx))
+        offset = 0
+        by_collection: Dict[str, List[tuple]] = {}
+        for d, idx, dups in zip(docs, fresh, duplicates):
+            by_collection.setdefault(d.collection, []).append((d, idx, offset, dups))
+            offset += len(idx)
+        batch_size = max(1, self.settings.ingest_upsert_batch_size)
+        for collection, entries in by_collection.items():
+            texts_c: List[str] = []
+            ids_c: List[str] = []
+            metas_c: List[dict] = []
+            embs_c: List = []
+            for d, idx, start, _ in entries:
+                texts_c.extend(d.chunks[i] for i in idx)
+                ids_c.extend(d.ids[i] for i in idx)
+                metas_c.extend(d.metadatas[i] for i in idx)
+                embs_c.extend(embeddings[start:start + len(idx)])
+            try:
+                for i in range(0, len(ids_c), batch_size):
+                    with METRICS.stage("upsert"):
+                        self.store.upsert_embeddings(
+                            collection,
+                            texts_c[i:i + batch_size],
+                            ids_c[i:i + batch_size],
+                            metas_c[i:i + batch_size],
+                            embeddings=embs_c[i:i + batch_size],
+                        )
+                if self.dedup is not None:
+                    self._record_dedup(collection, entries, fingerprints)
+            except Exception as err:
+                for d, _, _, _ in entries:
+                    self._fail(d.url, f"upsert failed: {err}")
+                continue
+            for d, idx, _, dups in entries:
+                ids_so_far, added = self._written.get(d.url, ([], 0))
+                self._written[d.url] = (ids_so_far + d.ids, added + len(idx))
+                self._update(
+                    d.url,
+                    stage="upserted",
+                    upserted=self._results[d.url].upserted + len(idx),
+                    duplicates=self._results[d.url].duplicates + len(dups),
+                )
+                if not d.final or self._results[d.url].status == "failed":
+                    continue
+                try:
+                    self._finish(d)
+                except Exception as err:
+                    self._fail(d.url, f"cleanup failed: {err}")
+
+    def _deduplicate(self, docs: List[_Document], fresh: List[List[int]]) -> tuple:
+        """
+        Split each document's fresh chunks into those to embed and
+        (chunk id, canonical id) pairs for near-duplicates of a chunk stored
+        in the same collection or kept earlier in this batch.
+        """
+        assert self.dedup is not None
+        pending = PendingChunks(self.dedup)
+        fingerprints: Dict[str, int] = {}
+        # (collection, canonical id) -> still in the vector store
+        verified: Dict[tuple, bool] = {}
+        kept: List[List[int]] = []
+        duplicates: List[List[tuple]] = []
+        checked = 0
+        with METRICS.stage("dedup"):
+            for d, idx in zip(docs, fresh):
+                keep: List[int] = []
+                dups: List[tuple] = []
+                for i in idx:
+                    cid = d.ids[i]
+                    fp = simhash(d.chunks[i])
+                    checked += 1
+                    canonical = self.dedup.find(d.collection, fp)
+                    if canonical is not None and canonical != cid:
+                        key = (d.collection, canonical)
+                        if key not in verified:
+                            verified[key] = canonical in self.store.existing_ids(d.collection, [canonical])
+                            if not verified[key]:
+                                self.dedup.forget(d.collection, [canonical])
+                        if not verified[key]:
+                            canonical = None
+                    if canonical is None or canonical == cid:
+                        canonical = pending.find(d.collection, fp)
+                    if canonical is not None and canonical != cid:
+                        dups.append((cid, canonical))
+                        continue
+                    fingerprints[cid] = fp
+                    pending.add(d.collection, cid, fp)
+                    keep.append(i)
+                kept.append(keep)
+                duplicates.append(dups)
+        METRICS.count("dedup_chunks_checked", checked)
+        METRICS.count("dedup_duplicates", sum(len(dups) for dups in duplicates))
+        return kept, duplicates, fingerprints
+
+    def _record_dedup(self, collection: str, entries: List[tuple], fingerprints: Dict[str, int]) -> None:
+        """After a collection's upsert: index the stored chunks and point duplicates' URLs at them."""
+        assert self.dedup is not None
+        canonicals: List[tuple] = []
+        refs: List[tuple] = []
+        for d, idx, _, dups in entries:
+            for i in idx:
+                cid = d.ids[i]
+                canonicals.append((cid, fingerprints[cid]))
+                refs.append((cid, cid, d.url))
+            refs.extend((cid, canonical, d.url) for cid, canonical in dups)
+        self.dedup.add(collection, canonicals, refs)
+        shared = {canonical for _, _, _, dups in entries for _, canonical in dups}
+        if shared:
+            urls = self.dedup.urls(collection, shared)
+            self.store.set_source_urls(collection, {cid: u for cid, u in urls.items() if len(u) > 1})
+            if self.manifest is not None:
+                self.manifest.record_changes(collection, list(shared), deleted=False)
+
+    def run(self, urls: List[str]) -> List[UrlResult]:
+        urls = list(dict.fromkeys(urls))
+        self._results = {u: UrlResult(url=u) for u in urls}
+        if not urls:
+            return []
+        qsize = max(1, self.settings.ingest_queue_size)
+        fetched: "queue.Queue" = queue.Queue(maxsize=qsize)
+        documents: "queue.Queue" = queue.Queue(maxsize=qsize)
+        n_parsers = max(1, self.settings.ingest_parse_workers)
+        self._stop.clear()
+
+        parsers = [
+            threading.Thread(target=self._parse_worker, args=(fetched, documents), name=f"ingest-parse-{i}", daemon=True)
+            for i in range(n_parsers)
+        ]
+        for t in parsers:
+            t.start()
+
+        def _fetch_all() -> None:
+            with ThreadPoolExecutor(
+                max_workers=max(1, self.settings.ingest_fetch_workers), thread_name_prefix="ingest-fetch"
+            ) as pool:
+                for url in urls:
+                    pool.submit(self._fetch, url, fetched)
+            for _ in parsers:
+                fetched.put(_DONE)
+
+        feeder = threading.Thread(target=_fetch_all, name="ingest-fetch-feeder", daemon=True)
+        feeder.start()
+
+        target = max(1, self.settings.ingest_embed_batch_size)
+        pending: List[_Document] = []
+        pending_chunks = 0
+        finished = 0
+        try:
+            while finished < n_parsers:
+                item = documents.get()
+                if item is _DONE:
+                    finished += 1
+                    continue
+                if self._cancelled():
+                    # keep draining so the parse workers can exit
+                    self._update(item.url, status="cancelled")
+                    continue
+                pending.append(item)
+                pending_chunks += len(item.chunks)
+                if pending_chunks >= target:
+                    self._flush(pending)
+                    pending, pending_chunks = [], 0
+            if self._cancelled():
+                for d in pending:
+                    self._update(d.url, status="cancelled")
+            else:
+                self._flush(pending)
+        except BaseException:
+            # Stop the other stages and keep emptying their output until they exit,
+            # or fetch and parse threads stay blocked on the bounded queues
+            self._stop.set()
+            while feeder.is_alive() or any(t.is_alive() for t in parsers):
+                try:
+                    documents.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            raise
+        finally:
+            feeder.join()
+            for t in parsers:
+                t.join()
+            if self._owns_manifest and self.manifest is not None:
+                self.manifest.close()
+                self.manifest = None
+        return [self._results[u] for u in urls]
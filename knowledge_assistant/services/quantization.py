@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+MODES = ("none", "int8", "binary")
+
+# Per-dimension clip point for int8 calibration; ignores the most extreme outliers
+_INT8_PERCENTILE = 99.9
+_CALIBRATION_SAMPLE = 100_000
+_INT8_CAST_ROWS = 1024
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(x)
+else:  # numpy < 2.0
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return _POPCOUNT_TABLE[x]
+
+
+def _words(bits: np.ndarray) -> np.ndarray:
+    """View packed bits as uint64 words when the row length allows it (8x fewer popcounts)."""
+    if bits.shape[1] % 8 == 0:
+        return bits.view(np.uint64)
+    return bits
+
+
+@dataclass
+class Quantizer:
+    """
+    Compact codes for a first-pass scan, calibrated on a collection's own vectors.
+
+    int8: symmetric per-dimension scalar quantization; `scale[d]` is the
+    99.9th percentile of |x[d]| / 127. An approximate squared L2 distance
+    is ||x||^2 - 2 * codes @ (scale * q) + ||q||^2 with the exact stored norms.
+
+    binary: one sign bit per dimension after subtracting the per-dimension
+    mean, packed 8 per byte and compared by Hamming distance.
+    """
+
+    mode: str
+    scale: Optional[np.ndarray] = None
+    mean: Optional[np.ndarray] = None
+    calibrated_rows: int = 0
+
+    @classmethod
+    def calibrate(cls, mode: str, vectors: np.ndarray, seed: int = 0) -> "Quantizer":
+        if mode not in MODES or mode == "none":
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        x = np.asarray(vectors, dtype=np.float32)
+        if x.shape[0] > _CALIBRATION_SAMPLE:
+            rows = np.random.default_rng(seed).choice(x.shape[0], _CALIBRATION_SAMPLE, replace=False)
+            x = x[rows]
+        if mode == "int8":
+            clip = np.percentile(np.abs(x), _INT8_PERCENTILE, axis=0).astype(np.float32)
+            return cls(mode, scale=np.maximum(clip, 1e-12) / 127.0, calibrated_rows=int(vectors.shape[0]))
+        return cls(mode, mean=x.mean(axis=0).astype(np.float32), calibrated_rows=int(vectors.shape[0]))
+
+    def to_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "scale": self.scale.tolist() if self.scale is not None else None,
+            "mean": self.mean.tolist() if self.mean is not None else None,
+            "calibrated_rows": self.calibrated_rows,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Quantizer":
+        return cls(
+            mode=data["mode"],
+            scale=np.asarray(data["scale"], dtype=np.float32) if data.get("scale") is not None else None,
+            mean=np.asarray(data["mean"], dtype=np.float32) if data.get("mean") is not None else None,
+            calibrated_rows=int(data.get("calibrated_rows", 0)),
+        )
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        x = np.asarray(vectors, dtype=np.float32)
+        if self.mode == "int8":
+            return np.clip(np.rint(x / self.scale), -127, 127).astype(np.int8)
+        return np.packbits(x > self.mean, axis=1)
+
+    def prepare_queries(self, queries: np.ndarray) -> np.ndarray:
+        """Per-query operand for `approx_distances`: scaled floats or packed sign bits."""
+        if self.mode == "int8":
+            return (queries * self.scale).astype(np.float32)
+        return np.packbits(queries > self.mean, axis=1)
+
+    def approx_distances(
+        self, codes: np.ndarray, norms: np.ndarray, prepared: np.ndarray, query_norms: np.ndarray
+    ) -> np.ndarray:
+        """(rows, queries) ranking keys, smaller is closer."""
+        if self.mode == "int8":
+            # Upcast a few rows at a time so the float copy stays in cache; casting a
+            # whole block costs more than the matmul it feeds
+            dots = np.empty((codes.shape[0], prepared.shape[0]), dtype=np.float32)
+            for start in range(0, codes.shape[0], _INT8_CAST_ROWS):
+                end = start + _INT8_CAST_ROWS
+                dots[start:end] = codes[start:end].astype(np.float32) @ prepared.T
+            return norms[:, None] - 2.0 * dots + query_norms[None, :]
+        codes, prepared = _words(np.ascontiguousarray(codes)), _words(prepared)
+        # Hamming distance accumulated one word at a time; a (rows, queries, words)
+        # temporary reduced over its short last axis is several times slower
+        out = np.zeros((codes.shape[0], prepared.shape[0]), dtype=np.uint16)
+        for w in range(codes.shape[1]):
+            out += _popcount(codes[:, w, None] ^ prepared[None, :, w])
+        return out
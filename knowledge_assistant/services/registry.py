@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+
+from ..api.config import Settings
+from .batching import EmbeddingBatcher
+from .dedup import DedupIndex
+from .embed_cache import EmbeddingCache
+from .embed_server import EmbedClient
+from .flat_index import FlatIndex, FlatIndexStore, parse_quantization_overrides
+from .lexical import LexicalIndex
+from .metrics import METRICS
+from .routing import RoutingIndex
+
+if TYPE_CHECKING:
+    # Imported where first used: torch and chromadb take seconds to load and
+    # the liveness probe must not wait for them
+    import chromadb
+    from chromadb.api import Collection
+    from sentence_transformers import SentenceTransformer  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceRegistry:
+    """
+    Process-wide owner of the expensive resources: the SentenceTransformer
+    model, the Chroma PersistentClient and the collection handles.
+
+    One registry exists per (model name, chroma directory) pair for the
+    lifetime of the process; every EmbedStore/Retriever built on the same
+    settings shares it, so only the first caller pays for construction.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self._lock = threading.RLock()
+        self._model: SentenceTransformer | EmbedClient | None = None
+        self._local_model: SentenceTransformer | None = None
+        self._client: chromadb.Client | None = None
+        self._collections: Dict[str, Collection] = {}
+        self._batcher: EmbeddingBatcher | None = None
+        self._query_executor: ThreadPoolExecutor | None = None
+        self._lexical_executor: ThreadPoolExecutor | None = None
+        self._embed_cache: EmbeddingCache | None = None
+        self._flat_indexes: FlatIndexStore | None = None
+        self._lexical: LexicalIndex | None = None
+        self._routing: RoutingIndex | None = None
+        self._dedup: DedupIndex | None = None
+        self._collection_names: List[str] | None = None
+        self._collection_names_at = 0.0
+        self._write_listeners: List[Callable[[str], None]] = []
+        self._warm = False
+        self._warmup_thread: threading.Thread | None = None
+        self._warmup_error: str | None = None
+
+    @property
+    def model(self) -> SentenceTransformer | EmbedClient:
+        """
+        The embedding model, or with EMBED_SERVER_SOCKET set, a client of the
+        shared embedding server with the same `encode` interface.
+        """
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    if self.settings.embed_server_socket:
+                        self._model = EmbedClient(
+                            self.settings.embed_server_socket,
+                            self.settings.embed_model_name,
+                            fallback=self.local_model if self.settings.embed_server_fallback else None,
+                            batch_size=self.settings.embed_server_batch_size,
+                            timeout_s=self.settings.embed_server_timeout_s,
+                            retry_s=self.settings.embed_server_retry_s,
+                        )
+                    else:
+                        self._model = self.local_model()
+                model = self._model
+        return model
+
+    def local_model(self) -> SentenceTransformer:
+        """The in-process SentenceTransformer, loaded on first call."""
+        model = self._local_model
+        if model is None:
+            with self._lock:
+                if self._local_model is None:
+                    with METRICS.startup_step("import sentence_transformers"):
+                        from sentence_transformers import SentenceTransformer  # type: ignore
+                    logger.info(f"Loading embedding model {self.settings.embed_model_name}…")
+                    with METRICS.startup_step("load model"):
+                        self._local_model = SentenceTransformer(self.settings.embed_model_name)
+                model = self._local_model
+        return model
+
+    @property
+    def client(self) -> chromadb.Client:
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    with METRICS.startup_step("import chromadb"):
+                        import chromadb
+                        from chromadb.config import Settings as ChromaSettings
+                    logger.info(f"Initialising ChromaDB at {self.settings.chroma_directory}…")
+                    with METRICS.startup_step("open chroma client"):
+                        self._client = chromadb.PersistentClient(
+                            path=self.settings.chroma_directory,
+                            settings=ChromaSettings(anonymized_telemetry=False),
+                        )
+                client = self._client
+        return client
+
+    @property
+    def batcher(self) -> EmbeddingBatcher:
+        batcher = self._batcher
+        if batcher is None:
+            with self._lock:
+                if self._batcher is None:
+                    self._batcher = EmbeddingBatcher(
+                        lambda texts: self.model.encode(texts),  # type: ignore
+                        window_ms=self.settings.embed_batch_window_ms,
+                        max_batch_size=self.settings.embed_batch_max_size,
+                    )
+                batcher = self._batcher
+        return batcher
+
+    @property
+    def embed_cache(self) -> EmbeddingCache | None:
+        """On-disk document embedding cache, or None when disabled."""
+        if not self.settings.embed_cache_enabled:
+            return None
+        cache = self._embed_cache
+        if cache is None:
+            with self._lock:
+                if self._embed_cache is None:
+                    self._embed_cache = EmbeddingCache(
+                        os.path.join(self.settings.chroma_directory, "embed_cache"),
+                        model_name=self.settings.embed_model_name,
+                        capacity=self.settings.embed_cache_capacity,
+                        dtype=self.settings.embed_cache_dtype,
+                        dim_fn=lambda: self.model.get_sentence_embedding_dimension(),  # type: ignore
+                    )
+                cache = self._embed_cache
+        return cache
+
+    @property
+    def flat_indexes(self) -> FlatIndexStore | None:
+        """Memory-mapped exact-search indexes, or None unless VECTOR_BACKEND=flat."""
+        if self.settings.vector_backend != "flat":
+            return None
+        store = self._flat_indexes
+        if store is None:
+            with self._lock:
+                if self._flat_indexes is None:
+                    self._flat_indexes = FlatIndexStore(
+                        os.path.join(self.settings.chroma_directory, "flat_index"),
+                        dtype=self.settings.flat_index_dtype,
+                        max_segments=self.settings.flat_index_max_segments,
+                        compact_dead_ratio=self.settings.flat_index_compact_dead_ratio,
+                        quantization=self.settings.vector_quantization,
+                        quantization_overrides=parse_quantization_overrides(
+                            self.settings.vector_quantization_overrides
+                        ),
+                        rescore_factor=self.settings.vector_oversample_factor,
+                    )
+                store = self._flat_indexes
+        return store
+
+    def flat_index(self, name: str) -> FlatIndex:
+        """The flat index for a collection, built from Chroma the first time it is needed."""
+        store = self.flat_indexes
+        if store is None:
+            raise RuntimeError("The flat vector backend is not enabled")
+        index = store.get(name)
+        if not index.exists():
+            index.rebuild_from_chroma(self.get_collection(name))
+        return index
+
+    @property
+    def lexical(self) -> LexicalIndex | None:
+        """BM25 index over every collection, or None when LEXICAL_SEARCH is off."""
+        if not self.settings.lexical_search:
+            return None
+        index = self._lexical
+        if index is None:
+            with self._lock:
+                if self._lexical is None:
+                    self._lexical = LexicalIndex(
+                        os.path.join(self.settings.chroma_directory, "lexical.sqlite3"),
+                        compact_batches=self.settings.lexical_compact_batches,
+                        compact_dead_ratio=self.settings.lexical_compact_dead_ratio,
+                    )
+                index = self._lexical
+        return index
+
+    def lexical_index(self, name: str) -> LexicalIndex:
+        """The lexical index, with the collection indexed from Chroma the first time it is needed."""
+        index = self.lexical
+        if index is None:
+            raise RuntimeError("Lexical search is not enabled")
+        if not index.is_built(name):
+            index.rebuild_from_chroma(name, self.get_collection(name))
+        return index
+
+    @property
+    def routing(self) -> RoutingIndex | None:
+        """Per-collection representatives for domain-less queries, or None when COLLECTION_ROUTING is off."""
+        if not self.settings.collection_routing:
+            return None
+        index = self._routing
+        if index is None:
+            with self._lock:
+                if self._routing is None:
+                    self._routing = RoutingIndex(
+                        os.path.join(self.settings.chroma_directory, "routing.sqlite3"),
+                        representatives=self.settings.routing_representatives,
+                    )
+                index = self._routing
+        return index
+
+    def routing_index(self, name: str) -> RoutingIndex:
+        """The routing index, with the collection fitted from Chroma the first time it is needed."""
+        index = self.routing
+        if index is None:
+            raise RuntimeError("Collection routing is not enabled")
+        if not index.is_built(name):
+            index.rebuild_from_chroma(name, self.get_collection(name))
+        return index
+
+    @property
+    def dedup(self) -> DedupIndex | None:
+        """Near-duplicate chunk fingerprints used at ingest, or None when INGEST_DEDUP is off."""
+        if not self.settings.ingest_dedup:
+            return None
+        index = self._dedup
+        if index is None:
+            with self._lock:
+                if self._dedup is None:
+                    self._dedup = DedupIndex(
+                        os.path.join(self.settings.chroma_directory, "dedup.sqlite3"),
+                        max_distance=self.settings.dedup_max_distance,
+                    )
+                index = self._dedup
+        return index
+
+    @property
+    def query_executor(self) -> ThreadPoolExecutor:
+        """Bounded pool used to fan out per-collection Chroma queries."""
+        executor = self._query_executor
+        if executor is None:
+            with self._lock:
+                if self._query_executor is None:
+                    self._query_executor = ThreadPoolExecutor(
+                        max_workers=max(1, self.settings.retrieval_max_workers),
+                        thread_name_prefix="chroma-query",
+                    )
+                executor = self._query_executor
+        return executor
+
+    @property
+    def lexical_executor(self) -> ThreadPoolExecutor:
+        """Small pool for BM25 lookups, separate from `query_executor` so they never delay collection queries."""
+        executor = self._lexical_executor
+        if executor is None:
+            with self._lock:
+                if self._lexical_executor is None:
+                    self._lexical_executor = ThreadPoolExecutor(
+                        max_workers=max(1, self.settings.lexical_max_workers),
+                        thread_name_prefix="lexical-query",
+                    )
+                executor = self._lexical_executor
+        return executor
+
+    @property
+    def is_warm(self) -> bool:
+        return self._warm
+
+    def readiness(self) -> Dict[str, object]:
+        """What is loaded so far; never loads anything itself."""
+        return {
+            "model_loaded": self._local_model is not None,
+            "embed_server": isinstance(self._model, EmbedClient) and bool(self._model.stats()["connected"]),
+            "client_open": self._client is not None,
+            "warm": self._warm,
+            "warming": self._warmup_thread is not None and self._warmup_thread.is_alive(),
+            "warmup_error": self._warmup_error,
+        }
+
+    def batcher_stats(self) -> Dict[str, float]:
+        """Batcher stats, without creating the batcher (and loading the model) just to report them."""
+        return self._batcher.stats() if self._batcher is not None else {}
+
+    def embed_server_stats(self) -> Dict[str, float]:
+        return self._model.stats() if isinstance(self._model, EmbedClient) else {}
+
+    def embed_cache_stats(self) -> Dict[str, float]:
+        return self._embed_cache.stats() if self._embed_cache is not None else {}
+
+    def flat_index_stats(self) -> Dict[str, float]:
+        return self._flat_indexes.stats() if self._flat_indexes is not None else {}
+
+    def lexical_stats(self) -> Dict[str, float]:
+        return self._lexical.stats() if self._lexical is not None else {}
+
+    def dedup_stats(self) -> Dict[str, float]:
+        return self._dedup.stats() if self._dedup is not None else {}
+
+    def routing_stats(self) -> Dict[str, float]:
+        return self._routing.stats() if self._routing is not None else {}
+
+    def get_collection(self, name: str) -> Collection:
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        with self._lock:
+            if name not in self._collections:
+                try:
+                    collection = self.client.get_collection(name)
+                except Exception:
+                    collection = self.client.create_collection(name)
+                    self._collection_names = None
+                self._collections[name] = collection
+            return self._collections[name]
+
+    def list_collection_names(self) -> List[str]:
+        # chromadb<0.6 returns Collection objects, newer releases return names
+        return [getattr(c, "name", c) for c in self.client.list_collections()]
+
+    def collection_names(self) -> List[str]:
+        """
+        Cached collection list for the query path. It is refreshed after any
+        local write (see `notify_write`) and at least every
+        `collection_list_ttl_s` to pick up ingests from other processes.
+        """
+        names = self._collection_names
+        if names is None or time.monotonic() - self._collection_names_at > self.settings.collection_list_ttl_s:
+            names = self.list_collection_names()
+            with self._lock:
+                self._collection_names = names
+                self._collection_names_at = time.monotonic()
+        return list(names)
+
+    def add_write_listener(self, listener: Callable[[str], None]) -> None:
+        with self._lock:
+            self._write_listeners.append(listener)
+
+    def notify_write(self, collection_name: str) -> None:
+        """Called by EmbedStore after it writes to a collection."""
+        with self._lock:
+            if self._collection_names is not None and collection_name not in self._collection_names:
+                self._collection_names = None
+            listeners = list(self._write_listeners)
+        for listener in listeners:
+            try:
+                listener(collection_name)
+            except Exception:
+                logger.exception(f"Write listener failed for collection '{collection_name}'")
+
+    def warmup(self) -> None:
+        """Load the model, open the client and cache every collection handle."""
+        t0 = time.time()
+        model = self.model
+        if isinstance(model, EmbedClient):
+            with METRICS.startup_step("wait for embed server"):
+                # Give a server started alongside the API time to load its model before falling back
+                if not model.wait(self.settings.embed_server_timeout_s):
+                    logger.warning(f"Embedding server at {model.socket_path} did not answer during warmup")
+        with METRICS.startup_step("warmup encode"):
+            model.encode(["warmup"])  # type: ignore
+        names = self.list_collection_names()
+        with METRICS.startup_step("warmup collections"):
+            for name in names:
+                self.get_collection(name)
+                if self.flat_indexes is not None:
+                    # Also re-encodes indexes written under a different VECTOR_QUANTIZATION
+                    self.flat_index(name).ensure_codes()
+                if self.lexical is not None:
+                    self.lexical_index(name)
+                if self.routing is not None:
+                    self.routing_index(name)
+        self._warm = True
+        self._warmup_error = None
+        logger.info(f"Resource registry warm in {time.time() - t0:.2f}s")
+
+    def start_warmup(self) -> threading.Thread:
+        """Run `warmup` on a daemon thread; resources still load on first use if it fails."""
+        with self._lock:
+            if self._warmup_thread is not None and (self._warmup_thread.is_alive() or self._warm):
+                return self._warmup_thread
+
+            def run() -> None:
+                try:
+                    self.warmup()
+                except Exception as exc:
+                    self._warmup_error = str(exc)
+                    logger.exception("Warmup failed; resources will load on first use")
+
+            self._warmup_thread = threading.Thread(target=run, name="registry-warmup", daemon=True)
+            self._warmup_thread.start()
+            return self._warmup_thread
+
+
+_REGISTRIES: Dict[Tuple[str, str], ResourceRegistry] = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+
+def get_registry(settings: Settings | None = None) -> ResourceRegistry:
+    settings = settings or Settings()
+    key = (settings.embed_model_name, settings.chroma_directory)
+    registry = _REGISTRIES.get(key)
+    if registry is None:
+        with _REGISTRIES_LOCK:
+            registry = _REGISTRIES.get(key)
+            if registry is None:
+                registry = ResourceRegistry(settings)
+                _REGISTRIES[key] = registry
+    return registry
@@ -2,10 +2,19 @@ from __future__ import annotations
 
 import heapq
 import logging
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as FutureTimeout, wait
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
 
 from .embed_store import EmbedStore
+from .metrics import METRICS
 from ..api.config import Settings
 
 logger = logging.getLogger(__name__)
@@ -17,30 +26,327 @@ class RetrievedChunk:
     url: str
     distance: float
     meta: Dict
+    id: str = ""
+    # Candidate embedding for MMR; cleared before results are returned or cached
+    embedding: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+
+
+@dataclass
+class RetrievalResult:
+    chunks: List[RetrievedChunk]
+    encode_ms: float = 0.0
+    # Wall time of each collection's query, to spot slow shards
+    collection_timings_ms: Dict[str, float] = field(default_factory=dict)
+    timed_out: List[str] = field(default_factory=list)
+    # BM25 lookup time; 0 when lexical search is off
+    lexical_ms: float = 0.0
+    # Collections the routing index ruled out for a domain-less query
+    skipped_collections: List[str] = field(default_factory=list)
+    # "exact", "semantic" or None when the result was computed
+    cache: Optional[str] = None
+
+
+@dataclass
+class BatchQuery:
+    question: str
+    top_k: int = 4
+    collection_name: Optional[str] = None
+    oversample_factor: int = 6
+
+
+# (normalized question, top_k, domain, oversample, routed)
+CacheKey = Tuple[str, int, str, int, bool]
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question or "").strip().strip("?!. ").lower()
+
+
+def _estimate_bytes(chunks: List[RetrievedChunk]) -> int:
+    size = 0
+    for c in chunks:
+        size += 200 + len(c.text.encode("utf-8")) + len(c.url) + len(repr(c.meta))
+    return size
+
+
+@dataclass
+class _CacheEntry:
+    chunks: List[RetrievedChunk]
+    collections: Set[str]
+    expires_at: float
+    nbytes: int
+    embedding: Optional[np.ndarray] = None
+
+
+class RetrievalCache:
+    """
+    Bounded LRU + TTL cache of final retrieval results.
+
+    Entries are keyed by (normalized question, top_k, domain, oversample,
+    routed) and capped by an estimate of their size in bytes, so routed and
+    exhaustive searches never answer for each other. When `semantic_threshold`
+    is set, a miss falls back to the cached entry in the same
+    (top_k, domain, oversample, routed) scope whose query embedding has the highest
+    cosine similarity, if it reaches the threshold. Entries are dropped per
+    collection whenever that collection is written to; domain-less entries
+    are dropped on any write since they span every collection.
+    """
+
+    _ALL = "*"
+
+    def __init__(self, max_bytes: int, ttl_s: float, semantic_threshold: float = 0.0) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.semantic_threshold = semantic_threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, _CacheEntry]" = OrderedDict()
+        self._by_collection: Dict[str, Set[CacheKey]] = {}
+        self._bytes = 0
+        self._generation = 0
+        self._hits = 0
+        self._semantic_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def _drop(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.nbytes
+        for name in entry.collections:
+            keys = self._by_collection.get(name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_collection[name]
+
+    def get(self, key: CacheKey) -> Optional[List[RetrievedChunk]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return list(entry.chunks)
+
+    def get_similar(self, key: CacheKey, embedding: np.ndarray) -> Optional[List[RetrievedChunk]]:
+        if self.semantic_threshold <= 0:
+            return None
+        scope = key[1:]
+        q = embedding / (np.linalg.norm(embedding) or 1.0)
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_sim = None, self.semantic_threshold
+            for k, entry in self._entries.items():
+                if k[1:] != scope or entry.embedding is None or entry.expires_at < now:
+                    continue
+                sim = float(np.dot(entry.embedding, q))
+                if sim >= best_sim:
+                    best_key, best_sim = k, sim
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self._semantic_hits += 1
+            return list(self._entries[best_key].chunks)
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self._misses += 1
+
+    def put(
+        self,
+        key: CacheKey,
+        chunks: List[RetrievedChunk],
+        collections: List[str],
+        generation: int,
+        embedding: Optional[np.ndarray] = None,
+    ) -> None:
+        if self.max_bytes <= 0:
+            return
+        emb = None
+        if embedding is not None and self.semantic_threshold > 0:
+            emb = np.asarray(embedding, dtype=np.float32)
+            emb = emb / (np.linalg.norm(emb) or 1.0)
+        nbytes = _estimate_bytes(chunks) + (emb.nbytes if emb is not None else 0)
+        if nbytes > self.max_bytes:
+            return
+        names = set(collections) if key[2] != self._ALL else {self._ALL}
+        with self._lock:
+            # A write landed while this result was being computed: don't cache it
+            if generation != self._generation:
+                return
+            self._drop(key)
+            self._entries[key] = _CacheEntry(
+                chunks=list(chunks),
+                collections=names,
+                expires_at=time.monotonic() + self.ttl_s,
+                nbytes=nbytes,
+                embedding=emb,
+            )
+            self._bytes += nbytes
+            for name in names:
+                self._by_collection.setdefault(name, set()).add(key)
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def invalidate_collection(self, collection_name: str) -> None:
+        with self._lock:
+            self._generation += 1
+            keys = self._by_collection.get(collection_name, set()) | self._by_collection.get(self._ALL, set())
+            for key in list(keys):
+                self._drop(key)
+            self._invalidations += len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_collection.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self._hits + self._semantic_hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "semantic_hits": self._semantic_hits,
+                "misses": self._misses,
+                "hit_ratio": round((self._hits + self._semantic_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+_CACHES: Dict[Tuple[str, str], RetrievalCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_retrieval_cache(store: EmbedStore) -> RetrievalCache:
+    """One cache per registry, subscribed to that registry's collection writes."""
+    settings = store.settings
+    key = (settings.embed_model_name, settings.chroma_directory)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = RetrievalCache(
+                max_bytes=settings.retrieval_cache_max_bytes,
+                ttl_s=settings.retrieval_cache_ttl_s,
+                semantic_threshold=settings.retrieval_cache_semantic_threshold,
+            )
+            store.registry.add_write_listener(cache.invalidate_collection)
+            _CACHES[key] = cache
+    return cache
 
 
 def _mmr_lite_diversity(
-    candidates: List[RetrievedChunk], top_k: int
+    candidates: List[RetrievedChunk], top_k: int, ranked: bool = False
 ) -> List[RetrievedChunk]:
     """
-    Simple diversity filter by URL: prefer closest distances but avoid
-    returning many chunks from the same source_url.
+    Simple diversity filter by URL: prefer closest distances (or the given
+    order, if `ranked`) but avoid returning many chunks from the same source_url.
     """
-    seen_urls = set()
-    result: List[RetrievedChunk] = []
     # Sort by distance ascending (closer = better)
-    for c in sorted(candidates, key=lambda x: x.distance):
-        if len(result) >= top_k:
+    if not ranked:
+        candidates = sorted(candidates, key=lambda x: x.distance)
+    seen_urls = set()
+    picked: List[int] = []
+    for i, c in enumerate(candidates):
+        if len(picked) >= top_k:
             break
-        u = c.url
-        if u not in seen_urls:
-            seen_urls.add(u)
-            result.append(c)
+        if c.url not in seen_urls:
+            seen_urls.add(c.url)
+            picked.append(i)
     # If we still don't have enough, fill with next best regardless of URL
-    if len(result) < top_k:
-        pool = [c for c in sorted(candidates, key=lambda x: x.distance) if c not in result]
-        result.extend(pool[: max(0, top_k - len(result))])
-    return result
+    if len(picked) < top_k:
+        chosen = set(picked)
+        picked.extend([i for i in range(len(candidates)) if i not in chosen][: top_k - len(picked)])
+    return [candidates[i] for i in picked]
+
+
+def _mmr_diversity(
+    candidates: List[RetrievedChunk],
+    top_k: int,
+    query_embedding,
+    lambda_: float = 0.7,
+    max_per_url: int = 0,
+    relevance: Optional[np.ndarray] = None,
+) -> List[RetrievedChunk]:
+    """
+    Maximal Marginal Relevance: repeatedly pick the candidate maximising
+    lambda * sim(query, c) - (1 - lambda) * max sim(c, picked), with cosine
+    similarities. Each pick adds one matrix-vector product to a running max
+    instead of rescanning the selection, so only k of the n rows of the
+    pairwise matrix are ever computed. `max_per_url` caps chunks per source
+    URL while other candidates remain. `relevance` in [0, 1] replaces the
+    query cosine (e.g. fused rank scores). Falls back to the URL filter when
+    a candidate has no embedding.
+    """
+    if not candidates or top_k <= 0:
+        return []
+    if query_embedding is None or any(c.embedding is None for c in candidates):
+        return _mmr_lite_diversity(candidates, top_k, ranked=relevance is not None)
+    emb = np.asarray([c.embedding for c in candidates], dtype=np.float32)
+    emb /= np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+    if relevance is None:
+        q = np.asarray(query_embedding, dtype=np.float32).ravel()
+        relevance = emb @ (q / (np.linalg.norm(q) or 1.0))
+    n = len(candidates)
+    # Lowest possible cosine, so the first pick is the most relevant candidate
+    max_sim = np.full(n, -1.0, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    capped = np.zeros(n, dtype=bool)
+    by_url: Dict[str, List[int]] = {}
+    for i, c in enumerate(candidates):
+        by_url.setdefault(c.url, []).append(i)
+    per_url: Dict[str, int] = {}
+    picked: List[int] = []
+    for _ in range(min(top_k, n)):
+        eligible = available & ~capped
+        if not eligible.any():
+            # Every remaining candidate is over its URL cap: fill from them anyway
+            eligible = available
+        score = lambda_ * relevance - (1.0 - lambda_) * max_sim
+        score[~eligible] = -np.inf
+        i = int(np.argmax(score))
+        picked.append(i)
+        available[i] = False
+        np.maximum(max_sim, emb @ emb[i], out=max_sim)
+        if max_per_url > 0:
+            url = candidates[i].url
+            per_url[url] = per_url.get(url, 0) + 1
+            if per_url[url] >= max_per_url:
+                capped[by_url[url]] = True
+    return [candidates[i] for i in picked]
+
+
+def _reciprocal_rank_fusion(
+    rankings: Sequence[List[RetrievedChunk]], k: int = 60
+) -> Tuple[List[RetrievedChunk], np.ndarray]:
+    """
+    Merge ranked lists by chunk id with score(c) = sum 1 / (k + rank).
+    Returns the fused order and scores scaled to (0, 1], best first.
+    """
+    scores: Dict[str, float] = {}
+    chunks: Dict[str, RetrievedChunk] = {}
+    for ranking in rankings:
+        for rank, c in enumerate(ranking, start=1):
+            key = c.id or f"{c.url}\x00{c.text}"
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            chunks.setdefault(key, c)
+    order = sorted(scores, key=scores.__getitem__, reverse=True)
+    fused = np.asarray([scores[key] for key in order], dtype=np.float32)
+    return [chunks[key] for key in order], fused / (fused[0] if len(fused) else 1.0)
 
 
 class Retriever:
@@ -48,66 +354,468 @@ class Retriever:
     Wraps Chroma queries over one or more collections.
 
     If `collection_name` is provided, we query only that. Otherwise we
-    query *all* collections and merge results.
+    query the collections the routing index picks for the question (all
+    of them with routing off) in parallel and merge results. The question
+    is encoded once and the same embedding is sent to every collection. With
+    lexical search on, a BM25 lookup runs alongside and both rankings are
+    merged by reciprocal rank fusion before diversification.
     """
 
     def __init__(self, settings: Optional[Settings] = None) -> None:
         self.settings = settings or Settings()
         self.store = EmbedStore(self.settings)
+        self.cache = get_retrieval_cache(self.store)
+        # MMR needs the candidates' embeddings back from the vector store
+        self._with_embeddings = self.settings.diversity_mode == "mmr"
 
-    def _query_one(
-        self, collection_name: str, query: str, n_results: int
-    ) -> List[RetrievedChunk]:
+    def _query_collection(
+        self, collection_name: str, q_emb, n_results: int
+    ) -> Tuple[List[RetrievedChunk], float]:
+        per_query, ms = self._query_collection_many(collection_name, [q_emb], n_results)
+        return per_query[0], ms
+
+    def _query_collection_many(
+        self, collection_name: str, q_embs, n_results: int
+    ) -> Tuple[List[List[RetrievedChunk]], float]:
+        """One vector-store call for several query embeddings; a ranked list per query."""
+        t0 = time.perf_counter()
+        if self.store.registry.flat_indexes is not None:
+            return self._query_flat(collection_name, q_embs, n_results, t0)
         col = self.store._get_collection(collection_name)
-        # Compute query embedding using our SentenceTransformer and query by embedding
-        q_emb = self.store.model.encode([query])  # shape (1, d)
+        include = ["documents", "metadatas", "distances"]
+        if self._with_embeddings:
+            include.append("embeddings")
         res = col.query(
-            query_embeddings=q_emb,  # type: ignore[arg-type]
+            query_embeddings=[np.asarray(q, dtype=np.float32).ravel() for q in q_embs],  # type: ignore[arg-type]
             n_results=n_results,
-            include=["documents", "metadatas", "distances"],
+            include=include,  # type: ignore[arg-type]
         )
-        docs = res.get("documents", [[]])[0]
-        metas = res.get("metadatas", [[]])[0]
-        dists = res.get("distances", [[]])[0]
-        chunks: List[RetrievedChunk] = []
-        for doc, meta, dist in zip(docs, metas, dists):
-            url = (meta or {}).get("source_url", "")
-            chunks.append(RetrievedChunk(text=doc or "", url=url, distance=float(dist), meta=meta or {}))
+        # A list or, on newer chromadb, an array; don't test its truth value
+        all_embs = res.get("embeddings")
+        per_query: List[List[RetrievedChunk]] = []
+        for q in range(len(q_embs)):
+            ids = res.get("ids", [[]])[q]
+            docs = res.get("documents", [[]])[q]
+            metas = res.get("metadatas", [[]])[q]
+            dists = res.get("distances", [[]])[q]
+            embs = all_embs[q] if all_embs is not None else None
+            chunks: List[RetrievedChunk] = []
+            for i, (doc, meta, dist) in enumerate(zip(docs, metas, dists)):
+                url = (meta or {}).get("source_url", "")
+                chunks.append(
+                    RetrievedChunk(
+                        text=doc or "",
+                        url=url,
+                        distance=float(dist),
+                        meta=meta or {},
+                        id=ids[i] if i < len(ids) else "",
+                        embedding=np.asarray(embs[i], dtype=np.float32) if embs is not None else None,
+                    )
+                )
+            per_query.append(chunks)
+        ms = (time.perf_counter() - t0) * 1000.0
+        METRICS.observe("chroma_query", ms)
+        return per_query, ms
+
+    def _query_flat(
+        self, collection_name: str, q_embs, n_results: int, t0: float
+    ) -> Tuple[List[List[RetrievedChunk]], float]:
+        index = self.store.registry.flat_index(collection_name)
+        queries = np.asarray(q_embs, dtype=np.float32).reshape(len(q_embs), -1)
+        per_query = [
+            [
+                RetrievedChunk(
+                    text=h.document,
+                    url=h.metadata.get("source_url", ""),
+                    distance=h.distance,
+                    meta=h.metadata,
+                    id=h.id,
+                    embedding=h.embedding,
+                )
+                for h in hits
+            ]
+            for hits in index.search(queries, n_results, include_embeddings=self._with_embeddings)
+        ]
+        ms = (time.perf_counter() - t0) * 1000.0
+        METRICS.observe("flat_query", ms)
+        return per_query, ms
+
+    def _query_lexical(self, question: str, names: List[str], n_results: int) -> Tuple[List[RetrievedChunk], float]:
+        t0 = time.perf_counter()
+        registry = self.store.registry
+        for name in names:
+            registry.lexical_index(name)  # indexes collections that predate lexical search
+        hits = registry.lexical.search(names, question, n_results)  # type: ignore[union-attr]
+        ms = (time.perf_counter() - t0) * 1000.0
+        METRICS.observe("lexical_query", ms)
+        by_collection: Dict[str, List[str]] = {}
+        for h in hits:
+            by_collection.setdefault(h.collection, []).append(h.chunk_id)
+        rows: Dict[str, RetrievedChunk] = {}
+        for name, ids in by_collection.items():
+            res = self.store._get_collection(name).get(ids=ids, include=["documents", "metadatas", "embeddings"])
+            embs = res.get("embeddings")
+            for i, (cid, doc, meta) in enumerate(zip(res["ids"], res["documents"], res["metadatas"])):
+                rows[cid] = RetrievedChunk(
+                    text=doc or "",
+                    url=(meta or {}).get("source_url", ""),
+                    # Filled in against the query embedding once it is known
+                    distance=0.0,
+                    meta=meta or {},
+                    id=cid,
+                    embedding=np.asarray(embs[i], dtype=np.float32) if embs is not None else None,
+                )
+        # Hits whose chunk is gone from Chroma (deleted since) are dropped
+        return [rows[h.chunk_id] for h in hits if h.chunk_id in rows], ms
+
+    def _timeout(self, deadline: Optional[float]) -> float:
+        """RETRIEVAL_COLLECTION_TIMEOUT_S, cut short by the request's deadline (a time.monotonic() value)."""
+        timeout = self.settings.retrieval_collection_timeout_s
+        if deadline is not None:
+            timeout = max(0.0, min(timeout, deadline - time.monotonic()))
+        return timeout
+
+    @staticmethod
+    def _started(started: Dict[str, float], name: str, fn, *args):
+        """Run `fn(*args)` on a pool thread, recording when it was picked up."""
+        started[name] = time.monotonic()
+        return fn(*args)
+
+    def _wait_collections(
+        self, futures: Dict["Future", str], started: Dict[str, float], deadline: Optional[float] = None
+    ) -> Tuple[Set["Future"], Set["Future"]]:
+        """
+        Wait for per-collection futures submitted through `_started`. Each
+        gets RETRIEVAL_COLLECTION_TIMEOUT_S from when a worker picked it up,
+        not from submission, so collections queued behind a busy pool are
+        not charged for the wait. Ones never picked up are given up after
+        the timeout times the number of waves the pool needs to run them all;
+        everything stops at `deadline`. Returns (done, timed out).
+        """
+        per = self.settings.retrieval_collection_timeout_s
+        waves = math.ceil(len(futures) / max(1, self.settings.retrieval_max_workers))
+        cap = time.monotonic() + per * waves
+        if deadline is not None:
+            cap = min(cap, deadline)
+        done: Set[Future] = set()
+        timed_out: Set[Future] = set()
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            if now >= cap:
+                timed_out |= pending
+                break
+            # Re-check at least every `per` seconds, for tasks picked up while waiting
+            wake = min(cap, now + per)
+            for fut in list(pending):
+                t = started.get(futures[fut])
+                if t is None:
+                    continue
+                if now >= t + per:
+                    pending.discard(fut)
+                    timed_out.add(fut)
+                else:
+                    wake = min(wake, t + per)
+            if not pending:
+                break
+            finished, pending = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+            done |= finished
+        for fut in timed_out:
+            fut.cancel()
+        return done, timed_out
+
+    def _lexical_result(
+        self, future: "Future", q_emb, result: "RetrievalResult", deadline: Optional[float] = None
+    ) -> List[RetrievedChunk]:
+        timeout = self._timeout(deadline)
+        try:
+            chunks, ms = future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            result.timed_out.append("lexical")
+            logger.warning(f"Lexical search exceeded {timeout:.3f}s; skipped")
+            return []
+        except Exception as e:
+            logger.warning(f"Lexical search failed: {e}")
+            return []
+        result.lexical_ms = round(ms, 3)
+        q = np.asarray(q_emb, dtype=np.float32).ravel()
+        for c in chunks:
+            if c.embedding is not None:
+                diff = c.embedding - q
+                c.distance = float(diff @ diff)
         return chunks
 
-    def query(
-        self,
-        question: str,
-        top_k: int = 4,
-        collection_name: Optional[str] = None,
-        oversample_factor: int = 6,
+    def _fan_out(
+        self, names: List[str], q_emb, n_results: int, result: "RetrievalResult", deadline: Optional[float] = None
     ) -> List[RetrievedChunk]:
-        n_results = max(top_k * oversample_factor, top_k)
         candidates: List[RetrievedChunk] = []
-
-        if collection_name:
+        # With a deadline even a single collection goes through the pool, so the wait is bounded
+        if len(names) == 1 and deadline is None:
             try:
-                candidates.extend(self._query_one(collection_name, question, n_results))
+                chunks, ms = self._query_collection(names[0], q_emb, n_results)
+                candidates.extend(chunks)
+                result.collection_timings_ms[names[0]] = round(ms, 3)
             except Exception as e:
-                logger.warning(f"Query failed on collection '{collection_name}': {e}")
-        else:
-            # Query across all collections and merge
+                logger.warning(f"Query failed on collection '{names[0]}': {e}")
+            return candidates
+
+        executor = self.store.registry.query_executor
+        started: Dict[str, float] = {}
+        futures = {
+            executor.submit(self._started, started, name, self._query_collection, name, q_emb, n_results): name
+            for name in names
+        }
+        done, timed_out = self._wait_collections(futures, started, deadline)
+        for fut in timed_out:
+            name = futures[fut]
+            result.timed_out.append(name)
+            logger.warning(f"Collection '{name}' timed out; skipped")
+        for fut in done:
+            name = futures[fut]
             try:
-                cols = self.store.client.list_collections()
+                chunks, ms = fut.result()
             except Exception as e:
-                logger.error(f"Failed to list collections: {e}")
-                cols = []
-            for c in cols:
-                try:
-                    candidates.extend(self._query_one(c.name, question, n_results))
-                except Exception as e:
-                    logger.debug(f"Skipping collection {c.name}: {e}")
-
-        if not candidates:
+                logger.debug(f"Skipping collection {name}: {e}")
+                continue
+            candidates.extend(chunks)
+            result.collection_timings_ms[name] = round(ms, 3)
+        return candidates
+
+    def _diversify(
+        self, candidates: List[RetrievedChunk], top_k: int, q_emb, relevance: Optional[np.ndarray] = None
+    ) -> List[RetrievedChunk]:
+        """`relevance` (fused scores) means `candidates` are already ranked best first."""
+        if self.settings.diversity_mode == "mmr":
+            chunks = _mmr_diversity(
+                candidates, top_k, q_emb, self.settings.mmr_lambda, self.settings.mmr_max_per_url, relevance
+            )
+        else:
+            chunks = _mmr_lite_diversity(candidates, top_k=top_k, ranked=relevance is not None)
+        for c in chunks:
+            c.embedding = None
+        return chunks
+
+    def _cache_key(
+        self, question: str, top_k: int, collection_name: Optional[str], oversample_factor: int, route: bool = True
+    ) -> CacheKey:
+        # Routing only narrows domain-less searches, and only when it is on
+        routed = route and not collection_name and self.settings.collection_routing
+        return (normalize_question(question), top_k, collection_name or RetrievalCache._ALL, oversample_factor, routed)
+
+    def _collection_names(self, collection_name: Optional[str]) -> List[str]:
+        if collection_name:
+            return [collection_name]
+        try:
+            return self.store.registry.collection_names()
+        except Exception as e:
+            logger.error(f"Failed to list collections: {e}")
             return []
 
-        # Keep the global top (by distance) then apply URL diversity
+    def _submit_lexical(self, question: str, names: List[str], n_results: int) -> Optional["Future"]:
+        # BM25 needs no embedding, so callers start it before encoding the question; it runs
+        # on its own pool so a batch's lookups do not hold up the collection queries behind them
+        if self.store.registry.lexical is None:
+            return None
+        return self.store.registry.lexical_executor.submit(self._query_lexical, question, names, n_results)
+
+    def _route(self, names: List[str], q_emb, result: RetrievalResult) -> List[str]:
+        """The collections worth a vector search; BM25 still covers all of `names`."""
+        registry = self.store.registry
+        if registry.routing is None or len(names) <= self.settings.routing_top_m:
+            return names
+        try:
+            for name in names:
+                registry.routing_index(name)  # fits collections that predate routing
+            routed = registry.routing.route(q_emb, names, self.settings.routing_top_m, self.settings.routing_margin)
+        except Exception as e:
+            logger.warning(f"Collection routing failed; searching every collection: {e}")
+            return names
+        kept = set(routed)
+        result.skipped_collections = [name for name in names if name not in kept]
+        METRICS.count("routing_skipped_collections", len(result.skipped_collections))
+        return routed
+
+    def _finish(
+        self,
+        result: RetrievalResult,
+        candidates: List[RetrievedChunk],
+        lexical_future: Optional["Future"],
+        q_emb,
+        top_k: int,
+        n_results: int,
+        cache_key: CacheKey,
+        names: List[str],
+        generation: int,
+        deadline: Optional[float] = None,
+    ) -> RetrievalResult:
+        # Keep the global top (by distance) then apply diversity
         # Use a heap to pick top-N quickly if very large
         best = heapq.nsmallest(min(len(candidates), n_results), candidates, key=lambda x: x.distance)
-        diverse = _mmr_lite_diversity(best, top_k=top_k)
-        return diverse
\ No newline at end of file
+        relevance = None
+        if lexical_future is not None:
+            lexical = self._lexical_result(lexical_future, q_emb, result, deadline)
+            if lexical:
+                best, relevance = _reciprocal_rank_fusion([best, lexical], self.settings.rrf_k)
+                best, relevance = best[:n_results], relevance[:n_results]
+        if not best:
+            return result
+        with METRICS.stage("diversity"):
+            result.chunks = self._diversify(best, top_k, q_emb, relevance)
+        if not result.timed_out:
+            self.cache.put(cache_key, result.chunks, names, generation, embedding=q_emb)
+        return result
+
+    def query_detailed(
+        self,
+        question: str,
+        top_k: int = 4,
+        collection_name: Optional[str] = None,
+        oversample_factor: int = 6,
+        route: bool = True,
+        deadline: Optional[float] = None,
+    ) -> RetrievalResult:
+        """
+        `route=False` searches every collection even when routing is on (for
+        evaluating it). Collections (and BM25) still running at `deadline`, a
+        time.monotonic() value, are skipped like ones that time out.
+        """
+        n_results = max(top_k * oversample_factor, top_k)
+        result = RetrievalResult(chunks=[])
+        cache_key = self._cache_key(question, top_k, collection_name, oversample_factor, route)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            result.chunks, result.cache = cached, "exact"
+            return result
+        generation = self.cache.generation
+
+        names = self._collection_names(collection_name)
+        if not names:
+            return result
+        # BM25 overlaps the encode unless a semantic cache hit could make it wasted work
+        semantic = self.cache.semantic_threshold > 0
+        lexical_future = None if semantic else self._submit_lexical(question, names, n_results)
+
+        t0 = time.perf_counter()
+        q_emb = self.store.encode_query(question)
+        result.encode_ms = round((time.perf_counter() - t0) * 1000.0, 3)
+        METRICS.observe("query_encode", result.encode_ms)
+
+        similar = self.cache.get_similar(cache_key, np.asarray(q_emb))
+        if similar is not None:
+            result.chunks, result.cache = similar, "semantic"
+            return result
+        self.cache.record_miss()
+        if semantic:
+            lexical_future = self._submit_lexical(question, names, n_results)
+
+        searched = self._route(names, q_emb, result) if route else names
+        candidates = self._fan_out(searched, q_emb, n_results, result, deadline)
+        return self._finish(
+            result, candidates, lexical_future, q_emb, top_k, n_results, cache_key, names, generation, deadline
+        )
+
+    def query_batch(
+        self, queries: Sequence[BatchQuery], chunk_size: int = 64, deadline: Optional[float] = None
+    ) -> Iterator[RetrievalResult]:
+        """
+        Results for `queries`, in order, computed `chunk_size` questions at a
+        time: each chunk is encoded with one model call and every collection
+        gets one multi-vector query for all the chunk's questions that search
+        it. Lazy, so a caller streaming the results holds one chunk at a time.
+        """
+        for start in range(0, len(queries), max(1, chunk_size)):
+            yield from self._query_chunk(queries[start:start + max(1, chunk_size)], deadline)
+
+    def _query_chunk(self, queries: Sequence[BatchQuery], deadline: Optional[float] = None) -> List[RetrievalResult]:
+        results = [RetrievalResult(chunks=[]) for _ in queries]
+        generation = self.cache.generation
+        # (position, cache key, collections, n_results, lexical future) of the questions still to compute
+        todo: List[Tuple[int, CacheKey, List[str], int, Optional[Future]]] = []
+        for i, q in enumerate(queries):
+            key = self._cache_key(q.question, q.top_k, q.collection_name, q.oversample_factor)
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[i].chunks, results[i].cache = cached, "exact"
+                continue
+            names = self._collection_names(q.collection_name)
+            if not names:
+                continue
+            n_results = max(q.top_k * q.oversample_factor, q.top_k)
+            todo.append((i, key, names, n_results, None))
+        if not todo:
+            return results
+        # As in query_detailed: start BM25 before encoding unless the semantic tier may answer
+        semantic = self.cache.semantic_threshold > 0
+        if not semantic:
+            todo = [
+                (i, key, names, n, self._submit_lexical(queries[i].question, names, n)) for i, key, names, n, _ in todo
+            ]
+
+        t0 = time.perf_counter()
+        embs = np.asarray(self.store.encode_queries([queries[i].question for i, *_ in todo]), dtype=np.float32)
+        encode_ms = round((time.perf_counter() - t0) * 1000.0, 3)
+        METRICS.observe("query_encode_batch", encode_ms)
+
+        computed: List[int] = []
+        for j, (i, key, _, _, _) in enumerate(todo):
+            results[i].encode_ms = encode_ms
+            similar = self.cache.get_similar(key, embs[j])
+            if similar is not None:
+                results[i].chunks, results[i].cache = similar, "semantic"
+                continue
+            self.cache.record_miss()
+            computed.append(j)
+            if semantic:
+                i, key, names, n_results, _ = todo[j]
+                todo[j] = (i, key, names, n_results, self._submit_lexical(queries[i].question, names, n_results))
+
+        by_collection: Dict[str, List[int]] = {}
+        for j in computed:
+            for name in self._route(todo[j][2], embs[j], results[todo[j][0]]):
+                by_collection.setdefault(name, []).append(j)
+        candidates: Dict[int, List[RetrievedChunk]] = {j: [] for j in computed}
+        executor = self.store.registry.query_executor
+        started: Dict[str, float] = {}
+        futures = {
+            executor.submit(
+                self._started, started, name,
+                self._query_collection_many, name, embs[members], max(todo[j][3] for j in members),
+            ): name
+            for name, members in by_collection.items()
+        }
+        done, timed_out = self._wait_collections(futures, started, deadline)
+        for fut in timed_out:
+            name = futures[fut]
+            for j in by_collection[name]:
+                results[todo[j][0]].timed_out.append(name)
+            logger.warning(f"Collection '{name}' timed out; skipped")
+        for fut in done:
+            name = futures[fut]
+            try:
+                per_query, ms = fut.result()
+            except Exception as e:
+                logger.warning(f"Query failed on collection '{name}': {e}")
+                continue
+            for j, chunks in zip(by_collection[name], per_query):
+                # Every question shared the largest n_results; trim back to its own
+                candidates[j].extend(chunks[: todo[j][3]])
+                results[todo[j][0]].collection_timings_ms[name] = round(ms, 3)
+
+        for j in computed:
+            i, key, names, n_results, lexical_future = todo[j]
+            self._finish(
+                results[i], candidates[j], lexical_future, embs[j], queries[i].top_k, n_results, key, names, generation,
+                deadline,
+            )
+        return results
+
+    def query(
+        self,
+        question: str,
+        top_k: int = 4,
+        collection_name: Optional[str] = None,
+        oversample_factor: int = 6,
+        deadline: Optional[float] = None,
+    ) -> List[RetrievedChunk]:
+        return self.query_detailed(question, top_k, collection_name, oversample_factor, deadline=deadline).chunks
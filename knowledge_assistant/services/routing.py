@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS routing_reps (
+    collection TEXT NOT NULL,
+    rep INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (collection, rep)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS routing_collections (
+    collection TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Vectors used to fit representatives when rebuilding a collection from Chroma
+_REBUILD_SAMPLE = 50_000
+_KMEANS_ITERS = 10
+
+
+def _sq_distances(x: np.ndarray, reps: np.ndarray) -> np.ndarray:
+    """(len(x), len(reps)) squared L2 distances."""
+    return (
+        np.einsum("ij,ij->i", x, x)[:, None]
+        - 2.0 * (x @ reps.T)
+        + np.einsum("ij,ij->i", reps, reps)[None, :]
+    )
+
+
+def _seed(reps: np.ndarray, counts: np.ndarray, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Add representatives from `x` by farthest-point selection until there are `k` (or `x` is exhausted)."""
+    picked = list(reps)
+    if not picked:
+        picked.append(x[0])
+    nearest = _sq_distances(x, np.asarray(picked, dtype=np.float32)).min(axis=1)
+    while len(picked) < k and nearest.max() > 1e-12:
+        i = int(np.argmax(nearest))
+        picked.append(x[i])
+        nearest = np.minimum(nearest, _sq_distances(x, x[i : i + 1])[:, 0])
+    new = len(picked) - len(reps)
+    # New representatives start empty; the assignment step that follows fills them
+    return np.asarray(picked, dtype=np.float32), np.concatenate((counts, np.zeros(new, dtype=np.int64)))
+
+
+def update_representatives(
+    reps: np.ndarray, counts: np.ndarray, x: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Online k-means (MacQueen): seed up to `k` representatives by farthest
+    point, then fold each new vector into its nearest representative as a
+    running mean. Cost is one (batch x k) distance matrix per write.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    if not len(x):
+        return reps, counts
+    if len(reps) < k:
+        reps, counts = _seed(reps, counts, x, k)
+    reps = reps.copy()
+    counts = counts.copy()
+    assign = np.argmin(_sq_distances(x, reps), axis=1)
+    for r in np.unique(assign):
+        members = x[assign == r]
+        total = counts[r] + len(members)
+        reps[r] += (members.sum(axis=0) - len(members) * reps[r]) / total
+        counts[r] = total
+    return reps, counts
+
+
+def kmeans(x: np.ndarray, k: int, iters: int = _KMEANS_ITERS) -> Tuple[np.ndarray, np.ndarray]:
+    """Lloyd's k-means with farthest-point seeding; returns (centres, sizes)."""
+    x = np.asarray(x, dtype=np.float32)
+    reps, _ = _seed(np.zeros((0, x.shape[1]), dtype=np.float32), np.zeros(0, dtype=np.int64), x, k)
+    for _ in range(iters):
+        assign = np.argmin(_sq_distances(x, reps), axis=1)
+        sizes = np.bincount(assign, minlength=len(reps))
+        sums = np.zeros_like(reps)
+        np.add.at(sums, assign, x)
+        filled = sizes > 0
+        moved = sums[filled] / sizes[filled, None]
+        if np.allclose(moved, reps[filled]):
+            break
+        reps[filled] = moved
+    assign = np.argmin(_sq_distances(x, reps), axis=1)
+    sizes = np.bincount(assign, minlength=len(reps))
+    return reps[sizes > 0], sizes[sizes > 0].astype(np.int64)
+
+
+class RoutingIndex:
+    """
+    A few k-means representatives per collection, used to send a
+    domain-less query only to the collections likely to hold its nearest
+    chunks.
+
+    Each upsert folds its embeddings into the collection's representatives
+    (online k-means), so the index costs one small matrix product per
+    write. Deletes are not subtracted: representatives describe what a
+    collection has held, which only errs towards searching it. Rebuild
+    from Chroma to refit from scratch.
+
+    A collection's score for a query is the best cosine similarity
+    between the query and its representatives. `route` keeps the `top_m`
+    best collections plus any within `margin` of the m-th score, and
+    always keeps collections it knows nothing about.
+    """
+
+    def __init__(self, path: str, representatives: int = 4) -> None:
+        self.path = path
+        self.representatives = max(1, representatives)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+        self._version: Optional[int] = None
+        # collection -> unit-normalised representatives, reloaded when another connection commits
+        self._unit: Dict[str, np.ndarray] = {}
+        self._built: Set[str] = set()
+
+    # ---- collections ----
+    def is_built(self, collection: str) -> bool:
+        if collection in self._built:
+            return True
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM routing_collections WHERE collection = ?", (collection,)
+            ).fetchone()
+        if row:
+            self._built.add(collection)
+        return bool(row)
+
+    def rebuild_from_chroma(self, collection_name: str, collection, page_size: int = 5000) -> int:
+        """Fit the collection's representatives by k-means over (a sample of) its stored embeddings."""
+        pages: List[np.ndarray] = []
+        total = 0
+        offset = 0
+        while True:
+            res = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+            ids = res.get("ids") or []
+            if not ids:
+                break
+            total += len(ids)
+            offset += len(ids)
+            if sum(len(p) for p in pages) < _REBUILD_SAMPLE:
+                pages.append(np.asarray(res["embeddings"], dtype=np.float32))
+        with self._lock:
+            self._drop_collection(collection_name)
+            if pages:
+                reps, sizes = kmeans(np.concatenate(pages)[:_REBUILD_SAMPLE], self.representatives)
+                # Scale sample cluster sizes to the whole collection so later online updates weigh in correctly
+                counts = np.maximum(1, np.rint(sizes * (total / sizes.sum()))).astype(np.int64)
+                self._write(collection_name, reps, counts)
+            self._conn.execute(
+                "INSERT INTO routing_collections (collection, rows) VALUES (?, ?)", (collection_name, total)
+            )
+            self._conn.commit()
+        self._built.add(collection_name)
+        logger.info(f"Rebuilt routing index for '{collection_name}': {total} vectors")
+        return total
+
+    def _drop_collection(self, collection: str) -> None:
+        self._conn.execute("DELETE FROM routing_reps WHERE collection = ?", (collection,))
+        self._conn.execute("DELETE FROM routing_collections WHERE collection = ?", (collection,))
+
+    def _load(self, conn: sqlite3.Connection, collection: str) -> Tuple[np.ndarray, np.ndarray]:
+        rows = conn.execute(
+            "SELECT count, vector FROM routing_reps WHERE collection = ? ORDER BY rep", (collection,)
+        ).fetchall()
+        if not rows:
+            return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int64)
+        counts = np.asarray([r[0] for r in rows], dtype=np.int64)
+        return np.stack([np.frombuffer(r[1], dtype=np.float32) for r in rows]), counts
+
+    def _write(self, collection: str, reps: np.ndarray, counts: np.ndarray) -> None:
+        self._conn.execute("DELETE FROM routing_reps WHERE collection = ?", (collection,))
+        self._conn.executemany(
+            "INSERT INTO routing_reps (collection, rep, count, vector) VALUES (?, ?, ?, ?)",
+            (
+                (collection, i, int(c), np.ascontiguousarray(v, dtype=np.float32).tobytes())
+                for i, (v, c) in enumerate(zip(reps, counts))
+            ),
+        )
+
+    # ---- writes ----
+    def add(self, collection: str, embeddings) -> None:
+        x = np.asarray(embeddings, dtype=np.float32)
+        if not len(x):
+            return
+        with self._lock:
+            reps, counts = self._load(self._conn, collection)
+            if not len(reps):
+                reps = np.zeros((0, x.shape[1]), dtype=np.float32)
+            reps, counts = update_representatives(reps, counts, x, self.representatives)
+            self._write(collection, reps, counts)
+            self._conn.execute(
+                "INSERT INTO routing_collections (collection, rows) VALUES (?, ?) "
+                "ON CONFLICT(collection) DO UPDATE SET rows = rows + excluded.rows",
+                (collection, len(x)),
+            )
+            self._conn.commit()
+
+    # ---- reads ----
+    def _refresh(self) -> None:
+        """Reload representatives if anything was committed since. Holds the read lock."""
+        version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version:
+            return
+        grouped: Dict[str, List[np.ndarray]] = {}
+        for collection, vector in self._reader.execute(
+            "SELECT collection, vector FROM routing_reps ORDER BY collection, rep"
+        ):
+            grouped.setdefault(collection, []).append(np.frombuffer(vector, dtype=np.float32))
+        unit: Dict[str, np.ndarray] = {}
+        for collection, vectors in grouped.items():
+            reps = np.stack(vectors)
+            unit[collection] = reps / np.maximum(np.linalg.norm(reps, axis=1, keepdims=True), 1e-12)
+        self._unit = unit
+        self._version = version
+
+    def scores(self, query_embedding, collections: Sequence[str]) -> Dict[str, float]:
+        """Best cosine similarity per known collection; unknown collections are left out."""
+        q = np.asarray(query_embedding, dtype=np.float32).ravel()
+        q = q / (np.linalg.norm(q) or 1.0)
+        with self._read_lock:
+            self._refresh()
+            unit = self._unit
+        return {name: float((unit[name] @ q).max()) for name in collections if name in unit}
+
+    def route(self, query_embedding, collections: Sequence[str], top_m: int, margin: float = 0.0) -> List[str]:
+        """Collections worth searching for this query, best first, then the unknown ones."""
+        if top_m <= 0 or len(collections) <= top_m:
+            return list(collections)
+        scores = self.scores(query_embedding, collections)
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+        unknown = [name for name in collections if name not in scores]
+        if len(ranked) <= top_m:
+            return ranked + unknown
+        cutoff = scores[ranked[top_m - 1]] - margin
+        return [name for name in ranked if scores[name] >= cutoff] + unknown
+
+    def stats(self) -> Dict[str, float]:
+        with self._read_lock:
+            self._refresh()
+            return {
+                "collections": len(self._unit),
+                "representatives": sum(len(r) for r in self._unit.values()),
+            }
+
+    def close(self) -> None:
+        with self._lock, self._read_lock:
+            self._conn.close()
+            self._reader.close()
+
+
+def main() -> None:
+    import argparse
+
+    from ..api.config import Settings
+    from .registry import get_registry
+
+    parser = argparse.ArgumentParser(description="Rebuild the collection routing index from Chroma")
+    parser.add_argument("collections", nargs="*", help="collections to rebuild (default: all)")
+    args = parser.parse_args()
+    registry = get_registry(Settings())
+    index = registry.routing
+    if index is None:
+        parser.error("set COLLECTION_ROUTING=true to use the routing index")
+    for name in args.collections or registry.list_collection_names():
+        print(f"{name}: {index.rebuild_from_chroma(name, registry.get_collection(name))} vectors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, Optional, TypeVar
+
+from ..api.config import Settings
+from .metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Weight of the newest sample in the service-time average used to estimate waits
+_EMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """
+    Work refused or abandoned by a work class. `status_code` is 429 when
+    the class's wait queue is full and 503 when the request's deadline
+    cannot be (or was not) met; `retry_after_s` is the estimated time for
+    the queue to drain.
+    """
+
+    def __init__(self, work_class: str, reason: str, status_code: int, retry_after_s: float) -> None:
+        super().__init__(f"{work_class} work {reason}; retry later")
+        self.work_class = work_class
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after_s = retry_after_s
+
+    @property
+    def retry_after(self) -> str:
+        """Whole seconds, for the Retry-After header."""
+        return str(max(1, math.ceil(self.retry_after_s)))
+
+
+class WorkClass:
+    """
+    A dedicated, size-limited thread pool for one kind of blocking work,
+    with admission control in front of it.
+
+    At most `workers` tasks hold a slot (and a thread) at a time; up to
+    `max_queue` more wait for one in FIFO order. A request is refused up
+    front when the queue is full (429), or when the average service time
+    says its turn would come after its deadline (503). One that is still
+    queued, or still running, when its deadline passes gets a 503 too; a
+    running thread cannot be interrupted, so it keeps its slot until it
+    returns, and callees are given the deadline to stop early themselves.
+
+    Slots are handed out on the event loop, so every coroutine method must
+    be awaited from the loop that serves the requests.
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int, deadline_s: float) -> None:
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.deadline_s = deadline_s
+        self._executor: ThreadPoolExecutor | None = None
+        self._free = self.workers
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._lock = threading.Lock()
+        self._service_s = 0.0
+        self._completed = 0
+        self._rejected_full = 0
+        self._rejected_deadline = 0
+        self._expired = 0
+
+    # ---- admission ----
+    def deadline(self, started: Optional[float] = None) -> float:
+        """The time.monotonic() by which work of this class arriving at `started` (default now) must finish."""
+        return (time.monotonic() if started is None else started) + self.deadline_s
+
+    def _estimated_wait_s(self, ahead: int) -> float:
+        return ahead * self._service_s / self.workers
+
+    def _reject(self, reason: str, status_code: int, ahead: int) -> Overloaded:
+        with self._lock:
+            if status_code == 429:
+                self._rejected_full += 1
+            else:
+                self._rejected_deadline += 1
+        METRICS.count("scheduler_rejected", work_class=self.name, reason=reason)
+        # A full drain is the earliest a retry can expect to be let in
+        retry = max(self._estimated_wait_s(ahead + 1), self._service_s)
+        return Overloaded(self.name, reason, status_code, retry)
+
+    def check(self, deadline: Optional[float] = None) -> None:
+        """Raise Overloaded if work arriving now would be refused; reserves nothing."""
+        if self._free and not self._waiters:
+            return
+        ahead = len(self._waiters)
+        if ahead >= self.max_queue:
+            raise self._reject("queue_full", 429, ahead)
+        remaining = (deadline if deadline is not None else self.deadline()) - time.monotonic()
+        if self._estimated_wait_s(ahead + 1) + self._service_s > remaining:
+            raise self._reject("deadline", 503, ahead)
+
+    async def _acquire(self, deadline: Optional[float], admitted: bool) -> None:
+        if not admitted and deadline is not None and deadline <= time.monotonic():
+            raise self._reject("deadline", 503, len(self._waiters))
+        if self._free and not self._waiters:
+            self._free -= 1
+            return
+        if not admitted:
+            self.check(deadline)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        t0 = time.perf_counter()
+        timeout = None if admitted or deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Handed a slot just as the deadline passed
+                self._release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            with self._lock:
+                self._expired += 1
+            METRICS.count("scheduler_deadline_exceeded", work_class=self.name, state="queued")
+            raise Overloaded(self.name, "deadline expired in queue", 503, self._estimated_wait_s(len(self._waiters)))
+        except BaseException:
+            # Cancelled while queued (e.g. the client went away)
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+        finally:
+            METRICS.observe(f"scheduler {self.name} queue_wait", (time.perf_counter() - t0) * 1000.0)
+
+    def _release(self, service_s: Optional[float] = None) -> None:
+        if service_s is not None:
+            with self._lock:
+                self._completed += 1
+                self._service_s = (
+                    service_s if self._completed == 1 else (1 - _EMA_ALPHA) * self._service_s + _EMA_ALPHA * service_s
+                )
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes straight to the next waiter
+                waiter.set_result(None)
+                return
+        self._free += 1
+
+    # ---- running work ----
+    def _pool(self) -> ThreadPoolExecutor:
+        executor = self._executor
+        if executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix=f"{self.name}-work"
+                    )
+                executor = self._executor
+        return executor
+
+    async def run(self, fn: Callable[[], T], deadline: Optional[float] = None, admitted: bool = False) -> T:
+        """
+        Run `fn()` on this class's threads (bind arguments, including the
+        deadline for the callee, with functools.partial). `admitted=True`
+        (later steps of a request already let in) waits for a slot without
+        the queue limit or deadline checks.
+        """
+        await self._acquire(deadline, admitted)
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        def done(_) -> None:
+            try:
+                loop.call_soon_threadsafe(self._release, time.perf_counter() - started)
+            except RuntimeError:
+                pass  # the loop is closed; nobody is left to hand the slot to
+
+        try:
+            future = self._pool().submit(fn)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(done)
+        timeout = None if admitted or deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._expired += 1
+            METRICS.count("scheduler_deadline_exceeded", work_class=self.name, state="running")
+            raise Overloaded(self.name, "deadline exceeded", 503, self._estimated_wait_s(len(self._waiters) + 1))
+
+    @asynccontextmanager
+    async def hold(self, deadline: Optional[float] = None) -> AsyncIterator[None]:
+        """A slot for async work of this class (e.g. a streamed generation) that does not need a thread."""
+        await self._acquire(deadline, admitted=False)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - started)
+
+    async def iterate(self, it: Iterator[T]) -> AsyncIterator[T]:
+        """
+        Advance a blocking iterator on this class's threads, one item per
+        hop. Call `check` before streaming starts: hops are admitted
+        unconditionally so a response is never cut off half way.
+        """
+        end = object()
+        while True:
+            item = await self.run(partial(next, it, end), admitted=True)
+            if item is end:
+                return
+            yield item  # type: ignore[misc]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "active": self.workers - self._free,
+                "queue_depth": len(self._waiters),
+                "max_queue": self.max_queue,
+                "avg_service_ms": round(self._service_s * 1000.0, 3),
+                "completed": self._completed,
+                "rejected_queue_full": self._rejected_full,
+                "rejected_deadline": self._rejected_deadline,
+                "expired": self._expired,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Scheduler:
+    """
+    One WorkClass per kind of blocking API work, so a burst of one (say,
+    ingests) cannot starve the others:
+
+      query       retrieval and local search
+      generation  LLM answers
+      ingest      synchronous ingests and snapshot exports
+    """
+
+    CLASSES = ("query", "generation", "ingest")
+
+    def __init__(self, settings: Settings) -> None:
+        self.classes: Dict[str, WorkClass] = {
+            "query": WorkClass(
+                "query", settings.scheduler_query_workers, settings.scheduler_query_queue,
+                settings.scheduler_query_deadline_s,
+            ),
+            "generation": WorkClass(
+                "generation", settings.scheduler_generation_workers, settings.scheduler_generation_queue,
+                settings.scheduler_generation_deadline_s,
+            ),
+            "ingest": WorkClass(
+                "ingest", settings.scheduler_ingest_workers, settings.scheduler_ingest_queue,
+                settings.scheduler_ingest_deadline_s,
+            ),
+        }
+
+    def __getitem__(self, name: str) -> WorkClass:
+        return self.classes[name]
+
+    def stats(self) -> Dict[str, float]:
+        """Flat gauges for /metrics, e.g. `query_queue_depth`."""
+        return {f"{name}_{k}": v for name, wc in self.classes.items() for k, v in wc.stats().items()}
+
+    def shutdown(self) -> None:
+        for wc in self.classes.values():
+            wc.shutdown()
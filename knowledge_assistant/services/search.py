@@ -1,17 +1,19 @@
 from __future__ import annotations
 
-from typing import List, Dict, Optional
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 import requests
 
 from knowledge_assistant.api.config import Settings
-from knowledge_assistant.services.retrieval import Retriever
+from knowledge_assistant.services.retrieval import BatchQuery, RetrievedChunk, Retriever
 
 
-def _google_cse_search(q: str, num: int, settings: Settings) -> List[Dict]:
+def _google_cse_search(q: str, num: int, settings: Settings, deadline: Optional[float] = None) -> List[Dict]:
     key = (settings.google_api_key or "").strip()
     cx = (settings.google_cse_id or "").strip()
     params = {"q": q, "key": key, "cx": cx, "num": max(1, min(10, int(num or 5)))}
-    r = requests.get("https://www.googleapis.com/customsearch/v1", params=params, timeout=20)
+    timeout = 20.0 if deadline is None else max(0.1, min(20.0, deadline - time.monotonic()))
+    r = requests.get("https://www.googleapis.com/customsearch/v1", params=params, timeout=timeout)
     r.raise_for_status()
     data = r.json()
     items = data.get("items", []) or []
@@ -28,11 +30,9 @@ def _google_cse_search(q: str, num: int, settings: Settings) -> List[Dict]:
     return out
 
 
-def _local_semantic_search(q: str, num: int, settings: Settings) -> List[Dict]:
-    retriever = Retriever(settings)
-    results = retriever.query(q, top_k=max(1, int(num or 5)), collection_name=None, oversample_factor=4)
+def _local_results(chunks: List[RetrievedChunk]) -> List[Dict]:
     out: List[Dict] = []
-    for ch in results:
+    for ch in chunks:
         snippet = (ch.text or "").strip()
         if len(snippet) > 300:
             snippet = snippet[:300] + "…"
@@ -40,12 +40,40 @@ def _local_semantic_search(q: str, num: int, settings: Settings) -> List[Dict]:
     return out
 
 
-def search(q: str, num: int = 5, settings: Optional[Settings] = None) -> List[Dict]:
+def _local_semantic_search(q: str, num: int, settings: Settings, deadline: Optional[float] = None) -> List[Dict]:
+    retriever = Retriever(settings)
+    results = retriever.query(
+        q, top_k=max(1, int(num or 5)), collection_name=None, oversample_factor=4, deadline=deadline
+    )
+    return _local_results(results)
+
+
+def search_batch(
+    items: Sequence[Tuple[str, int, Optional[str]]],
+    settings: Optional[Settings] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[List[Dict]]:
+    """
+    Local results for many (q, num, domain) items, in order, via
+    `Retriever.query_batch`. Web search is not used: the point of a batch
+    is to share the encode and vector queries across questions.
+    """
+    settings = settings or Settings()
+    queries = [
+        BatchQuery(question=q, top_k=max(1, int(num or 5)), collection_name=domain, oversample_factor=4)
+        for q, num, domain in items
+    ]
+    for result in Retriever(settings).query_batch(queries, settings.batch_chunk_size, deadline):
+        yield _local_results(result.chunks)
+
+
+def search(q: str, num: int = 5, settings: Optional[Settings] = None, deadline: Optional[float] = None) -> List[Dict]:
+    """`deadline` (time.monotonic()) bounds the web request and the local collection queries."""
     settings = settings or Settings()
     # If Google CSE is configured, try it first; otherwise fallback to local search.
     if (settings.google_api_key or "") and (settings.google_cse_id or ""):
         try:
-            return _google_cse_search(q, num, settings)
+            return _google_cse_search(q, num, settings, deadline)
         except Exception:
             pass
-    return _local_semantic_search(q, num, settings)
\ No newline at end of file
+    return _local_semantic_search(q, num, settings, deadline)
\ No newline at end of file
@@ -0,0 +1,573 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tarfile
+import time
+from dataclasses import asdict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import requests
+
+from ..api.config import Settings
+from .embed_store import EmbedStore
+from .manifest import IngestManifest, ManifestEntry
+from .registry import ResourceRegistry, get_registry
+
+logger = logging.getLogger(__name__)
+
+FORMAT = "knowledge-assistant-snapshot"
+VERSION = 1
+SHARD_ROWS = 10_000
+IMPORT_BATCH_SIZE = 5_000
+
+_HEADER = "snapshot.json"
+_MANIFEST = "manifest.json"
+_INGEST_MANIFEST = "ingest_manifest.jsonl"
+# Written into the target's CHROMA_DIRECTORY: which snapshot it was last brought up to
+_STATE_FILE = "snapshot_state.json"
+_SHARD_RE = re.compile(r"^([a-zA-Z0-9._-]+)/\d+\.npz$")
+_MASK = (1 << 64) - 1
+_INCLUDE = ["documents", "metadatas", "embeddings"]
+
+
+# ---- shards: one npz per block of rows, strings packed Arrow-style as utf-8 bytes + offsets ----
+def _pack(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+
+def _shard_bytes(
+    ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[dict], embeddings: np.ndarray, compress: bool
+) -> bytes:
+    ids_data, ids_offsets = _pack(ids)
+    docs_data, docs_offsets = _pack(documents)
+    metas_data, metas_offsets = _pack([json.dumps(m, ensure_ascii=False, sort_keys=True) for m in metadatas])
+    buf = io.BytesIO()
+    (np.savez_compressed if compress else np.savez)(
+        buf,
+        ids_data=ids_data,
+        ids_offsets=ids_offsets,
+        documents_data=docs_data,
+        documents_offsets=docs_offsets,
+        metadatas_data=metas_data,
+        metadatas_offsets=metas_offsets,
+        embeddings=np.asarray(embeddings, dtype=np.float32),
+    )
+    return buf.getvalue()
+
+
+def _read_shard(data: bytes, ids_only: bool = False) -> Tuple[List[str], List[str], List[dict], np.ndarray]:
+    with np.load(io.BytesIO(data), allow_pickle=False) as z:
+        ids = _unpack(z["ids_data"], z["ids_offsets"])
+        if ids_only:
+            return ids, [], [], np.zeros((0, 0), dtype=np.float32)
+        documents = _unpack(z["documents_data"], z["documents_offsets"])
+        metadatas = [json.loads(m) for m in _unpack(z["metadatas_data"], z["metadatas_offsets"])]
+        return ids, documents, metadatas, z["embeddings"]
+
+
+def row_checksum(ids: Sequence[str], documents: Sequence, metadatas: Sequence, embeddings) -> int:
+    """Order-independent checksum of rows: the sum of a 64-bit hash per row."""
+    total = 0
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    for i, cid in enumerate(ids):
+        h = hashlib.blake2b(digest_size=8)
+        h.update(cid.encode("utf-8"))
+        h.update(b"\0")
+        h.update((documents[i] or "").encode("utf-8"))
+        h.update(b"\0")
+        h.update(json.dumps(metadatas[i] or {}, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+        h.update(b"\0")
+        h.update(np.ascontiguousarray(vectors[i]).tobytes())
+        total += int.from_bytes(h.digest(), "little")
+    return total & _MASK
+
+
+def _get_rows(
+    collection, ids: Optional[Sequence[str]], page_rows: int
+) -> Iterator[Tuple[List[str], List[str], List[dict], np.ndarray]]:
+    """Every row of `collection` (or only those of `ids` that exist), `page_rows` at a time."""
+    if ids is None:
+        offset = 0
+        while True:
+            res = collection.get(include=_INCLUDE, limit=page_rows, offset=offset)
+            if not res.get("ids"):
+                return
+            offset += len(res["ids"])
+            yield _columns(res)
+    else:
+        for start in range(0, len(ids), page_rows):
+            res = collection.get(ids=list(ids[start:start + page_rows]), include=_INCLUDE)
+            if res.get("ids"):
+                yield _columns(res)
+
+
+def _columns(res: dict) -> Tuple[List[str], List[str], List[dict], np.ndarray]:
+    return (
+        list(res["ids"]),
+        [d or "" for d in res["documents"]],
+        [dict(m or {}) for m in res["metadatas"]],
+        np.asarray(res["embeddings"], dtype=np.float32),
+    )
+
+
+# ---- export ----
+def iter_snapshot(
+    settings: Settings,
+    since: Optional[float] = None,
+    collections: Optional[Sequence[str]] = None,
+    shard_rows: int = SHARD_ROWS,
+    compress: bool = False,
+) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yield the files of a snapshot as (relative path, bytes), reading
+    Chroma one shard at a time: `snapshot.json`, the shards of each
+    collection, the ingest manifest and finally `manifest.json` with row
+    counts, checksums and (for deltas) the chunk ids to delete.
+
+    Without `since` every row is exported. With it, only chunks of URLs
+    the ingest manifest saw after `since`, plus chunks rewritten or
+    deleted after it; a delta is applied on top of the snapshot whose
+    `started_at` is at or after `since`. Writes that land while a
+    snapshot is being read are picked up by the next delta.
+    """
+    registry = get_registry(settings)
+    started_at = time.time()
+    kind = "full" if since is None else "delta"
+    header = {
+        "format": FORMAT,
+        "version": VERSION,
+        "kind": kind,
+        "since": since,
+        "started_at": started_at,
+        "embed_model_name": settings.embed_model_name,
+    }
+    yield _HEADER, json.dumps(header).encode("utf-8")
+
+    manifest = IngestManifest.for_settings(settings)
+    try:
+        entries = manifest.entries_since(since or 0.0)
+        changes = manifest.changes_since(since) if since is not None else {}
+    finally:
+        manifest.close()
+    existing = set(registry.list_collection_names())
+    # collection -> chunk ids to export (None: all rows) and chunk ids deleted
+    plan: Dict[str, Optional[Set[str]]] = {}
+    deleted: Dict[str, Set[str]] = {}
+    if since is None:
+        plan = {name: None for name in sorted(existing)}
+    else:
+        for entry in entries:
+            plan.setdefault(entry.collection, set()).update(entry.chunk_ids)  # type: ignore[union-attr]
+        for name, (rewritten, gone) in changes.items():
+            plan.setdefault(name, set()).update(rewritten)  # type: ignore[union-attr]
+            deleted.setdefault(name, set()).update(gone)
+    if collections:
+        wanted = set(collections)
+        plan = {name: ids for name, ids in plan.items() if name in wanted}
+        entries = [e for e in entries if e.collection in wanted]
+
+    summary: Dict[str, dict] = {}
+    for name in sorted(plan):
+        ids = plan[name]
+        info = {"rows": 0, "dimension": 0, "checksum": 0, "shards": [], "deleted": []}
+        exported: Set[str] = set()
+        if name in existing:
+            rows = _get_rows(registry.get_collection(name), None if ids is None else sorted(ids), shard_rows)
+            for n, (r_ids, docs, metas, embs) in enumerate(rows):
+                data = _shard_bytes(r_ids, docs, metas, embs, compress)
+                path = f"{name}/{n:05d}.npz"
+                info["shards"].append({"file": path, "rows": len(r_ids), "sha256": hashlib.sha256(data).hexdigest()})
+                info["rows"] += len(r_ids)
+                info["dimension"] = int(embs.shape[1]) if embs.ndim == 2 else info["dimension"]
+                info["checksum"] = (info["checksum"] + row_checksum(r_ids, docs, metas, embs)) & _MASK
+                if ids is not None:
+                    exported.update(r_ids)
+                yield path, data
+        # Ids that were written after `since` but are gone now are deleted too
+        info["deleted"] = sorted((deleted.get(name, set()) | (ids or set())) - exported) if ids is not None else []
+        summary[name] = info
+
+    yield _INGEST_MANIFEST, "".join(json.dumps(asdict(e)) + "\n" for e in entries).encode("utf-8")
+    final = {
+        **header,
+        "finished_at": time.time(),
+        "collections": summary,
+        "ingest_manifest": {"file": _INGEST_MANIFEST, "entries": len(entries)},
+    }
+    yield _MANIFEST, json.dumps(final, indent=1).encode("utf-8")
+
+
+def export_snapshot(
+    settings: Settings,
+    out_dir: str,
+    since: Optional[float] = None,
+    collections: Optional[Sequence[str]] = None,
+    shard_rows: int = SHARD_ROWS,
+    compress: bool = False,
+) -> dict:
+    """Write a snapshot into an empty directory; returns its manifest plus timings."""
+    if os.path.isdir(out_dir) and os.listdir(out_dir):
+        raise ValueError(f"{out_dir} is not empty")
+    t0 = time.perf_counter()
+    nbytes = 0
+    final: dict = {}
+    for name, data in iter_snapshot(settings, since, collections, shard_rows, compress):
+        path = os.path.join(out_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        nbytes += len(data)
+        if name == _MANIFEST:
+            final = json.loads(data)
+    elapsed = time.perf_counter() - t0
+    rows = sum(c["rows"] for c in final["collections"].values())
+    logger.info(f"Exported {final['kind']} snapshot of {rows} rows to {out_dir} in {elapsed:.1f}s")
+    return {
+        **final,
+        "bytes": nbytes,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+class _Sink:
+    """File-like target for a streaming tarfile; collects what it writes until drained."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def iter_tar(members: Iterable[Tuple[str, bytes]]) -> Iterator[bytes]:
+    """Stream snapshot files as an uncompressed tar, one member at a time."""
+    sink = _Sink()
+    with tarfile.open(fileobj=sink, mode="w|") as tar:  # type: ignore[call-overload]
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            yield sink.drain()
+    yield sink.drain()
+
+
+# ---- import ----
+def _iter_source(source: str, timeout: float = 60.0) -> Iterator[Tuple[str, bytes]]:
+    """Snapshot files from a directory, a tar file or a URL serving one (e.g. GET /snapshot)."""
+    if source.startswith(("http://", "https://")):
+        response = requests.get(source, stream=True, timeout=timeout)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with response, tarfile.open(fileobj=response.raw, mode="r|") as tar:
+            yield from _tar_members(tar)
+    elif os.path.isdir(source):
+        with open(os.path.join(source, _MANIFEST), "rb") as f:
+            final_bytes = f.read()
+        final = json.loads(final_bytes)
+        names = [_HEADER]
+        names += [s["file"] for c in final["collections"].values() for s in c["shards"]]
+        names.append(final["ingest_manifest"]["file"])
+        for name in names:
+            with open(os.path.join(source, name), "rb") as f:
+                yield name, f.read()
+        yield _MANIFEST, final_bytes
+    else:
+        with tarfile.open(source, mode="r|*") as tar:
+            yield from _tar_members(tar)
+
+
+def _tar_members(tar: tarfile.TarFile) -> Iterator[Tuple[str, bytes]]:
+    for member in tar:
+        if member.isfile():
+            f = tar.extractfile(member)
+            if f is not None:
+                yield member.name, f.read()
+
+
+def _state_path(settings: Settings) -> str:
+    return os.path.join(settings.chroma_directory, _STATE_FILE)
+
+
+def read_state(settings: Settings) -> Optional[dict]:
+    try:
+        with open(_state_path(settings), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _check_header(header: dict, settings: Settings, registry: ResourceRegistry, force: bool) -> None:
+    if header.get("format") != FORMAT or int(header.get("version", 0)) > VERSION:
+        raise ValueError(f"not a supported snapshot: {header.get('format')} v{header.get('version')}")
+    if force:
+        return
+    if header.get("embed_model_name") != settings.embed_model_name:
+        raise ValueError(
+            f"snapshot embeddings are from {header.get('embed_model_name')}, "
+            f"this store uses {settings.embed_model_name}"
+        )
+    if header["kind"] == "full":
+        filled = [n for n in registry.list_collection_names() if registry.get_collection(n).count()]
+        if filled:
+            raise ValueError(
+                f"target already has data ({', '.join(filled[:5])}); import a full snapshot into an empty store"
+            )
+    else:
+        state = read_state(settings)
+        if state is None or state["applied_until"] < header["since"]:
+            raise ValueError(
+                "delta starts after the snapshot this store was loaded from; "
+                "import the missing deltas (or a full snapshot) first"
+            )
+
+
+def _drop_stale_keys(registry: ResourceRegistry, name: str, ids: List[str], metadatas: List[dict]) -> None:
+    """Chroma's upsert merges metadata, so first remove keys the snapshot's rows no longer have."""
+    if name not in registry.list_collection_names():
+        return
+    collection = registry.get_collection(name)
+    wanted = dict(zip(ids, metadatas))
+    stale_ids: List[str] = []
+    updates: List[dict] = []
+    for start in range(0, len(ids), SHARD_ROWS):
+        res = collection.get(ids=ids[start:start + SHARD_ROWS], include=["metadatas"])
+        for cid, meta in zip(res["ids"], res["metadatas"]):
+            gone = set(meta or {}) - set(wanted[cid] or {})
+            if gone:
+                stale_ids.append(cid)
+                # None removes a key on update
+                updates.append({key: None for key in gone})
+    if stale_ids:
+        collection.update(ids=stale_ids, metadatas=updates)
+
+
+def import_snapshot(
+    settings: Settings,
+    source: str,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    force: bool = False,
+    verify: bool = True,
+) -> dict:
+    """
+    Bulk-load a snapshot (directory, tar file or URL) into
+    `settings.chroma_directory`. Rows go through `EmbedStore` in large
+    batches, so the flat, lexical and routing indexes are kept in step;
+    nothing is re-embedded. A delta's deletions and the ingest manifest are
+    applied once every shard has arrived and matched its sha256. With
+    `verify`, the loaded rows are read back and checked against the
+    snapshot's checksums.
+    """
+    registry = get_registry(settings)
+    store = EmbedStore(settings)
+    max_batch = getattr(registry.client, "get_max_batch_size", lambda: batch_size)()
+    batch = max(1, min(batch_size, max_batch))
+    t0 = time.perf_counter()
+    header: Optional[dict] = None
+    final: Optional[dict] = None
+    digests: Dict[str, str] = {}
+    loaded: Dict[str, List[str]] = {}
+    entries: List[ManifestEntry] = []
+    rows = 0
+    for name, data in _iter_source(source):
+        if name == _HEADER:
+            header = json.loads(data)
+            _check_header(header, settings, registry, force)
+            continue
+        if header is None:
+            raise ValueError(f"snapshot does not start with {_HEADER}")
+        match = _SHARD_RE.match(name)
+        if match:
+            collection = match.group(1)
+            digests[name] = hashlib.sha256(data).hexdigest()
+            ids, documents, metadatas, embeddings = _read_shard(data)
+            if header["kind"] == "delta":
+                _drop_stale_keys(registry, collection, ids, metadatas)
+            # Chroma rejects empty metadata dicts
+            metas = [m or None for m in metadatas]
+            for start in range(0, len(ids), batch):
+                end = start + batch
+                store.upsert_embeddings(
+                    collection,
+                    documents[start:end],
+                    ids[start:end],
+                    metas[start:end],  # type: ignore[arg-type]
+                    embeddings=embeddings[start:end],
+                )
+            loaded.setdefault(collection, []).extend(ids)
+            rows += len(ids)
+        elif name == _INGEST_MANIFEST:
+            entries = [ManifestEntry(**json.loads(line)) for line in data.decode("utf-8").splitlines() if line.strip()]
+        elif name == _MANIFEST:
+            final = json.loads(data)
+    if header is None or final is None:
+        raise ValueError("snapshot is incomplete: manifest.json missing")
+    for collection in final["collections"].values():
+        for shard in collection["shards"]:
+            if digests.get(shard["file"]) != shard["sha256"]:
+                raise ValueError(f"shard {shard['file']} is missing or corrupt")
+    deleted = 0
+    for name, collection in final["collections"].items():
+        if collection["deleted"] and name in registry.list_collection_names():
+            store.delete_ids(name, collection["deleted"])
+            deleted += len(collection["deleted"])
+    if entries:
+        manifest = IngestManifest.for_settings(settings)
+        try:
+            for entry in entries:
+                # Keep the source's timestamps: deltas are cut on the source's clock
+                manifest.put(entry, touch=False)
+        finally:
+            manifest.close()
+    elapsed = time.perf_counter() - t0
+    state = {"applied_until": final["started_at"], "kind": final["kind"], "source": source, "imported_at": time.time()}
+    with open(_state_path(settings), "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    logger.info(f"Imported {final['kind']} snapshot: {rows} rows, {deleted} deletions in {elapsed:.1f}s")
+    report = {
+        "kind": final["kind"],
+        "rows": rows,
+        "deleted": deleted,
+        "collections": len(final["collections"]),
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else 0.0,
+    }
+    if verify:
+        report["verify"] = _verify(registry, final, {name: loaded.get(name, []) for name in final["collections"]})
+    return report
+
+
+# ---- consistency ----
+def _verify(registry: ResourceRegistry, final: dict, ids_by_collection: Dict[str, List[str]]) -> dict:
+    """Compare the store against a snapshot's row counts and checksums."""
+    existing = set(registry.list_collection_names())
+    report: dict = {"ok": True, "collections": {}}
+    for name, expected in final["collections"].items():
+        ids = ids_by_collection.get(name, [])
+        found = 0
+        checksum = 0
+        count = None
+        deleted_present = 0
+        if name in existing:
+            collection = registry.get_collection(name)
+            for r_ids, docs, metas, embs in _get_rows(collection, ids, SHARD_ROWS):
+                found += len(r_ids)
+                checksum = (checksum + row_checksum(r_ids, docs, metas, embs)) & _MASK
+            for start in range(0, len(expected["deleted"]), SHARD_ROWS):
+                batch = expected["deleted"][start:start + SHARD_ROWS]
+                deleted_present += len(collection.get(ids=batch, include=[]).get("ids") or [])
+            count = collection.count()
+        entry = {
+            "rows": expected["rows"],
+            "found": found,
+            "checksum_match": found == expected["rows"] and checksum == expected["checksum"],
+            "deleted_present": deleted_present,
+            "count": count,
+        }
+        ok = entry["checksum_match"] and not deleted_present
+        if final["kind"] == "full":
+            # Rows the snapshot does not know about (or written since it was taken)
+            ok = ok and count == expected["rows"]
+        entry["ok"] = ok
+        report["collections"][name] = entry
+        report["ok"] = report["ok"] and ok
+    return report
+
+
+def verify_snapshot(settings: Settings, snapshot_dir: str) -> dict:
+    """
+    Check the store at `settings.chroma_directory` against a snapshot
+    directory: run it on the source right after an export to see whether
+    writes raced the export, or on a replica after an import.
+    """
+    with open(os.path.join(snapshot_dir, _MANIFEST), encoding="utf-8") as f:
+        final = json.load(f)
+    ids_by_collection: Dict[str, List[str]] = {}
+    for name, collection in final["collections"].items():
+        ids: List[str] = []
+        for shard in collection["shards"]:
+            with open(os.path.join(snapshot_dir, shard["file"]), "rb") as f:
+                ids.extend(_read_shard(f.read(), ids_only=True)[0])
+        ids_by_collection[name] = ids
+    return _verify(get_registry(settings), final, ids_by_collection)
+
+
+def _run(settings: Settings, args) -> dict:
+    if args.command == "export":
+        start = args.since
+        if args.base:
+            with open(os.path.join(args.base, _MANIFEST), encoding="utf-8") as f:
+                start = json.load(f)["started_at"]
+        report = export_snapshot(settings, args.out_dir, start, args.collections, args.shard_rows, args.compress)
+        report = {k: v for k, v in report.items() if k != "collections"} | {
+            "collections": {
+                n: {"rows": c["rows"], "deleted": len(c["deleted"])} for n, c in report["collections"].items()
+            }
+        }
+    elif args.command == "import":
+        report = import_snapshot(settings, args.source, args.batch_size, args.force, verify=not args.no_verify)
+    else:
+        report = verify_snapshot(settings, args.snapshot_dir)
+    return report
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export, import and verify vector store snapshots")
+    parser.add_argument("--chroma-directory", help="store to read or load (default: CHROMA_DIRECTORY)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="write a snapshot directory")
+    exp.add_argument("out_dir")
+    since = exp.add_mutually_exclusive_group()
+    since.add_argument("--since", type=float, help="delta: changes after this unix time")
+    since.add_argument("--base", help="delta: changes since the snapshot in this directory was started")
+    exp.add_argument("--collections", nargs="*")
+    exp.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    exp.add_argument("--compress", action="store_true", help="deflate shards (smaller, slower)")
+    imp = sub.add_parser("import", help="load a snapshot directory, tar file or URL")
+    imp.add_argument("source")
+    imp.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    imp.add_argument("--force", action="store_true", help="skip the model, empty-store and delta-order checks")
+    imp.add_argument("--no-verify", action="store_true")
+    ver = sub.add_parser("verify", help="compare the store with a snapshot directory")
+    ver.add_argument("snapshot_dir")
+    args = parser.parse_args()
+
+    settings = Settings()
+    if args.chroma_directory:
+        settings.chroma_directory = os.path.abspath(args.chroma_directory)
+    try:
+        report = _run(settings, args)
+    except (ValueError, OSError) as err:
+        raise SystemExit(f"error: {err}")
+    print(json.dumps(report, indent=2))
+    if not report.get("ok", report.get("verify", {}).get("ok", True)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
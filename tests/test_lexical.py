@@ -0,0 +1,87 @@
+import sqlite3
+
+from knowledge_assistant.services.lexical import LexicalIndex
+
+
+def _scores(index, query):
+    return [(h.chunk_id, round(h.score, 6)) for h in index.search(["docs"], query, 10)]
+
+
+def test_doc_numbers_not_reused_after_compaction(tmp_path):
+    path = str(tmp_path / "lexical.sqlite3")
+    index = LexicalIndex(path, compact_dead_ratio=1.0)
+    index.add("docs", ["a", "b", "c"], ["alpha beta", "alpha gamma", "alpha delta " + "filler " * 40])
+    assert [h.chunk_id for h in index.search(["docs"], "delta", 10)] == ["c"]
+
+    # Delete the newest chunk and compact it away, then add one with a different length
+    index.delete("docs", ["c"])
+    index.compact("docs")
+    assert index.search(["docs"], "delta", 10) == []
+    index.add("docs", ["d"], ["alpha epsilon"])
+
+    assert [h.chunk_id for h in index.search(["docs"], "epsilon", 10)] == ["d"]
+    # Lengths cached before the compaction must not leak into the new chunk's score
+    assert _scores(index, "alpha epsilon") == _scores(LexicalIndex(path), "alpha epsilon")
+
+
+def test_migrates_reusable_doc_numbers(tmp_path):
+    path = str(tmp_path / "lexical.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE lexical_docs (doc_no INTEGER PRIMARY KEY, collection TEXT NOT NULL, "
+        "chunk_id TEXT NOT NULL, length INTEGER NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+    )
+    conn.execute("INSERT INTO lexical_docs (doc_no, collection, chunk_id, length) VALUES (7, 'docs', 'old', 3)")
+    conn.commit()
+    conn.close()
+
+    index = LexicalIndex(path)
+    index._conn.execute("DELETE FROM lexical_docs")
+    index._conn.commit()
+    index.add("docs", ["new"], ["alpha"])
+    doc_no = index._conn.execute("SELECT doc_no FROM lexical_docs WHERE chunk_id = 'new'").fetchone()[0]
+    assert doc_no == 8
+
+
+def test_scores_comparable_across_collections(tmp_path):
+    texts = {
+        "big": ["alpha beta"] * 8 + ["gamma"] * 2,
+        "small": ["alpha delta"] + ["gamma epsilon"] * 9,
+    }
+    split = LexicalIndex(str(tmp_path / "split.sqlite3"))
+    merged = LexicalIndex(str(tmp_path / "merged.sqlite3"))
+    for collection, docs in texts.items():
+        ids = [f"{collection}{i}" for i in range(len(docs))]
+        split.add(collection, ids, docs)
+        merged.add("all", ids, docs)
+
+    # Ranking two collections together scores as if they were one
+    hits = split.search(["big", "small"], "alpha", 20)
+    expected = merged.search(["all"], "alpha", 20)
+    assert [(h.chunk_id, round(h.score, 6)) for h in hits] == [(h.chunk_id, round(h.score, 6)) for h in expected]
+    assert {h.collection for h in hits} == {"big", "small"}
+
+
+def test_reader_catches_up_incrementally(tmp_path):
+    path = str(tmp_path / "lexical.sqlite3")
+    writer = LexicalIndex(path, compact_batches=3, compact_dead_ratio=0.3)
+    reader = LexicalIndex(path)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon"]
+    next_id = 0
+    live = {"a": [], "b": []}
+    for step in range(30):
+        collection = "ab"[step % 2]
+        texts = [" ".join(words[(step + i) % 5:(step + i) % 5 + 1 + i % 3]) for i in range(4)]
+        ids = [f"c{next_id + i}" for i in range(4)]
+        next_id += 4
+        writer.add(collection, ids, texts)
+        live[collection].extend(ids)
+        if step % 3 == 2:
+            writer.delete(collection, live[collection][:3])
+            del live[collection][:3]
+        # A long-lived reader sees what a freshly opened index sees
+        for query in ("alpha", "gamma delta", "epsilon beta"):
+            hits = reader.search(["a", "b"], query, 50)
+            fresh = LexicalIndex(path).search(["a", "b"], query, 50)
+            assert [(h.chunk_id, round(h.score, 6)) for h in hits] == [(h.chunk_id, round(h.score, 6)) for h in fresh]
+        assert reader.stats()["chunks"] == len(live["a"]) + len(live["b"])